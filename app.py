@@ -91,7 +91,11 @@ def initialize_database(app, db):
             from models import (
                 CRMs, Clients, ClientCRMAuth, CapsuleToken, JobberToken,
                 JobNimbusCredentials, BuilderPrimeClientData, ZohoClientData, HubspotClientData,
-                JobberClientData, JobNimbusClientData, MergeLinkedAccount
+                JobberClientData, JobNimbusClientData, MergeLinkedAccount,
+                BitrixEvent, BitrixEntityMirror, MergeWebhookEvent, MergeCommonModel, MergeSyncCursor,
+                MergePassthroughJob, MergeTimesheetEntry, MergeTimeOff, MergeEmployeeDimension,
+                MergeHrisSnapshot, MergeHrisRecordHash, JobberWebhookEvent,
+                CapsuleClientToken, JobberClientToken, OutboxWrite, IdempotencyKey
             )
 
             # Check if tables exist by using SQLAlchemy's inspect
@@ -136,6 +140,22 @@ def initialize_database(app, db):
                 print("- jobber_client_data")
                 print("- jobnimbus_client_data")
                 print("- merge_linked_accounts")
+                print("- bitrix_events")
+                print("- bitrix_entity_mirror")
+                print("- merge_webhook_events")
+                print("- merge_common_models")
+                print("- merge_sync_cursors")
+                print("- merge_passthrough_jobs")
+                print("- merge_timesheet_entries")
+                print("- merge_time_off")
+                print("- merge_employee_dimensions")
+                print("- merge_hris_snapshots")
+                print("- merge_hris_record_hashes")
+                print("- jobber_webhook_events")
+                print("- capsule_client_tokens")
+                print("- jobber_client_tokens")
+                print("- outbox_writes")
+                print("- idempotency_keys")
                 print("\nSample data added:")
                 print("- 6 CRM systems (Zoho, Jobber, BuilderPrime, HubSpot, JobNimbus, Capsule)")
             else:
@@ -151,6 +171,7 @@ from config.swagger_config import swagger_bp
 from controllers.jobber_controller import jobber_bp
 from controllers.capsule_controller import capsule_bp
 from controllers.jobnimbus_controller import jobnimbus_bp
+from controllers.upstream_controller import upstream_bp
 from routes.merge_routes import register_merge_routes
 from routes.merge_hris_routes import register_merge_hris_routes
 from routes.bitrix24_routes import register_bitrix24_routes
@@ -163,6 +184,7 @@ app.register_blueprint(jobber_bp)
 app.register_blueprint(client_bp)
 app.register_blueprint(builderprime_bp)
 app.register_blueprint(swagger_bp)
+app.register_blueprint(upstream_bp)
 
 # Register Merge routes
 register_merge_routes(app)
@@ -175,6 +197,10 @@ register_bitrix24_routes(app)
 app.register_blueprint(crm_bp)
 app.register_blueprint(hris_bp)
 
+# Start queue workers (Bitrix24 events, ...) on the first request
+from services import background
+background.init_app(app)
+
 @app.route('/')
 def home():
     return """
@@ -190,6 +216,9 @@ def home():
         <li>GET /api/capsule/people/{id} - Get person by ID</li>
         <li>PUT /api/capsule/people/{id} - Update person</li>
         <li>DELETE /api/capsule/people/{id} - Delete person</li>
+        <li>GET /api/capsule/organizations - All organizations (every page, streamed)</li>
+        <li>GET /api/capsule/opportunities - All opportunities (every page, streamed)</li>
+        <li>GET /api/capsule/tokens/stats - Per-client Capsule token cache and refresher status</li>
     </ul>
     
     <h3>Jobber Integration:</h3>
@@ -197,6 +226,12 @@ def home():
         <li><a href="/api/jobber/clients">GET /api/jobber/clients</a> - Get Jobber clients</li>
         <li><a href="/api/jobber/jobs">GET /api/jobber/jobs</a> - Get Jobber jobs</li>
         <li>POST /api/jobber/clients - Create new Jobber client</li>
+        <li>POST /api/jobber/clients/batch-get - Get many Jobber clients by ID in one request</li>
+        <li>POST /api/jobber/clients/bulk-create - Create many Jobber clients (per-item results)</li>
+        <li>POST /api/jobber/clients/bulk-update - Update many Jobber clients (per-item results)</li>
+        <li>POST /api/jobber/webhook - Jobber webhooks (X-Jobber-Hmac-SHA256), feeding the local client mirror</li>
+        <li>GET /api/jobber/clients?source=local - Clients from the local mirror with freshness metadata</li>
+        <li>GET /api/jobber/tokens/stats - Per-client Jobber token cache and refresher status</li>
     </ul>
     
     <h3>Client Management:</h3>
@@ -227,8 +262,10 @@ def home():
                <li>GET /api/merge/crm/allowlist/status - Check allowlist validation & resolved slugs</li>
                <li>GET /api/merge/crm/meta/{model}/post - Get writable fields for POST</li>
                <li>GET /api/merge/crm/meta/{model}/{id}/patch - Get writable fields for PATCH</li>
-               <li>POST /api/merge/webhook - Merge webhook endpoint</li>
+               <li>POST /api/merge/webhook - Merge webhook endpoint (queued, processed in background)</li>
                <li>GET /api/merge/webhook/debug - Debug webhook configuration</li>
+               <li>GET /api/merge/rate-limits - Merge rate-limit budgets per key and linked account</li>
+               <li>GET /api/merge/crm/{model} - Unified list/detail, served from the local mirror once synced (?live=true bypasses)</li>
            </ul>
     
     <h3>Merge HRIS Integration:</h3>
@@ -240,7 +277,12 @@ def home():
         <li>GET /api/merge/hris/clients/{id}/groups - List groups</li>
         <li>GET/POST /api/merge/hris/clients/{id}/time-off - List/create time off</li>
         <li>GET/POST /api/merge/hris/clients/{id}/timesheet-entries - List/create timesheet entries</li>
-        <li>POST /api/merge/hris/clients/{id}/passthrough - Vendor-specific CRUD operations</li>
+        <li>POST /api/merge/hris/clients/{id}/passthrough - Vendor-specific CRUD operations (run_async=true returns a job)</li>
+        <li>GET /api/merge/hris/clients/{client_id}/passthrough/jobs/{id} - Async passthrough job status and result</li>
+        <li>GET /api/merge/hris/clients/{id}/reports/hours - Hours worked by employee/group/location per period (local mirror)</li>
+        <li>GET /api/merge/hris/clients/{id}/reports/time-off - Time off totals by employee/group/location per period (local mirror)</li>
+        <li>GET/POST /api/merge/hris/clients/{id}/snapshots - List/take employee directory snapshots</li>
+        <li>GET /api/merge/hris/clients/{id}/snapshots/diff?since={snapshot_id} - Employees/employments added, changed or removed since a snapshot</li>
     </ul>
     
     <h3>Bitrix24 CRM Integration:</h3>
@@ -253,7 +295,8 @@ def home():
         <li>GET/PATCH/DELETE /api/bitrix/clients/{id}/deals/{id} - Full CRUD on deals</li>
         <li>GET/POST /api/bitrix/clients/{id}/leads - List/create leads</li>
         <li>GET/PATCH/DELETE /api/bitrix/clients/{id}/leads/{id} - Full CRUD on leads</li>
-        <li>POST /api/bitrix/webhook - Bitrix24 outbound webhook receiver</li>
+        <li>POST /api/bitrix/webhook - Bitrix24 outbound webhook receiver (queued, applied to local mirror)</li>
+        <li>GET /api/bitrix/webhook/debug - Event queue depth by status (X-Application-Token)</li>
     </ul>
     
     <h3>Merge Unified API (New Implementation):</h3>
@@ -277,6 +320,17 @@ def home():
         <li>POST /api/merge/hris/passthrough - Vendor-specific operations</li>
     </ul>
     
+    <h3>Upstream Health:</h3>
+    <ul>
+        <li><a href="/api/upstream/breakers">GET /api/upstream/breakers</a> - Circuit breaker state per vendor and tenant host</li>
+        <li><a href="/api/upstream/bulkheads">GET /api/upstream/bulkheads</a> - Concurrent upstream calls per vendor and tenant</li>
+        <li><a href="/api/upstream/coalescing">GET /api/upstream/coalescing</a> - Identical concurrent reads served by one upstream call</li>
+        <li><a href="/api/upstream/cache">GET /api/upstream/cache</a> - Route cache hit rates (stale-while-revalidate)</li>
+        <li><a href="/api/upstream/outbox">GET /api/upstream/outbox</a> - Queued CRM writes (?async=true) per vendor and status</li>
+        <li>GET /api/upstream/outbox/{id} - Status and result of a queued write</li>
+        <li><a href="/api/upstream/idempotency">GET /api/upstream/idempotency</a> - Idempotency-Key store: stored and replayed create responses</li>
+    </ul>
+    
     <h3>API Documentation:</h3>
     <ul>
         <li><a href="/swagger">Swagger UI</a> - Interactive API documentation</li>
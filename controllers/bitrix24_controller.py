@@ -1,5 +1,6 @@
 # controllers/bitrix24_controller.py
 import os
+import hmac
 from flask import Blueprint, request, jsonify
 from models import db, ClientCRMAuth
 from services.bitrix24_service import (
@@ -8,6 +9,9 @@ from services.bitrix24_service import (
     deal_add, deal_get, deal_update, deal_delete, deal_list,
     lead_add, lead_get, lead_update, lead_delete, lead_list
 )
+from services.bitrix24_events import enqueue_events, unflatten_form, queue_stats
+from services import outbox
+from services.idempotency import idempotent
 
 bitrix_bp = Blueprint("bitrix", __name__, url_prefix="/api/bitrix")
 
@@ -48,9 +52,15 @@ def bitrix_config_debug(client_id: int):
 
 # --- contacts ---
 @bitrix_bp.route("/clients/<int:client_id>/contacts", methods=["POST"])
+@idempotent
 def create_contact(client_id: int):
     body = request.get_json(force=True) or {}
     fields = body.get("fields") or body  # allow plain fields body
+    if outbox.wants_async():
+        emails = fields.get("EMAIL") or []
+        email = emails[0].get("VALUE") if emails and isinstance(emails[0], dict) else None
+        return outbox.accept("bitrix24.contact_add", {"fields": fields}, client_id,
+                             outbox.entity("bitrix24", client_id, "contact", email))
     return jsonify(contact_add(client_id, fields)), 201
 
 @bitrix_bp.route("/clients/<int:client_id>/contacts", methods=["GET"])
@@ -80,6 +90,7 @@ def delete_contact(client_id: int, contact_id: int):
 
 # --- deals ---
 @bitrix_bp.route("/clients/<int:client_id>/deals", methods=["POST"])
+@idempotent
 def create_deal(client_id: int):
     body = request.get_json(force=True) or {}
     return jsonify(deal_add(client_id, body.get("fields") or body)), 201
@@ -108,6 +119,7 @@ def delete_deal(client_id: int, deal_id: int):
 
 # --- leads (optional if your Bitrix is in "simple CRM" mode) ---
 @bitrix_bp.route("/clients/<int:client_id>/leads", methods=["POST"])
+@idempotent
 def create_lead(client_id: int):
     body = request.get_json(force=True) or {}
     return jsonify(lead_add(client_id, body.get("fields") or body)), 201
@@ -139,23 +151,41 @@ def delete_lead(client_id: int, lead_id: int):
 def outbound_webhook():
     """
     Bitrix24 sends event payloads here.
-    Verify 'application_token' against the one you configured.
+    Verify 'application_token' against the one you configured, append the event(s)
+    to the bitrix_events queue and acknowledge right away; services/bitrix24_events
+    coalesces and applies them to the local mirror in the background.
     """
-    payload = request.get_json(silent=True) or {}
-    # Bitrix can also send form-encoded; merge in request.form if needed
+    payload = request.get_json(silent=True)
+    # Bitrix normally sends form-encoded (data[FIELDS][ID]=..., auth[application_token]=...)
     if not payload and request.form:
-        payload = request.form.to_dict(flat=True)
+        payload = unflatten_form(request.form.to_dict(flat=True))
+    # Accept a JSON array of events as one batch
+    events = payload if isinstance(payload, list) else [payload or {}]
+    if not all(isinstance(ev, dict) for ev in events):
+        return jsonify({"error": "each event must be a JSON object"}), 400
 
-    incoming_token = payload.get("application_token") or payload.get("auth", {}).get("application_token")
     configured = BITRIX_OUTBOUND_TOKEN or os.getenv("BITRIX_OUTBOUND_TOKEN")
-    if not configured:
-        # allow per-client storage too
-        configured = None
-
-    if configured and incoming_token != configured:
-        return jsonify({"error": "invalid application_token"}), 401
+    if configured:
+        for ev in events:
+            incoming_token = ev.get("application_token") or (ev.get("auth") or {}).get("application_token")
+            if incoming_token != configured:
+                return jsonify({"error": "invalid application_token"}), 401
 
     # Example event fields:
     # payload['event'], payload['data'], payload['ts'], payload['auth']...
-    # You can route on payload.get("event") (e.g., "ONCRMCONTACTADD", "ONCRMDEALUPDATE")
-    return ("", 204) 
\ No newline at end of file
+    # e.g. "ONCRMCONTACTADD", "ONCRMDEALUPDATE" -> refetched once per entity by the worker
+    enqueue_events([ev for ev in events if ev.get("event")])
+    return ("", 204)
+
+@bitrix_bp.route("/webhook/debug", methods=["GET"])
+def outbound_webhook_debug():
+    """
+    Queue depth by status for the Bitrix24 event worker. Needs the outbound
+    token in X-Application-Token; not served when no token is configured.
+    """
+    configured = BITRIX_OUTBOUND_TOKEN or os.getenv("BITRIX_OUTBOUND_TOKEN")
+    if not configured:
+        return jsonify({"error": "Not found"}), 404
+    if not hmac.compare_digest(request.headers.get("X-Application-Token", ""), configured):
+        return jsonify({"error": "invalid application_token"}), 401
+    return jsonify({"queue": queue_stats()}), 200
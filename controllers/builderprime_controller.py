@@ -1,5 +1,7 @@
 from flask import request, jsonify
+from werkzeug.exceptions import HTTPException
 from services.builderprime_service import BuilderPrimeService
+from services import outbox
 
 class BuilderPrimeController:
     """Controller class for handling BuilderPrime-related HTTP requests"""
@@ -83,6 +85,12 @@ class BuilderPrimeController:
                     'data': None
                 }), 400
 
+            # ?async=true / Prefer: respond-async: queue the write and answer 202 with a job id
+            if outbox.wants_async():
+                return outbox.accept('builderprime.create_lead', {'lead': data}, client_id,
+                                     outbox.entity('builderprime', client_id, 'lead',
+                                                   data.get('external_id') or data.get('email')))
+
             # Call service to create lead
             result = BuilderPrimeService.create_lead(client_id, data)
 
@@ -102,6 +110,8 @@ class BuilderPrimeController:
 
                 return jsonify(result), status_code
 
+        except HTTPException:
+            raise  # 503 + Retry-After from an open circuit or full bulkhead
         except Exception as e:
             return jsonify({
                 'success': False,
@@ -242,6 +252,8 @@ class BuilderPrimeController:
 
                 return jsonify(result), status_code
 
+        except HTTPException:
+            raise  # 503 + Retry-After from an open circuit or full bulkhead
         except Exception as e:
             return jsonify({
                 'success': False,
@@ -290,6 +302,10 @@ class BuilderPrimeController:
                     'data': None
                 }), 400
 
+            if outbox.wants_async():
+                return outbox.accept('builderprime.update_lead', {'opportunity_id': opportunity_id, 'lead': data},
+                                     client_id, outbox.entity('builderprime', client_id, 'opportunity', opportunity_id))
+
             # Call service to update lead
             result = BuilderPrimeService.update_lead(client_id, opportunity_id, data)
 
@@ -309,6 +325,8 @@ class BuilderPrimeController:
 
                 return jsonify(result), status_code
 
+        except HTTPException:
+            raise  # 503 + Retry-After from an open circuit or full bulkhead
         except Exception as e:
             return jsonify({
                 'success': False,
@@ -1,5 +1,10 @@
 from flask import Blueprint, redirect, request, jsonify
 from services import capsule_service
+from services.streaming import stream_pages
+from services.route_cache import cached, invalidates
+from services import outbox
+from services.idempotency import idempotent
+from services.token_store import current_client_id
 
 capsule_bp = Blueprint("capsule", __name__, url_prefix="/api/capsule")
 
@@ -16,7 +21,7 @@ def start_auth():
       302:
         description: Redirect to Capsule authorization page
     """
-    auth_url = capsule_service.get_authorization_url()
+    auth_url = capsule_service.get_authorization_url(client_id=request.args.get("client_id", type=int))
     return redirect(auth_url)
 
 
@@ -47,7 +52,7 @@ def auth_callback():
         return jsonify({"error": "Missing code"}), 400
 
     try:
-        capsule_service.exchange_code_for_token(code)
+        capsule_service.exchange_code_for_token(code, request.args.get("state"))
         return jsonify({"success": True, "message": "Token stored successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -81,6 +86,21 @@ def debug_token():
         return jsonify({"error": str(e)}), 500
 
 
+# Per-client token store health
+@capsule_bp.route("/tokens/stats", methods=["GET"])
+def token_stats():
+    """
+    Connected clients, cached entries, tokens expiring soon and failing refreshes
+    ---
+    tags:
+      - Capsule CRM
+    responses:
+      200:
+        description: Token store stats
+    """
+    return jsonify({"success": True, "tokens": capsule_service.tokens.stats()})
+
+
 # ---------- People (Contacts) ----------
 
 @capsule_bp.route("/people", methods=["GET"])
@@ -99,6 +119,7 @@ def list_people():
 
 
 @capsule_bp.route("/people", methods=["POST"])
+@idempotent
 def create_person():
     """
     Create a new contact (person) in Capsule
@@ -123,6 +144,8 @@ def create_person():
     responses:
       201:
         description: Created person
+      202:
+        description: Queued for delivery (?async=true or Prefer respond-async); poll the returned poll_url
     """
     data = request.get_json()
     
@@ -153,6 +176,11 @@ def create_person():
             }
         ]
     
+    if outbox.wants_async():
+        client_id = current_client_id()
+        return outbox.accept("capsule.create_party", payload, client_id,
+                             outbox.entity("capsule", client_id, "person", data.get("email")))
+
     result = capsule_service.make_capsule_request("POST", "parties", data=payload)
     return jsonify(result), 201
 
@@ -178,6 +206,7 @@ def get_person(person_id):
 
 
 @capsule_bp.route("/people/<person_id>", methods=["PUT"])
+@invalidates("capsule_opportunities")  # opportunities embed their party
 def update_person(person_id):
     """
     Update an existing Capsule contact (person)
@@ -243,6 +272,7 @@ def update_person(person_id):
 
 
 @capsule_bp.route("/people/<person_id>", methods=["DELETE"])
+@invalidates("capsule_opportunities")  # Capsule deletes the party's opportunities with it
 def delete_person(person_id):
     """
     Delete a Capsule contact (person)
@@ -262,33 +292,60 @@ def delete_person(person_id):
     return '', 204
 
 
+# ---------- Bulk collections (streamed) ----------
+
+def _stream_collection(endpoint, key):
+    """Stream every page of a Capsule collection as {"<key>": [...]}."""
+    params = request.args.to_dict(flat=True)
+    total_pages = params.pop("total_pages", None)
+    pages = capsule_service.iter_capsule_pages(
+        endpoint, key, params=params,
+        total_pages=int(total_pages) if total_pages and total_pages.isdigit() else None
+    )
+    return stream_pages(key, pages)
+
+
 # ---------- Organizations ----------
 
 @capsule_bp.route("/organizations", methods=["GET"])
+@cached("capsule_organizations", ttl=300, swr=900)
 def list_organizations():
     """
-    Get all organizations from Capsule CRM
+    Get all organizations from Capsule CRM (follows every page, streamed)
     ---
     tags:
       - Capsule CRM
+    parameters:
+      - name: total_pages
+        in: query
+        type: integer
+        required: false
+        description: Known page count; pages are then fetched concurrently
     responses:
       200:
         description: List of organizations
     """
-    return jsonify(capsule_service.get_capsule_organizations())
+    return _stream_collection("organizations", "organizations")
 
 
 # ---------- Opportunities ----------
 
 @capsule_bp.route("/opportunities", methods=["GET"])
+@cached("capsule_opportunities", ttl=300, swr=900)
 def list_opportunities():
     """
-    Get all opportunities from Capsule CRM
+    Get all opportunities from Capsule CRM (follows every page, streamed)
     ---
     tags:
       - Capsule CRM
+    parameters:
+      - name: total_pages
+        in: query
+        type: integer
+        required: false
+        description: Known page count; pages are then fetched concurrently
     responses:
       200:
         description: List of opportunities
     """
-    return jsonify(capsule_service.get_capsule_opportunities())
+    return _stream_collection("opportunities", "opportunities")
@@ -1,17 +1,29 @@
 from flask import Blueprint, request, jsonify, redirect, session, url_for
+from werkzeug.exceptions import HTTPException
 import logging
 from services.jobber_service import (
     create_client,
     get_clients,
     get_client_by_id,
+    get_clients_by_ids,
+    fetch_jobs,
+    JOB_FIELD_SETS,
+    JOB_DEFAULT_FIELD_SETS,
+    bulk_create_clients,
+    bulk_update_clients,
     update_client,
     delete_client,
     get_authorization_url,
     exchange_code_for_token,
     get_jobber_token,
     refresh_jobber_token,
-    store_jobber_token
+    store_jobber_token,
+    verify_webhook_signature,
+    tokens
 )
+from services import jobber_webhooks
+from services.idempotency import idempotent
+from services.token_store import current_client_id
 import time
 
 # Configure logging
@@ -34,8 +46,8 @@ def authorize_jobber():
     """
     logger.info("Starting Jobber OAuth authorization")
     
-    # Generate authorization URL with secure state
-    auth_url = get_authorization_url()
+    # Generate authorization URL with secure state (?client_id= stores the token for that client)
+    auth_url = get_authorization_url(client_id=request.args.get("client_id", type=int))
     
     # Store the state in session for additional security
     if 'jobber_oauth_state' not in session:
@@ -438,6 +450,9 @@ def insert_token_manually():
             expires_in:
               type: integer
               description: Token expiration time in seconds
+            client_id:
+              type: integer
+              description: Store the token for this client (optional)
     responses:
       200:
         description: Token inserted successfully
@@ -456,7 +471,7 @@ def insert_token_manually():
         refresh_token = data.get("refresh_token", "")
         expires_in = data.get("expires_in", 3600)
         
-        store_jobber_token(access_token, refresh_token, expires_in)
+        store_jobber_token(access_token, refresh_token, expires_in, client_id=data.get("client_id"))
         
         return jsonify({
             "success": True,
@@ -476,8 +491,15 @@ def insert_token_manually():
         }), 500
 
 
+def _fields_arg():
+    """fields=id,name,... -> list (None = default selection); unknown names raise ValueError in the service"""
+    fields = request.args.get("fields")
+    return [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+
+
 # CREATE - Create a new client
 @jobber_bp.route("/clients", methods=["POST"])
+@idempotent
 def create_client_route():
     try:
         data = request.json
@@ -490,6 +512,8 @@ def create_client_route():
         )
         logger.info(f"Successfully created Jobber client: {client.get('id')}")
         return jsonify({"success": True, "client": client}), 201
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to create Jobber client: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 400
@@ -501,9 +525,46 @@ def list_clients_route():
     try:
         first = int(request.args.get("first", 20))
         after = request.args.get("after")
-        result = get_clients(first=first, after=after)
+        if request.args.get("source") == "local":
+            # served from the webhook-fed mirror; `after` is the previous page's endCursor
+            result = jobber_webhooks.local_clients(limit=first, after=int(after) if after else None,
+                                                    client_id=current_client_id())
+            return jsonify({"success": True, "clients": result}), 200
+        result = get_clients(first=first, after=after, fields=_fields_arg())
         return jsonify({"success": True, "clients": result}), 200
+    except HTTPException:
+        raise
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+
+# JOBS - One page of jobs with client, property and visit count (single GraphQL query)
+@jobber_bp.route("/jobs", methods=["GET"])
+def list_jobs_route():
+    """
+    Query: first (default 20), after (cursor), start_after / start_before (ISO 8601 on startAt),
+    fields=basic,dispatch,full (default basic,dispatch)
+    """
+    fields = request.args.get("fields")
+    field_sets = tuple(f.strip() for f in fields.split(",") if f.strip()) if fields else JOB_DEFAULT_FIELD_SETS
+    unknown = [f for f in field_sets if f not in JOB_FIELD_SETS]
+    if unknown:
+        return jsonify({"success": False, "error": f"Unknown field set(s): {', '.join(unknown)}",
+                        "field_sets": list(JOB_FIELD_SETS)}), 400
+    try:
+        first = int(request.args.get("first", 20))
+        result = fetch_jobs(
+            first=first,
+            after=request.args.get("after"),
+            start_after=request.args.get("start_after"),
+            start_before=request.args.get("start_before"),
+            field_sets=field_sets
+        )
+        return jsonify({"success": True, "jobs": result["jobs"]}), 200
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.error(f"Failed to fetch Jobber jobs: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 400
 
 
@@ -511,12 +572,81 @@ def list_clients_route():
 @jobber_bp.route("/clients/<string:client_id>", methods=["GET"])
 def get_client_route(client_id):
     try:
-        client = get_client_by_id(client_id)
-        return jsonify({"success": True, "client": client}), 200
+        if request.args.get("live", "").lower() != "true" and not request.args.get("fields"):
+            local = jobber_webhooks.local_client(client_id, current_client_id())
+            if local:
+                return jsonify({"success": True, **local}), 200
+        client = get_client_by_id(client_id, fields=_fields_arg())
+        return jsonify({"success": True, "client": client, "source": "live"}), 200
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except HTTPException:
+        raise
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 404
 
 
+# READ - Get many clients by ID in one (or a few) aliased GraphQL requests
+@jobber_bp.route("/clients/batch-get", methods=["POST"])
+def batch_get_clients_route():
+    """
+    Body: {"ids": ["<jobber client id>", ...], "fields": ["id", "name"]}  (fields optional)
+    Returns the clients found (in request order) and, per missing ID, the error.
+    """
+    data = request.get_json(silent=True) or {}
+    ids = data.get("ids")
+    if not isinstance(ids, list) or not ids:
+        return jsonify({"success": False, "error": "Provide a non-empty 'ids' list"}), 400
+    try:
+        clients, missing = get_clients_by_ids([str(i) for i in ids], fields=data.get("fields") or _fields_arg())
+        return jsonify({"success": True, "clients": clients, "not_found": missing}), 200
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to batch-get Jobber clients: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 400
+
+
+# BULK - Create or update many clients with aliased mutations
+def _bulk_response(bulk_fn, require_id):
+    data = request.get_json(silent=True) or {}
+    items = data.get("clients")
+    if not isinstance(items, list) or not items or not all(isinstance(i, dict) for i in items):
+        return jsonify({"success": False, "error": "Provide a non-empty 'clients' list of objects"}), 400
+    if require_id and not all(i.get("id") for i in items):
+        return jsonify({"success": False, "error": "Every client needs an 'id'"}), 400
+    try:
+        results = bulk_fn(items)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Jobber bulk operation failed: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 400
+    failed = sum(1 for r in results if not r["success"])
+    return jsonify({
+        "success": failed == 0,
+        "succeeded": len(results) - failed,
+        "failed": failed,
+        "results": results
+    }), 200
+
+
+@jobber_bp.route("/clients/bulk-create", methods=["POST"])
+@idempotent
+def bulk_create_clients_route():
+    """
+    Body: {"clients": [{"first_name", "last_name", "email", "company_name"}, ...]}
+    Each result carries the item's index, the created client and its userErrors.
+    """
+    return _bulk_response(bulk_create_clients, require_id=False)
+
+
+@jobber_bp.route("/clients/bulk-update", methods=["POST"])
+def bulk_update_clients_route():
+    """Body: {"clients": [{"id", "first_name", "last_name", "email", "company_name"}, ...]}"""
+    return _bulk_response(bulk_update_clients, require_id=True)
+
+
 # UPDATE - Update an existing client
 @jobber_bp.route("/clients/<string:client_id>", methods=["PUT"])
 def update_client_route(client_id):
@@ -530,6 +660,8 @@ def update_client_route(client_id):
             company_name=data.get("company_name")
         )
         return jsonify({"success": True, "client": updated_client}), 200
+    except HTTPException:
+        raise
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 400
 
@@ -540,5 +672,37 @@ def delete_client_route(client_id):
     try:
         deleted_client = delete_client(client_id)
         return jsonify({"success": True, "client": deleted_client}), 200
+    except HTTPException:
+        raise
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 400
+
+
+# WEBHOOKS - Jobber -> local mirror
+@jobber_bp.route("/webhook", methods=["POST"])
+def jobber_webhook():
+    """
+    Verifies X-Jobber-Hmac-SHA256, queues {topic, itemId} and returns 200 right away.
+    services/jobber_webhooks fetches the changed clients in aliased batches and upserts JobberClientData.
+    """
+    raw = request.get_data(cache=False, as_text=False)
+    if not verify_webhook_signature(raw, request.headers.get("X-Jobber-Hmac-SHA256")):
+        return jsonify({"error": "invalid signature"}), 401
+    event = jobber_webhooks.parse(raw)
+    if not event:
+        return jsonify({"error": "unrecognised webhook payload"}), 400
+    jobber_webhooks.enqueue(event)
+    return jsonify({"success": True}), 200
+
+
+@jobber_bp.route("/webhook/stats", methods=["GET"])
+def jobber_webhook_stats():
+    """Webhook queue counts by status"""
+    return jsonify({"success": True, "queue": jobber_webhooks.queue_stats()}), 200
+
+
+# Per-client token store health
+@jobber_bp.route("/tokens/stats", methods=["GET"])
+def jobber_token_stats():
+    """Connected clients, cached entries, tokens expiring soon and failing refreshes"""
+    return jsonify({"success": True, "tokens": tokens.stats()}), 200
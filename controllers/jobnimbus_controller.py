@@ -4,6 +4,9 @@ from services.jobnimbus_service import (
     list_contacts, get_contact, create_contact, update_contact, delete_contact,
     list_jobs, create_job, JobNimbusError
 )
+from services.route_cache import cached, invalidates
+from services import outbox
+from services.idempotency import idempotent
 
 jobnimbus_bp = Blueprint("jobnimbus", __name__, url_prefix="/api/jobnimbus")
 
@@ -182,9 +185,13 @@ def contacts_list_route():
 
 
 @jobnimbus_bp.route("/contacts", methods=["POST"])
+@idempotent
 def create_contact_route():
     try:
         payload = request.get_json(force=True)
+        if outbox.wants_async():
+            return outbox.accept("jobnimbus.create_contact", {"contact": payload},
+                                 entity_key=outbox.entity("jobnimbus", None, "contact", (payload or {}).get("email")))
         data = create_contact(payload)
         return jsonify({"success": True, "data": data}), 201
     except JobNimbusError as e:
@@ -222,6 +229,7 @@ def delete_contact_route(contact_id):
 # Jobs
 
 @jobnimbus_bp.route("/jobs", methods=["GET"])
+@cached("jobnimbus_jobs", ttl=30, swr=300)
 def list_jobs_route():
     try:
         page = int(request.args.get("page", 1))
@@ -234,6 +242,8 @@ def list_jobs_route():
 
 
 @jobnimbus_bp.route("/jobs", methods=["POST"])
+@idempotent
+@invalidates("jobnimbus_jobs")
 def create_job_route():
     try:
         payload = request.get_json(force=True)
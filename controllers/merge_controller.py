@@ -7,6 +7,13 @@ from services.merge_service import (
     crm_linked_accounts, integration_metadata
 )
 from services.merge_slug_resolver import validate_and_resolve_allowlist, get_crm_integrations_catalog
+from services import merge_webhooks
+from services.merge_ratelimit import governor, account_label
+from services.merge_client import iter_pages, forget_client
+from services.streaming import stream_pages
+from services.merge_fanout import fan_out, status_for, wants_all_accounts
+from services import outbox
+from services.idempotency import idempotent
 
 merge_bp = Blueprint("merge", __name__, url_prefix="/api/merge")
 
@@ -74,21 +81,16 @@ def merge_save_linked_account(client_id: int):
     )
     db.session.add(mla)
     db.session.commit()
+    forget_client(client_id)
     return jsonify({"id": mla.id, "account_token": mla.account_token}), 201
 
 @merge_bp.route("/clients/<int:client_id>/crm/contacts", methods=["GET"])
 def merge_list_contacts(client_id: int):
     """
     Query: account_token=<token> (optional). If absent, uses the first active linked account for this client.
-    Supports standard Merge filters (e.g., modified_after).
+    Supports standard Merge filters (e.g., modified_after). all=true returns every page in one streamed response.
+    accounts=all queries every active linked account in parallel and merges the results (tagged with _source).
     """
-    account_token = request.args.get("account_token")
-    if not account_token:
-        mla = MergeLinkedAccount.query.filter_by(client_id=client_id, status="active").first()
-        if not mla:
-            return jsonify({"error": "No Merge linked account found for client"}), 404
-        account_token = mla.account_token
-
     params = {}
     if "modified_after" in request.args:
         params["modified_after"] = request.args["modified_after"]
@@ -97,13 +99,29 @@ def merge_list_contacts(client_id: int):
     if "page_size" in request.args:
         params["page_size"] = request.args.get("page_size", type=int)
 
+    if wants_all_accounts(request.args):
+        data = fan_out(client_id, lambda token, p: list_contacts(token, params=p), params)
+        return jsonify(data), status_for(data)
+
+    account_token = request.args.get("account_token")
+    if not account_token:
+        mla = MergeLinkedAccount.query.filter_by(client_id=client_id, status="active").first()
+        if not mla:
+            return jsonify({"error": "No Merge linked account found for client"}), 404
+        account_token = mla.account_token
+
     try:
+        if request.args.get("all", "").lower() in ("1", "true", "yes"):
+            # Follow every `next` cursor server-side and stream {"results": [...]}
+            return stream_pages("results", iter_pages("crm", "/contacts", params,
+                                                       fetch=lambda p: list_contacts(account_token, params=p)))
         data = list_contacts(account_token, params=params)
         return jsonify(data), 200
     except MergeServiceError as e:
         return jsonify({"error": str(e)}), 502
 
 @merge_bp.route("/clients/<int:client_id>/crm/contacts", methods=["POST"])
+@idempotent
 def merge_create_contact(client_id: int):
     """
     Body: { account_token, contact: {...Merge Contact common model...} }
@@ -121,6 +139,13 @@ def merge_create_contact(client_id: int):
     if not contact_body:
         return jsonify({"error": "contact body is required"}), 400
 
+    if outbox.wants_async():
+        # meta validation runs in the worker too, so the request never waits on Merge
+        emails = contact_body.get("email_addresses") or []
+        email = emails[0].get("email_address") if emails and isinstance(emails[0], dict) else None
+        return outbox.accept("merge.create_contact", {"account_token": account_token, "contact": contact_body},
+                             client_id, outbox.entity("merge", account_label(account_token), "contact", email))
+
     try:
         # Use meta validation to ensure we only send supported fields
         clean_contact = trim_and_validate_payload("contacts", contact_body, account_token)
@@ -202,7 +227,8 @@ def crm_allowlist_status():
 def merge_webhook():
     """
     Merge -> Your API
-    Verifies X-Merge-Webhook-Signature, then (best-effort) updates MergeLinkedAccount.
+    Verifies X-Merge-Webhook-Signature, queues the raw body and returns 204 right away.
+    services/merge_webhooks dedupes by (hook id, linked account) and batch-updates MergeLinkedAccount.
     """
     from services.merge_service import verify_webhook_signature
     sig = request.headers.get("X-Merge-Webhook-Signature")
@@ -211,62 +237,25 @@ def merge_webhook():
     if not verify_webhook_signature(raw, sig):
         return jsonify({"error": "invalid signature"}), 401
 
-    payload = request.get_json(silent=True) or {}
-    hook = (payload.get("hook") or {})
-    event_type = (hook.get("event_type") or "").lower()
-    la = (payload.get("linked_account") or {})
-
-    # Try to upsert MergeLinkedAccount using account_token or end_user_origin_id
-    account_token = la.get("account_token") or payload.get("account_token")
-    end_user_origin_id = la.get("end_user_origin_id") or la.get("end_user_id")
-    integration_slug = la.get("integration_slug") or la.get("integration") or None
-
-    # Update existing records if we can find them
-    updated = False
-    if account_token:
-        rec = MergeLinkedAccount.query.filter_by(account_token=account_token).first()
-        if rec:
-            # Reflect lifecycle events
-            if "deleted" in event_type:
-                rec.status = "disabled"
-            elif "linked" in event_type or "synced" in event_type or "changed" in event_type:
-                rec.status = "active"
-            if integration_slug and not rec.integration_slug:
-                rec.integration_slug = integration_slug
-            rec.raw = payload
-            db.session.commit()
-            updated = True
-
-    if not updated and end_user_origin_id:
-        rec = MergeLinkedAccount.query.filter_by(end_user_origin_id=end_user_origin_id).first()
-        if rec:
-            if account_token and rec.account_token != account_token:
-                rec.account_token = account_token
-            if "deleted" in event_type:
-                rec.status = "disabled"
-            else:
-                rec.status = "active"
-            rec.raw = payload
-            db.session.commit()
-            updated = True
-
-    # If we can't match anything, just accept and return 204 so Merge doesn't retry.
+    merge_webhooks.enqueue(raw)
+    # Even if nothing matches later, Merge gets its 204 so it doesn't retry.
     return ("", 204)
 
 @merge_bp.route("/webhook/debug", methods=["GET"])
 def merge_webhook_debug():
-    """Debug endpoint to check webhook configuration and latest webhook data"""
+    """Debug endpoint to check webhook configuration, queue depth and latest webhook data"""
     from services.merge_service import MERGE_WEBHOOK_SECRET
-    
+
     debug_info = {
         "webhook_secret_configured": bool(MERGE_WEBHOOK_SECRET),
         "webhook_secret_length": len(MERGE_WEBHOOK_SECRET) if MERGE_WEBHOOK_SECRET else 0,
-        "latest_webhook_data": None
+        "queue": merge_webhooks.queue_stats(),
+        "latest_webhook_data": merge_webhooks.latest_payload()
     }
-    
-    # Try to get the most recent webhook data from any linked account
-    latest_account = MergeLinkedAccount.query.order_by(MergeLinkedAccount.updated_at.desc()).first()
-    if latest_account and latest_account.raw:
-        debug_info["latest_webhook_data"] = latest_account.raw
-    
-    return jsonify(debug_info), 200 
\ No newline at end of file
+
+    return jsonify(debug_info), 200
+
+@merge_bp.route("/rate-limits", methods=["GET"])
+def merge_rate_limits():
+    """Rate-limit budgets the governor has seen in Merge response headers (per key and linked account)."""
+    return jsonify(governor.stats()), 200
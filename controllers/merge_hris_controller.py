@@ -1,6 +1,12 @@
 # controllers/merge_hris_controller.py
 from flask import Blueprint, request, jsonify
-from models import MergeLinkedAccount
+from datetime import datetime
+from models import MergeLinkedAccount, MergePassthroughJob, MergeSyncCursor, MergeHrisSnapshot
+from services import merge_passthrough_jobs, callbacks
+from services.merge_fanout import fan_out, status_for, wants_all_accounts, active_accounts
+from services import merge_hris_reports, merge_hris_snapshots
+from services.merge_client import iter_pages
+from services.streaming import stream_pages
 from services.merge_service import (
     MergeServiceError,
     hris_list_employees, hris_get_employee,
@@ -20,15 +26,29 @@ def _resolve_account_token(client_id: int, explicit: str | None):
         return None
     return rec.account_token
 
+def _list_response(list_fn, token: str, path: str, params: dict):
+    """One page, or with all=true every page (following `next`) streamed as {"results": [...]}."""
+    if str(params.pop("all", "")).lower() in ("1", "true", "yes"):
+        return stream_pages("results", iter_pages("hris", path, params, fetch=lambda p: list_fn(token, p)))
+    return jsonify(list_fn(token, params)), 200
+
+def _aggregate(client_id: int, list_fn):
+    """accounts=all: query every active linked account in parallel; partial results plus per-account errors."""
+    params = {k: v for k, v in request.args.items() if k not in ("account_token", "accounts")}
+    data = fan_out(client_id, list_fn, params)
+    return jsonify(data), status_for(data)
+
 # ---------- READS ----------
 @hris_bp.route("/clients/<int:client_id>/employees", methods=["GET"])
 def hris_employees(client_id: int):
+    if wants_all_accounts(request.args):
+        return _aggregate(client_id, hris_list_employees)
     token = _resolve_account_token(client_id, request.args.get("account_token"))
     if not token:
         return jsonify({"error": "No Merge linked account found for client"}), 404
     params = {k: v for k, v in request.args.items() if k not in ("account_token",)}
     try:
-        return jsonify(hris_list_employees(token, params)), 200
+        return _list_response(hris_list_employees, token, "/employees", params)
     except MergeServiceError as e:
         return jsonify({"error": str(e)}), 502
 
@@ -44,17 +64,21 @@ def hris_employee_detail(client_id: int, employee_id: str):
 
 @hris_bp.route("/clients/<int:client_id>/employments", methods=["GET"])
 def hris_employments(client_id: int):
+    if wants_all_accounts(request.args):
+        return _aggregate(client_id, hris_list_employments)
     token = _resolve_account_token(client_id, request.args.get("account_token"))
     if not token:
         return jsonify({"error": "No Merge linked account found for client"}), 404
     params = {k: v for k, v in request.args.items() if k not in ("account_token",)}
     try:
-        return jsonify(hris_list_employments(token, params)), 200
+        return _list_response(hris_list_employments, token, "/employments", params)
     except MergeServiceError as e:
         return jsonify({"error": str(e)}), 502
 
 @hris_bp.route("/clients/<int:client_id>/locations", methods=["GET"])
 def hris_locations(client_id: int):
+    if wants_all_accounts(request.args):
+        return _aggregate(client_id, hris_list_locations)
     token = _resolve_account_token(client_id, request.args.get("account_token"))
     if not token:
         return jsonify({"error": "No Merge linked account found for client"}), 404
@@ -66,6 +90,8 @@ def hris_locations(client_id: int):
 
 @hris_bp.route("/clients/<int:client_id>/groups", methods=["GET"])
 def hris_groups(client_id: int):
+    if wants_all_accounts(request.args):
+        return _aggregate(client_id, hris_list_groups)
     token = _resolve_account_token(client_id, request.args.get("account_token"))
     if not token:
         return jsonify({"error": "No Merge linked account found for client"}), 404
@@ -78,6 +104,8 @@ def hris_groups(client_id: int):
 # ---------- WRITES (Unified) ----------
 @hris_bp.route("/clients/<int:client_id>/time-off", methods=["GET", "POST"])
 def hris_time_off(client_id: int):
+    if request.method == "GET" and wants_all_accounts(request.args):
+        return _aggregate(client_id, hris_list_time_off)
     token = _resolve_account_token(client_id, request.args.get("account_token") or (request.json or {}).get("account_token"))
     if not token:
         return jsonify({"error": "No Merge linked account found for client"}), 404
@@ -85,7 +113,7 @@ def hris_time_off(client_id: int):
     if request.method == "GET":
         params = {k: v for k, v in request.args.items() if k not in ("account_token",)}
         try:
-            return jsonify(hris_list_time_off(token, params)), 200
+            return _list_response(hris_list_time_off, token, "/time-off", params)
         except MergeServiceError as e:
             return jsonify({"error": str(e)}), 502
 
@@ -112,6 +140,8 @@ def hris_time_off_detail(client_id: int, id_: str):
 
 @hris_bp.route("/clients/<int:client_id>/timesheet-entries", methods=["GET", "POST"])
 def hris_timesheet_entries(client_id: int):
+    if request.method == "GET" and wants_all_accounts(request.args):
+        return _aggregate(client_id, hris_list_timesheet_entries)
     token = _resolve_account_token(client_id, request.args.get("account_token") or (request.json or {}).get("account_token"))
     if not token:
         return jsonify({"error": "No Merge linked account found for client"}), 404
@@ -156,13 +186,22 @@ def hris_passthrough_proxy(client_id: int):
       "request_format": "JSON",         # or XML, MULTIPART
       "headers": {...},                 # optional extra headers
       "base_url_override": "https://api.vendor.com",  # optional if Merge knows it
-      "run_async": false
+      "run_async": false,
+      "callback_url": "https://..."     # optional; POSTed the job once an async result is ready
     }
+    run_async=true returns 202 with a job id; poll GET /api/merge/hris/clients/{client_id}/passthrough/jobs/{id}.
+    callback_url must be https to a public host, or a host in CALLBACK_ALLOWED_HOSTS.
     """
     body = request.get_json(force=True) or {}
     token = _resolve_account_token(client_id, body.get("account_token"))
     if not token:
         return jsonify({"error": "No Merge linked account found for client"}), 404
+    run_async = bool(body.get("run_async", False))
+    if run_async and body.get("callback_url"):
+        try:
+            callbacks.check_url(body["callback_url"])
+        except callbacks.CallbackUrlError as e:
+            return jsonify({"error": str(e)}), 400
     try:
         result = hris_passthrough(
             token,
@@ -172,8 +211,138 @@ def hris_passthrough_proxy(client_id: int):
             request_format=body.get("request_format", "JSON"),
             headers=body.get("headers"),
             base_url_override=body.get("base_url_override"),
-            run_async=bool(body.get("run_async", False)),
+            run_async=run_async,
         )
+        if run_async:
+            request_body = {k: body.get(k) for k in ("method", "path", "request_format", "base_url_override") if body.get(k)}
+            job = merge_passthrough_jobs.create_job(client_id, token, result, request_body, body.get("callback_url"))
+            return jsonify({**merge_passthrough_jobs.to_dict(job),
+                            "poll_url": f"/api/merge/hris/clients/{client_id}/passthrough/jobs/{job.id}"}), 202
         return jsonify(result), 200
     except MergeServiceError as e:
-        return jsonify({"error": str(e)}), 502 
\ No newline at end of file
+        return jsonify({"error": str(e)}), 502
+
+@hris_bp.route("/clients/<int:client_id>/passthrough/jobs/<int:job_id>", methods=["GET"])
+def hris_passthrough_job(client_id: int, job_id: int):
+    """Status of one of the client's async-passthrough jobs; `result` holds the vendor response once status is 'done'."""
+    job = MergePassthroughJob.query.filter_by(id=job_id, client_id=client_id).first()
+    if not job:
+        return jsonify({"error": "Passthrough job not found"}), 404
+    return jsonify(merge_passthrough_jobs.to_dict(job)), 200
+
+# ---------- REPORTS (local mirror of timesheets / time off) ----------
+def _report_params(default_period: str):
+    group_by = request.args.get("group_by", "employee")
+    period = request.args.get("period", default_period)
+    if group_by not in merge_hris_reports.GROUP_BY:
+        return None, f"group_by must be one of {', '.join(merge_hris_reports.GROUP_BY)}"
+    if period not in merge_hris_reports.PERIODS:
+        return None, f"period must be one of {', '.join(merge_hris_reports.PERIODS)}"
+    try:
+        start = datetime.fromisoformat(request.args["start"]) if request.args.get("start") else None
+        end = datetime.fromisoformat(request.args["end"]) if request.args.get("end") else None
+    except ValueError:
+        return None, "start/end must be ISO dates (YYYY-MM-DD)"
+    return {"group_by": group_by, "period": period, "start": start, "end": end}, None
+
+def _synced_at(account_ids, model: str):
+    """Oldest completed sync among the client's accounts (None until every one has synced)."""
+    rows = MergeSyncCursor.query.filter(MergeSyncCursor.linked_account_id.in_(account_ids),
+                                        MergeSyncCursor.model == model).all()
+    stamps = [r.last_synced_at for r in rows]
+    if not stamps or None in stamps:
+        return None
+    return min(stamps).isoformat()
+
+def _report(client_id: int, model: str, default_period: str, run):
+    params, error = _report_params(default_period)
+    if error:
+        return jsonify({"error": error}), 400
+    account_ids = [la.id for la in active_accounts(client_id)]
+    if not account_ids:
+        return jsonify({"error": "No Merge linked account found for client"}), 404
+    rows = run(account_ids, **params)
+    return jsonify({
+        **{k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in params.items()},
+        "rows": rows,
+        "synced_at": _synced_at(account_ids, model),
+    }), 200
+
+@hris_bp.route("/clients/<int:client_id>/reports/hours", methods=["GET"])
+def hris_report_hours(client_id: int):
+    """
+    Timesheet hours from the local mirror, summed in SQL.
+    Query: group_by=employee|group|location, period=day|week|month|all, start, end (ISO dates, on start_time)
+    """
+    return _report(client_id, "timesheet-entries", "week", merge_hris_reports.hours_worked)
+
+@hris_bp.route("/clients/<int:client_id>/reports/time-off", methods=["GET"])
+def hris_report_time_off(client_id: int):
+    """
+    Time off amounts from the local mirror, summed in SQL per units (HOURS/DAYS).
+    Query: group_by, period (default month), start, end, status (default APPROVED, 'any' for all), request_type, units
+    """
+    status = request.args.get("status", "APPROVED")
+    return _report(client_id, "time-off", "month", lambda ids, **p: merge_hris_reports.time_off(
+        ids, status=None if status.lower() == "any" else status,
+        request_type=request.args.get("request_type"), units=request.args.get("units"), **p))
+
+# ---------- DIRECTORY SNAPSHOTS (hash-based change detection) ----------
+def _linked_account(client_id: int, explicit: str | None):
+    token = _resolve_account_token(client_id, explicit)
+    if not token:
+        return None
+    return MergeLinkedAccount.query.filter_by(client_id=client_id, account_token=token).first()
+
+def _snapshot_dict(snap: MergeHrisSnapshot):
+    return {
+        "id": snap.id,
+        "linked_account_id": snap.linked_account_id,
+        "created_at": snap.created_at.isoformat() if snap.created_at else None,
+        "counts": snap.counts or {},
+    }
+
+@hris_bp.route("/clients/<int:client_id>/snapshots", methods=["GET", "POST"])
+def hris_snapshots(client_id: int):
+    """
+    POST pulls the full employee + employment directory and stores a content hash
+    per record (only changed records are written). GET lists recent snapshots.
+    """
+    explicit = request.args.get("account_token")
+    if request.method == "POST":
+        explicit = explicit or (request.get_json(silent=True) or {}).get("account_token")
+    la = _linked_account(client_id, explicit)
+    if not la:
+        return jsonify({"error": "No Merge linked account found for client"}), 404
+    if request.method == "POST":
+        try:
+            snap = merge_hris_snapshots.take_snapshot(la)
+        except MergeServiceError as e:
+            return jsonify({"error": str(e)}), 502
+        return jsonify(_snapshot_dict(snap)), 201
+    snaps = (MergeHrisSnapshot.query.filter_by(linked_account_id=la.id)
+             .order_by(MergeHrisSnapshot.id.desc()).limit(50).all())
+    return jsonify({"results": [_snapshot_dict(s) for s in snaps]}), 200
+
+@hris_bp.route("/clients/<int:client_id>/snapshots/diff", methods=["GET"])
+def hris_snapshot_diff(client_id: int):
+    """
+    Records added, changed or removed since a snapshot.
+    Query: since=<snapshot id> (0 or omitted = full directory), model=employees|employments (optional)
+    Pass the returned snapshot_id as `since` next time.
+    """
+    la = _linked_account(client_id, request.args.get("account_token"))
+    if not la:
+        return jsonify({"error": "No Merge linked account found for client"}), 404
+    try:
+        since = int(request.args.get("since") or 0)
+    except ValueError:
+        return jsonify({"error": "since must be a snapshot id"}), 400
+    if since:
+        snap = MergeHrisSnapshot.query.get(since)
+        if not snap or snap.linked_account_id != la.id:
+            return jsonify({"error": "Snapshot not found for this linked account"}), 404
+    model = request.args.get("model")
+    if model and model not in merge_hris_snapshots.SNAPSHOT_MODELS:
+        return jsonify({"error": f"model must be one of {', '.join(merge_hris_snapshots.SNAPSHOT_MODELS)}"}), 400
+    return jsonify(merge_hris_snapshots.diff(la.id, since, [model] if model else None)), 200
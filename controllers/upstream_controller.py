@@ -0,0 +1,114 @@
+# controllers/upstream_controller.py
+from flask import Blueprint, jsonify
+from models import OutboxWrite
+from services import circuit_breaker, idempotency, outbox
+from services.bulkhead import bulkhead
+from services.single_flight import flights
+from services.route_cache import route_cache
+
+upstream_bp = Blueprint("upstream", __name__, url_prefix="/api/upstream")
+
+
+@upstream_bp.route("/breakers", methods=["GET"])
+def breakers():
+    """
+    Circuit breaker state per vendor and tenant host
+    ---
+    tags:
+      - Upstream
+    responses:
+      200:
+        description: State, error/slow-call rates over the window, fast-fail time left and rejected calls
+    """
+    return jsonify({"breakers": circuit_breaker.stats()}), 200
+
+
+@upstream_bp.route("/bulkheads", methods=["GET"])
+def bulkheads():
+    """
+    Concurrency slots per vendor (and per tenant where capped)
+    ---
+    tags:
+      - Upstream
+    responses:
+      200:
+        description: Limit, slots in use, callers waiting, rejected calls and the longest queue time
+    """
+    return jsonify({"bulkheads": bulkhead.stats()}), 200
+
+
+@upstream_bp.route("/coalescing", methods=["GET"])
+def coalescing():
+    """
+    Single-flight counts per vendor
+    ---
+    tags:
+      - Upstream
+    responses:
+      200:
+        description: Upstream calls made, identical concurrent reads that shared one, and calls in flight
+    """
+    return jsonify({"coalescing": flights.stats()}), 200
+
+
+@upstream_bp.route("/cache", methods=["GET"])
+def cache_stats():
+    """
+    Route cache hit rates
+    ---
+    tags:
+      - Upstream
+    responses:
+      200:
+        description: Hits, stale hits, misses, background refreshes, invalidations, entries and hit rate per cached route
+    """
+    return jsonify({"cache": route_cache.stats()}), 200
+
+
+@upstream_bp.route("/idempotency", methods=["GET"])
+def idempotency_stats():
+    """
+    Idempotency-Key store
+    ---
+    tags:
+      - Upstream
+    responses:
+      200:
+        description: Stored keys by state, responses stored and replayed, and retries turned away (in flight, key reuse)
+    """
+    return jsonify({"idempotency": idempotency.stats()}), 200
+
+
+@upstream_bp.route("/outbox", methods=["GET"])
+def outbox_stats():
+    """
+    Queued CRM writes
+    ---
+    tags:
+      - Upstream
+    responses:
+      200:
+        description: Writes per vendor and status, vendors paused by rate limits and the worker count
+    """
+    return jsonify({"outbox": outbox.queue_stats()}), 200
+
+
+@upstream_bp.route("/outbox/<int:write_id>", methods=["GET"])
+def outbox_write(write_id: int):
+    """Status of a queued write; `result` holds the vendor response once status is 'done'."""
+    w = OutboxWrite.query.get(write_id)
+    if not w or not outbox.belongs_to_caller(w):
+        return jsonify({"error": "Outbox write not found"}), 404
+    return jsonify(outbox.to_dict(w)), 200
+
+
+@upstream_bp.route("/outbox/<int:write_id>/retry", methods=["POST"])
+def outbox_retry(write_id: int):
+    """Re-queue a failed write."""
+    w = OutboxWrite.query.get(write_id)
+    if not w or not outbox.belongs_to_caller(w):
+        return jsonify({"error": "Outbox write not found"}), 404
+    if w.status != "failed":
+        return jsonify({"error": f"Only failed writes can be retried (status is {w.status})"}), 409
+    outbox.retry(w)
+    return jsonify(outbox.to_dict(w)), 202
@@ -69,6 +69,37 @@ class JobberToken(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
+class CapsuleClientToken(db.Model):
+    """Capsule CRM OAuth tokens per client (multi-tenant; CapsuleToken stays the single-tenant fallback)"""
+    __tablename__ = 'capsule_client_tokens'
+
+    id = db.Column(db.Integer, primary_key=True)
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False, unique=True)
+    access_token = db.Column(db.String(500), nullable=False)
+    refresh_token = db.Column(db.String(500), nullable=True)
+    expires_at = db.Column(db.Integer, nullable=False, index=True)  # Unix timestamp
+    refresh_after = db.Column(db.Integer)  # Unix timestamp; lease/backoff for the background refresher
+    refresh_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class JobberClientToken(db.Model):
+    """Jobber CRM OAuth tokens per client (multi-tenant; JobberToken stays the single-tenant fallback)"""
+    __tablename__ = 'jobber_client_tokens'
+
+    id = db.Column(db.Integer, primary_key=True)
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False, unique=True)
+    access_token = db.Column(db.String(500), nullable=False)
+    refresh_token = db.Column(db.String(500), nullable=True)
+    expires_at = db.Column(db.Integer, nullable=False, index=True)  # Unix timestamp
+    refresh_after = db.Column(db.Integer)  # Unix timestamp; lease/backoff for the background refresher
+    refresh_error = db.Column(db.Text)
+    jobber_account_id = db.Column(db.String(100), index=True)  # Jobber account connected; matches webhook accountId
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 class JobNimbusCredentials(db.Model):
     """JobNimbus CRM API credentials table"""
     __tablename__ = 'jobnimbus_credentials'
@@ -135,6 +166,7 @@ class JobberClientData(db.Model):
     crm_id = db.Column(db.Integer, db.ForeignKey('crms.id'), nullable=False)
     source_client_id = db.Column(db.String(100), nullable=False)
     crm_client_id = db.Column(db.String(100))
+    jobber_account_id = db.Column(db.String(100), index=True)  # Jobber account the record belongs to
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(100))
     phone_number = db.Column(db.String(20))
@@ -175,4 +207,242 @@ class MergeLinkedAccount(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    client = db.relationship('Clients', backref=db.backref('merge_linked_accounts', lazy=True))
\ No newline at end of file
+    client = db.relationship('Clients', backref=db.backref('merge_linked_accounts', lazy=True))
+
+class BitrixEvent(db.Model):
+    """Bitrix24 outbound webhook events queued for background processing"""
+    __tablename__ = 'bitrix_events'
+
+    id = db.Column(db.Integer, primary_key=True)
+    event = db.Column(db.String(100), nullable=False)        # e.g. ONCRMDEALUPDATE
+    entity_type = db.Column(db.String(50))                   # contact|deal|lead|company
+    entity_id = db.Column(db.String(50))
+    domain = db.Column(db.String(255))                       # portal domain from auth[domain]
+    payload = db.Column(db.JSON)
+    status = db.Column(db.String(20), default='pending', index=True)  # pending|processing|done|failed
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # pushed back on retry
+    processed_at = db.Column(db.DateTime)
+
+
+class BitrixEntityMirror(db.Model):
+    """Local copy of Bitrix24 CRM entities, kept fresh from webhook events"""
+    __tablename__ = 'bitrix_entity_mirror'
+    __table_args__ = (db.UniqueConstraint('client_id', 'entity_type', 'entity_id', name='uq_bitrix_mirror_entity'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False, index=True)
+    entity_type = db.Column(db.String(50), nullable=False)
+    entity_id = db.Column(db.String(50), nullable=False)
+    data = db.Column(db.JSON)
+    synced_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class MergeWebhookEvent(db.Model):
+    """Raw Merge webhook deliveries queued for background processing"""
+    __tablename__ = 'merge_webhook_events'
+
+    id = db.Column(db.Integer, primary_key=True)
+    body = db.Column(db.Text, nullable=False)  # exact raw body as delivered (signature already verified)
+    status = db.Column(db.String(20), default='pending', index=True)  # pending|processing|done|failed
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    processed_at = db.Column(db.DateTime)
+
+
+class MergeCommonModel(db.Model):
+    """Local mirror of Merge common model records (one row per linked account/model/object)"""
+    __tablename__ = 'merge_common_models'
+    __table_args__ = (
+        db.UniqueConstraint('linked_account_id', 'category', 'model', 'object_id', name='uq_merge_common_model_object'),
+        db.Index('ix_merge_common_models_lookup', 'linked_account_id', 'category', 'model', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    linked_account_id = db.Column(db.Integer, db.ForeignKey('merge_linked_accounts.id'), nullable=False)
+    category = db.Column(db.String(20), nullable=False)   # crm|hris
+    model = db.Column(db.String(50), nullable=False)      # contacts, accounts, ...
+    object_id = db.Column(db.String(64), nullable=False)  # Merge id
+    data = db.Column(JSONB)
+    remote_modified_at = db.Column(db.DateTime, index=True)  # Merge modified_at
+    synced_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class MergeSyncCursor(db.Model):
+    """modified_after cursor per linked account and model for the Merge mirror sync"""
+    __tablename__ = 'merge_sync_cursors'
+    __table_args__ = (db.UniqueConstraint('linked_account_id', 'category', 'model', name='uq_merge_sync_cursor'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    linked_account_id = db.Column(db.Integer, db.ForeignKey('merge_linked_accounts.id'), nullable=False, index=True)
+    category = db.Column(db.String(20), nullable=False)
+    model = db.Column(db.String(50), nullable=False)
+    modified_after = db.Column(db.String(64))  # ISO timestamp of the newest record seen
+    last_synced_at = db.Column(db.DateTime)
+    next_sync_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    error = db.Column(db.Text)
+
+
+class MergePassthroughJob(db.Model):
+    """Merge async-passthrough receipts tracked until the vendor response is available"""
+    __tablename__ = 'merge_passthrough_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False, index=True)
+    account_token = db.Column(db.String(255), nullable=False)
+    category = db.Column(db.String(20), nullable=False, default='hris')
+    receipt_id = db.Column(db.String(64), nullable=False, unique=True)  # async_passthrough_receipt_id
+    request = db.Column(JSONB)   # method/path/... as sent to Merge
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending|done|failed
+    polls = db.Column(db.Integer, nullable=False, default=0)
+    result = db.Column(JSONB)    # Merge RemoteResponse once ready
+    error = db.Column(db.Text)
+    callback_url = db.Column(db.String(1024))
+    callback_status = db.Column(db.Integer)  # HTTP status of the completion callback, if any
+    next_poll_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+
+
+class MergeTimesheetEntry(db.Model):
+    """Typed copy of mirrored Merge HRIS timesheet entries, for grouped reporting queries"""
+    __tablename__ = 'merge_timesheet_entries'
+    __table_args__ = (
+        db.UniqueConstraint('linked_account_id', 'object_id', name='uq_merge_timesheet_entry'),
+        db.Index('ix_merge_timesheet_entries_period', 'linked_account_id', 'start_time'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    linked_account_id = db.Column(db.Integer, db.ForeignKey('merge_linked_accounts.id'), nullable=False)
+    object_id = db.Column(db.String(64), nullable=False)
+    employee_id = db.Column(db.String(64), index=True)
+    hours_worked = db.Column(db.Float, nullable=False, default=0)
+    start_time = db.Column(db.DateTime)
+    end_time = db.Column(db.DateTime)
+    remote_modified_at = db.Column(db.DateTime)
+
+
+class MergeTimeOff(db.Model):
+    """Typed copy of mirrored Merge HRIS time off requests, for grouped reporting queries"""
+    __tablename__ = 'merge_time_off'
+    __table_args__ = (
+        db.UniqueConstraint('linked_account_id', 'object_id', name='uq_merge_time_off'),
+        db.Index('ix_merge_time_off_period', 'linked_account_id', 'start_time'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    linked_account_id = db.Column(db.Integer, db.ForeignKey('merge_linked_accounts.id'), nullable=False)
+    object_id = db.Column(db.String(64), nullable=False)
+    employee_id = db.Column(db.String(64), index=True)
+    status = db.Column(db.String(30))        # REQUESTED|APPROVED|DECLINED|CANCELLED|DELETED
+    request_type = db.Column(db.String(30))  # VACATION|SICK|PERSONAL|...
+    units = db.Column(db.String(10))         # HOURS|DAYS
+    amount = db.Column(db.Float, nullable=False, default=0)
+    start_time = db.Column(db.DateTime)
+    end_time = db.Column(db.DateTime)
+    remote_modified_at = db.Column(db.DateTime)
+
+
+class MergeEmployeeDimension(db.Model):
+    """Employee -> group / work location memberships used to roll HRIS reports up"""
+    __tablename__ = 'merge_employee_dimensions'
+    __table_args__ = (
+        db.Index('ix_merge_employee_dimensions_lookup', 'linked_account_id', 'dimension', 'employee_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    linked_account_id = db.Column(db.Integer, db.ForeignKey('merge_linked_accounts.id'), nullable=False)
+    employee_id = db.Column(db.String(64), nullable=False)
+    dimension = db.Column(db.String(20), nullable=False)  # group|location
+    value = db.Column(db.String(64), nullable=False)
+
+
+class MergeHrisSnapshot(db.Model):
+    """One full pull of a linked account's employee directory (employees + employments)"""
+    __tablename__ = 'merge_hris_snapshots'
+
+    id = db.Column(db.Integer, primary_key=True)
+    linked_account_id = db.Column(db.Integer, db.ForeignKey('merge_linked_accounts.id'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    counts = db.Column(JSONB)  # {"employees": {"total", "added", "changed", "removed"}, "employments": {...}}
+
+
+class MergeHrisRecordHash(db.Model):
+    """Latest normalised content hash per HRIS record, versioned by the snapshot that last touched it"""
+    __tablename__ = 'merge_hris_record_hashes'
+    __table_args__ = (
+        db.UniqueConstraint('linked_account_id', 'model', 'object_id', name='uq_merge_hris_record_hash'),
+        db.Index('ix_merge_hris_record_hashes_changed', 'linked_account_id', 'changed_snapshot_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    linked_account_id = db.Column(db.Integer, db.ForeignKey('merge_linked_accounts.id'), nullable=False)
+    model = db.Column(db.String(50), nullable=False)  # employees|employments
+    object_id = db.Column(db.String(64), nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)  # sha256 hex
+    data = db.Column(JSONB)
+    created_snapshot_id = db.Column(db.Integer, nullable=False)
+    changed_snapshot_id = db.Column(db.Integer, nullable=False)  # == created on first sight; bumped on hash change/removal
+    removed_snapshot_id = db.Column(db.Integer)
+
+
+class JobberWebhookEvent(db.Model):
+    """Jobber webhook deliveries (topic + item id) queued for the mirror worker"""
+    __tablename__ = 'jobber_webhook_events'
+
+    id = db.Column(db.Integer, primary_key=True)
+    topic = db.Column(db.String(50), nullable=False)   # e.g. CLIENT_UPDATE, JOB_CREATE
+    item_id = db.Column(db.String(100), nullable=False)
+    account_id = db.Column(db.String(100))             # Jobber account the item belongs to
+    occurred_at = db.Column(db.String(64))
+    status = db.Column(db.String(20), default='pending', index=True)  # pending|processing|done|failed
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    processed_at = db.Column(db.DateTime)
+
+
+class OutboxWrite(db.Model):
+    """CRM writes accepted with 202 and delivered to the vendor by the outbox workers"""
+    __tablename__ = 'outbox_writes'
+    __table_args__ = (db.Index('ix_outbox_writes_entity', 'entity_key', 'id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), index=True)  # None for single-tenant vendors
+    tenant_hash = db.Column(db.String(64))  # sha256 of the accepting request's tenant headers; scopes client-less writes
+    operation = db.Column(db.String(50), nullable=False)   # e.g. builderprime.create_lead
+    vendor = db.Column(db.String(30), nullable=False, index=True)
+    entity_key = db.Column(db.String(255))  # writes sharing a key are delivered one at a time, oldest first
+    payload = db.Column(db.JSON)
+    status = db.Column(db.String(20), default='pending', index=True)  # pending|processing|done|failed
+    attempts = db.Column(db.Integer, default=0)
+    result = db.Column(db.JSON)  # vendor response once done
+    error = db.Column(db.Text)
+    callback_url = db.Column(db.String(1024))
+    callback_status = db.Column(db.Integer)  # HTTP status of the completion callback, if any
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # pushed back on retry
+    completed_at = db.Column(db.DateTime)
+
+
+class IdempotencyKey(db.Model):
+    """Responses of create requests stored under the caller's Idempotency-Key, replayed on retries"""
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (db.UniqueConstraint('scope', 'key', name='uq_idempotency_key'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(64), nullable=False)        # sha256 of tenant headers + method + path
+    key = db.Column(db.String(255), nullable=False)         # Idempotency-Key header as sent
+    fingerprint = db.Column(db.String(64), nullable=False)  # sha256 of query string + body; a reused key must match
+    status = db.Column(db.String(20), nullable=False, default='in_flight')  # in_flight|done
+    response_status = db.Column(db.Integer)
+    response_headers = db.Column(db.JSON)
+    response_body = db.Column(db.LargeBinary)
+    locked_at = db.Column(db.DateTime, default=datetime.utcnow)  # when the request holding the key started
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
@@ -1,11 +1,15 @@
 from flask import Blueprint
 from controllers.builderprime_controller import BuilderPrimeController
+from services.route_cache import cached, invalidates
+from services.idempotency import idempotent
 
 # Create blueprint for BuilderPrime routes
 builderprime_bp = Blueprint('builderprime', __name__, url_prefix='/api/builderprime')
 
 # Route for creating leads
 @builderprime_bp.route('/clients/<int:client_id>/leads', methods=['POST'])
+@idempotent
+@invalidates('builderprime_data')
 def create_lead(client_id):
     """
     Create a new lead/opportunity in BuilderPrime for a specific client
@@ -45,6 +49,7 @@ def get_client_leads(client_id):
 
 # Route for fetching data from BuilderPrime API
 @builderprime_bp.route('/clients/<int:client_id>/data', methods=['GET'])
+@cached('builderprime_data', ttl=60, swr=300)
 def fetch_builderprime_data(client_id):
     """
     Fetch data from BuilderPrime API for a specific client
@@ -68,6 +73,7 @@ def fetch_builderprime_data(client_id):
 
 # Route for updating BuilderPrime leads
 @builderprime_bp.route('/clients/<int:client_id>/leads/<opportunity_id>', methods=['PUT'])
+@invalidates('builderprime_data')
 def update_lead(client_id, opportunity_id):
     """
     Update a lead/opportunity in BuilderPrime
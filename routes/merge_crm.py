@@ -1,154 +1,208 @@
 # routes/merge_crm.py
+import json
 from flask import Blueprint, request, jsonify
-from services.merge_client import call
+from werkzeug.datastructures import MultiDict
+from services.merge_client import call, proxy, current_account_token, iter_pages
+from services import merge_mirror, merge_resolver
+from services.streaming import stream_pages
+from services.route_cache import cached, invalidates
+from services.idempotency import idempotent
 
 crm_bp = Blueprint("crm_bp", __name__, url_prefix="/api/merge/crm")
 
+def _flag(args, name: str) -> bool:
+    return args.get(name, "").lower() in ("1", "true", "yes")
+
+def _upstream_params(args):
+    return [(k, v) for k, v in args.items(multi=True) if k not in ("live", "all")]
+
+def _args():
+    """Query args minus ?resolve=, which is ours and never goes to the mirror or Merge."""
+    return MultiDict([(k, v) for k, v in request.args.items(multi=True) if k != "resolve"])
+
+def _list(model: str):
+    """
+    Serve a list from the local mirror when possible; ?live=true always goes to Merge.
+    ?all=true follows every `next` cursor and streams {"results": [...]} in one response.
+    ?resolve=account,owner inlines related objects, batch-loaded once per related model.
+    """
+    args = _args()
+    if _flag(args, "all"):
+        return stream_pages("results", iter_pages("crm", f"/{model}", dict(_upstream_params(args))))
+    resolve = merge_resolver.parse_resolve(request.args.get("resolve"))
+    data = None if _flag(args, "live") else merge_mirror.serve_list("crm", model, current_account_token(), args)
+    if resolve:
+        data = data or call("crm", "GET", f"/{model}", params=_upstream_params(args))
+        merge_resolver.resolve("crm", data.get("results") or [], resolve)
+    if data is not None:
+        return jsonify(data)
+    return proxy("crm", "GET", f"/{model}", params=_upstream_params(args))
+
+def _get(model: str, id):
+    args = _args()
+    resolve = merge_resolver.parse_resolve(request.args.get("resolve"))
+    data = None if _flag(args, "live") else merge_mirror.serve_detail("crm", model, current_account_token(), str(id), args)
+    if resolve:
+        data = data or call("crm", "GET", f"/{model}/{id}", params=_upstream_params(args))
+        merge_resolver.resolve("crm", [data], resolve)
+    if data is not None:
+        return jsonify(data)
+    return proxy("crm", "GET", f"/{model}/{id}", params=_upstream_params(args))
+
+def _write(model: str, method: str, path: str):
+    """Create/update through Merge; a 2xx answer's `model` goes into the mirror so reads don't lag the write."""
+    resp = proxy("crm", method, path, json={"model": request.json or {}})
+    if 200 <= resp.status_code < 300:
+        try:
+            record = json.loads(resp.get_data()).get("model")  # buffers the body; write answers are small
+        except (ValueError, AttributeError):
+            record = None
+        merge_mirror.record_write("crm", model, current_account_token(), record)
+    return resp
+
 # --- ACCOUNTS (GET, POST, GET{id}, PATCH{id})
 @crm_bp.get("/accounts")
 def crm_accounts_list():
-    return jsonify(call("crm", "GET", "/accounts", params=request.args))
+    return _list("accounts")
 
 @crm_bp.post("/accounts")
+@idempotent
 def crm_accounts_create():
-    body = {"model": request.json or {}}
-    return jsonify(call("crm", "POST", "/accounts", json=body)), 201
+    return _write("accounts", "POST", "/accounts")
 
 @crm_bp.get("/accounts/<uuid:id>")
 def crm_accounts_get(id):
-    return jsonify(call("crm", "GET", f"/accounts/{id}", params=request.args))
+    return _get("accounts", id)
 
 @crm_bp.patch("/accounts/<uuid:id>")
 def crm_accounts_update(id):
-    body = {"model": request.json or {}}
-    return jsonify(call("crm", "PATCH", f"/accounts/{id}", json=body))
+    return _write("accounts", "PATCH", f"/accounts/{id}")
 
 # --- CONTACTS (GET, POST, GET{id}, PATCH{id}, IGNORE)
 @crm_bp.get("/contacts")
 def crm_contacts_list():
-    return jsonify(call("crm", "GET", "/contacts", params=request.args))
+    return _list("contacts")
 
 @crm_bp.post("/contacts")
+@idempotent
 def crm_contacts_create():
-    body = {"model": request.json or {}}
-    return jsonify(call("crm", "POST", "/contacts", json=body)), 201
+    return _write("contacts", "POST", "/contacts")
 
 @crm_bp.get("/contacts/<uuid:id>")
 def crm_contacts_get(id):
-    return jsonify(call("crm", "GET", f"/contacts/{id}", params=request.args))
+    return _get("contacts", id)
 
 @crm_bp.patch("/contacts/<uuid:id>")
 def crm_contacts_update(id):
-    body = {"model": request.json or {}}
-    return jsonify(call("crm", "PATCH", f"/contacts/{id}", json=body))
+    return _write("contacts", "PATCH", f"/contacts/{id}")
 
 @crm_bp.post("/contacts/ignore/<string:model_id>")
 def crm_contacts_ignore(model_id):
     # Marks a remote record as ignored so Merge won't sync it again.
-    return jsonify(call("crm", "POST", f"/contacts/ignore/{model_id}", json={"reason": "ignored via API"}))
+    return proxy("crm", "POST", f"/contacts/ignore/{model_id}", json={"reason": "ignored via API"})
 
 # --- LEADS (GET, POST, GET{id})
 @crm_bp.get("/leads")
 def crm_leads_list():
-    return jsonify(call("crm", "GET", "/leads", params=request.args))
+    return _list("leads")
 
 @crm_bp.post("/leads")
+@idempotent
 def crm_leads_create():
-    body = {"model": request.json or {}}
-    return jsonify(call("crm", "POST", "/leads", json=body)), 201
+    return _write("leads", "POST", "/leads")
 
 @crm_bp.get("/leads/<uuid:id>")
 def crm_leads_get(id):
-    return jsonify(call("crm", "GET", f"/leads/{id}", params=request.args))
+    return _get("leads", id)
 
 # --- OPPORTUNITIES (GET, POST, GET{id}, PATCH{id})
 @crm_bp.get("/opportunities")
 def crm_opps_list():
-    return jsonify(call("crm", "GET", "/opportunities", params=request.args))
+    return _list("opportunities")
 
 @crm_bp.post("/opportunities")
+@idempotent
 def crm_opps_create():
-    body = {"model": request.json or {}}
-    return jsonify(call("crm", "POST", "/opportunities", json=body)), 201
+    return _write("opportunities", "POST", "/opportunities")
 
 @crm_bp.get("/opportunities/<uuid:id>")
 def crm_opps_get(id):
-    return jsonify(call("crm", "GET", f"/opportunities/{id}", params=request.args))
+    return _get("opportunities", id)
 
 @crm_bp.patch("/opportunities/<uuid:id>")
 def crm_opps_update(id):
-    body = {"model": request.json or {}}
-    return jsonify(call("crm", "PATCH", f"/opportunities/{id}", json=body))
+    return _write("opportunities", "PATCH", f"/opportunities/{id}")
 
 # --- TASKS (GET, POST, GET{id}, PATCH{id})
 @crm_bp.get("/tasks")
 def crm_tasks_list():
-    return jsonify(call("crm", "GET", "/tasks", params=request.args))
+    return _list("tasks")
 
 @crm_bp.post("/tasks")
+@idempotent
 def crm_tasks_create():
-    body = {"model": request.json or {}}
-    return jsonify(call("crm", "POST", "/tasks", json=body)), 201
+    return _write("tasks", "POST", "/tasks")
 
 @crm_bp.get("/tasks/<uuid:id>")
 def crm_tasks_get(id):
-    return jsonify(call("crm", "GET", f"/tasks/{id}", params=request.args))
+    return _get("tasks", id)
 
 @crm_bp.patch("/tasks/<uuid:id>")
 def crm_tasks_update(id):
-    body = {"model": request.json or {}}
-    return jsonify(call("crm", "PATCH", f"/tasks/{id}", json=body))
+    return _write("tasks", "PATCH", f"/tasks/{id}")
 
 # --- NOTES (GET, POST, GET{id})  (no PATCH in unified)
 @crm_bp.get("/notes")
 def crm_notes_list():
-    return jsonify(call("crm", "GET", "/notes", params=request.args))
+    return _list("notes")
 
 @crm_bp.post("/notes")
+@idempotent
 def crm_notes_create():
-    body = {"model": request.json or {}}
-    return jsonify(call("crm", "POST", "/notes", json=body)), 201
+    return _write("notes", "POST", "/notes")
 
 @crm_bp.get("/notes/<uuid:id>")
 def crm_notes_get(id):
-    return jsonify(call("crm", "GET", f"/notes/{id}", params=request.args))
+    return _get("notes", id)
 
 # --- ENGAGEMENTS (GET, POST, GET{id}, PATCH{id})
 @crm_bp.get("/engagements")
 def crm_eng_list():
-    return jsonify(call("crm", "GET", "/engagements", params=request.args))
+    return _list("engagements")
 
 @crm_bp.post("/engagements")
+@idempotent
 def crm_eng_create():
-    body = {"model": request.json or {}}
-    return jsonify(call("crm", "POST", "/engagements", json=body)), 201
+    return _write("engagements", "POST", "/engagements")
 
 @crm_bp.get("/engagements/<uuid:id>")
 def crm_eng_get(id):
-    return jsonify(call("crm", "GET", f"/engagements/{id}", params=request.args))
+    return _get("engagements", id)
 
 @crm_bp.patch("/engagements/<uuid:id>")
 def crm_eng_update(id):
-    body = {"model": request.json or {}}
-    return jsonify(call("crm", "PATCH", f"/engagements/{id}", json=body))
+    return _write("engagements", "PATCH", f"/engagements/{id}")
 
 # --- USERS (GET, GET{id}, IGNORE)
 @crm_bp.get("/users")
+@cached("merge_crm_users", ttl=60, swr=600)
 def crm_users_list():
-    return jsonify(call("crm", "GET", "/users", params=request.args))
+    return _list("users")
 
 @crm_bp.get("/users/<uuid:id>")
 def crm_users_get(id):
-    return jsonify(call("crm", "GET", f"/users/{id}", params=request.args))
+    return _get("users", id)
 
 @crm_bp.post("/users/ignore/<string:model_id>")
+@invalidates("merge_crm_users")
 def crm_users_ignore(model_id):
-    return jsonify(call("crm", "POST", f"/users/ignore/{model_id}", json={"reason": "ignored via API"}))
+    return proxy("crm", "POST", f"/users/ignore/{model_id}", json={"reason": "ignored via API"})
 
 # --- DELETE LINKED ACCOUNT (official endpoint)
 @crm_bp.post("/delete-account")
+@invalidates("merge_crm_users")
 def crm_delete_account():
-    return jsonify(call("crm", "POST", "/delete-account", json=request.json or {}))
+    return proxy("crm", "POST", "/delete-account", json=request.json or {})
 
 # --- PASSTHROUGH (to enable DELETE or provider-specific fields)
 @crm_bp.post("/passthrough")
@@ -164,4 +218,4 @@ def crm_passthrough():
       "normalize_response": True
     }
     """
-    return jsonify(call("crm", "POST", "/passthrough", json=request.json or {})) 
\ No newline at end of file
+    return proxy("crm", "POST", "/passthrough", json=request.json or {}) 
\ No newline at end of file
@@ -1,69 +1,80 @@
 # routes/merge_hris.py
-from flask import Blueprint, request, jsonify
-from services.merge_client import call
+from flask import Blueprint, request
+from services.merge_client import proxy, iter_pages
+from services.streaming import stream_pages
+from services.idempotency import idempotent
 
 hris_bp = Blueprint("hris_bp", __name__, url_prefix="/api/merge/hris")
 
+def _list(path: str):
+    """List one page, or with ?all=true follow every `next` cursor and stream {"results": [...]}."""
+    if request.args.get("all", "").lower() in ("1", "true", "yes"):
+        params = {k: v for k, v in request.args.items() if k != "all"}
+        return stream_pages("results", iter_pages("hris", path, params))
+    return proxy("hris", "GET", path, params=request.args)
+
 # --- EMPLOYEES (GET, GET{id}, IGNORE)
 @hris_bp.get("/employees")
 def hris_employees_list():
-    return jsonify(call("hris", "GET", "/employees", params=request.args))
+    return _list("/employees")
 
 @hris_bp.get("/employees/<uuid:id>")
 def hris_employees_get(id):
-    return jsonify(call("hris", "GET", f"/employees/{id}", params=request.args))
+    return proxy("hris", "GET", f"/employees/{id}", params=request.args)
 
 @hris_bp.post("/employees/ignore/<string:model_id>")
 def hris_employees_ignore(model_id):
-    return jsonify(call("hris", "POST", f"/employees/ignore/{model_id}", json={"reason": "ignored via API"}))
+    return proxy("hris", "POST", f"/employees/ignore/{model_id}", json={"reason": "ignored via API"})
 
 # --- TIME OFF (GET, POST, GET{id})
 @hris_bp.get("/time-off")
 def hris_timeoff_list():
-    return jsonify(call("hris", "GET", "/time-off", params=request.args))
+    return _list("/time-off")
 
 @hris_bp.post("/time-off")
+@idempotent
 def hris_timeoff_create():
     # expects fields per Merge model (employee, amount, units, request_type, start_time, end_time, etc.)
     body = {"model": request.json or {}}
-    return jsonify(call("hris", "POST", "/time-off", json=body)), 201
+    return proxy("hris", "POST", "/time-off", json=body)
 
 @hris_bp.get("/time-off/<uuid:id>")
 def hris_timeoff_get(id):
-    return jsonify(call("hris", "GET", f"/time-off/{id}", params=request.args))
+    return proxy("hris", "GET", f"/time-off/{id}", params=request.args)
 
 # --- TIMESHEET ENTRIES (GET, POST, GET{id})
 @hris_bp.get("/timesheet-entries")
 def hris_timesheets_list():
-    return jsonify(call("hris", "GET", "/timesheet-entries", params=request.args))
+    return _list("/timesheet-entries")
 
 @hris_bp.post("/timesheet-entries")
+@idempotent
 def hris_timesheets_create():
     # expects fields per Merge model (employee, hours_worked, start_time, end_time)
     body = {"model": request.json or {}}
-    return jsonify(call("hris", "POST", "/timesheet-entries", json=body)), 201
+    return proxy("hris", "POST", "/timesheet-entries", json=body)
 
 @hris_bp.get("/timesheet-entries/<uuid:id>")
 def hris_timesheets_get(id):
-    return jsonify(call("hris", "GET", f"/timesheet-entries/{id}", params=request.args))
+    return proxy("hris", "GET", f"/timesheet-entries/{id}", params=request.args)
 
 # --- READ-ONLY convenience (optional; add any you need)
 @hris_bp.get("/companies")
 def hris_companies_list():
-    return jsonify(call("hris", "GET", "/companies", params=request.args))
+    return _list("/companies")
 
 @hris_bp.get("/groups")
 def hris_groups_list():
-    return jsonify(call("hris", "GET", "/groups", params=request.args))
+    return _list("/groups")
 
 @hris_bp.get("/locations")
 def hris_locations_list():
-    return jsonify(call("hris", "GET", "/locations", params=request.args))
+    return _list("/locations")
 
 # --- DELETE LINKED ACCOUNT (official endpoint)
 @hris_bp.post("/delete-account")
 def hris_delete_account():
-    return jsonify(call("hris", "POST", "/delete-account", json=request.json or {}))
+    return proxy("hris", "POST", "/delete-account", json=request.json or {})
 
 # --- PASSTHROUGH (to enable updates/deletes on provider where supported)
 @hris_bp.post("/passthrough")
@@ -79,4 +90,4 @@ def hris_passthrough():
       "normalize_response": True
     }
     """
-    return jsonify(call("hris", "POST", "/passthrough", json=request.json or {})) 
\ No newline at end of file
+    return proxy("hris", "POST", "/passthrough", json=request.json or {}) 
\ No newline at end of file
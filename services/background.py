@@ -0,0 +1,63 @@
+# services/background.py
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, Tuple
+
+log = logging.getLogger(__name__)
+
+# Set BACKGROUND_WORKERS=0 on processes that should only serve requests
+BACKGROUND_WORKERS_ENABLED = os.getenv("BACKGROUND_WORKERS", "1") == "1"
+
+_workers: Dict[str, Tuple[Callable[[], bool], float]] = {}
+_started = False
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def in_background() -> bool:
+    """True on a background worker thread (lets shared clients tell sync traffic from user requests)."""
+    return getattr(_local, "worker", None) is not None
+
+
+def register_worker(name: str, fn: Callable[[], bool], interval: float = 2.0) -> None:
+    """
+    Register a queue-draining function to run on a daemon thread.
+    `fn` is called inside an app context and should return True when it did work,
+    in which case it is called again immediately; otherwise the thread sleeps `interval`.
+    """
+    _workers[name] = (fn, interval)
+
+
+def _run(app, name: str, fn: Callable[[], bool], interval: float) -> None:
+    _local.worker = name
+    while True:
+        did_work = False
+        try:
+            with app.app_context():
+                did_work = bool(fn())
+        except Exception:
+            log.exception("Background worker %s failed", name)
+        if not did_work:
+            time.sleep(interval)
+
+
+def start_workers(app) -> None:
+    """Start every registered worker once per process."""
+    global _started
+    with _lock:
+        if _started or not BACKGROUND_WORKERS_ENABLED:
+            return
+        _started = True
+    for name, (fn, interval) in _workers.items():
+        threading.Thread(target=_run, args=(app, name, fn, interval), name=name, daemon=True).start()
+        log.info("Started background worker %s", name)
+
+
+def init_app(app) -> None:
+    """
+    Start workers lazily on the first request, so scripts that only import `app`
+    (create_tables.py, test_db.py, ...) don't spin up threads.
+    """
+    app.before_request(lambda: start_workers(app))
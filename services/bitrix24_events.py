@@ -0,0 +1,177 @@
+# services/bitrix24_events.py
+import os
+import re
+import logging
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+from flask import current_app
+from models import db, ClientCRMAuth, BitrixEvent, BitrixEntityMirror
+from services.bitrix24_service import bx_call
+from services.background import register_worker
+
+log = logging.getLogger(__name__)
+
+# Events for the same entity arriving within this many seconds are applied once
+BITRIX_COALESCE_WINDOW = float(os.getenv("BITRIX_COALESCE_WINDOW", "5"))
+BITRIX_EVENT_BATCH = int(os.getenv("BITRIX_EVENT_BATCH", "500"))
+BITRIX_EVENT_WORKERS = int(os.getenv("BITRIX_EVENT_WORKERS", "4"))
+BITRIX_EVENT_MAX_ATTEMPTS = int(os.getenv("BITRIX_EVENT_MAX_ATTEMPTS", "5"))
+BITRIX_EVENT_LEASE = 300  # seconds before a 'processing' event from a dead worker is picked up again
+
+MIRRORED_ENTITIES = {"contact", "deal", "lead", "company"}
+_EVENT_RE = re.compile(r"^ONCRM(?P<entity>[A-Z]+?)(?P<action>ADD|UPDATE|DELETE)$")
+
+# -------- parsing --------
+
+def unflatten_form(form: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Bitrix posts events form-encoded: data[FIELDS][ID]=5, auth[domain]=x.bitrix24.com
+    Turn those bracketed keys back into nested dicts.
+    """
+    out: Dict[str, Any] = {}
+    for key, value in form.items():
+        parts = re.findall(r"[^\[\]]+", key)
+        node = out
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+            if not isinstance(node, dict):
+                break
+        else:
+            node[parts[-1] if parts else key] = value
+    return out
+
+def parse_event(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Map one Bitrix event payload onto a BitrixEvent row."""
+    event = (payload.get("event") or "").upper()
+    auth = payload.get("auth") or {}
+    fields = (payload.get("data") or {}).get("FIELDS") or {}
+    match = _EVENT_RE.match(event)
+    now = datetime.utcnow()
+    return {
+        "event": event or "UNKNOWN",
+        "entity_type": match.group("entity").lower() if match else None,
+        "entity_id": str(fields.get("ID")) if fields.get("ID") is not None else None,
+        "domain": auth.get("domain"),
+        "payload": payload,
+        "status": "pending",
+        "attempts": 0,
+        "received_at": now,
+        "available_at": now,
+    }
+
+def enqueue_events(payloads: List[Dict[str, Any]]) -> int:
+    """Append events to the durable queue in one bulk insert."""
+    rows = [parse_event(p) for p in payloads]
+    if rows:
+        db.session.bulk_insert_mappings(BitrixEvent, rows)
+        db.session.commit()
+    return len(rows)
+
+# -------- processing --------
+
+def _client_ids_by_domain() -> Dict[str, int]:
+    """Portal domain -> client_id, from the saved webhook_base of each client."""
+    out: Dict[str, int] = {}
+    for rec in ClientCRMAuth.query.filter_by(crm_id=999).all():  # Temporary ID
+        wb = (rec.credentials or {}).get("webhook_base") if isinstance(rec.credentials, dict) else None
+        host = urlparse(wb).hostname if wb else None
+        if host:
+            out[host.lower()] = rec.client_id
+    return out
+
+def _claim_batch() -> List[BitrixEvent]:
+    """Claim pending events older than the coalescing window (SKIP LOCKED keeps processes apart)."""
+    now = datetime.utcnow()
+    ready = db.and_(BitrixEvent.status == "pending",
+                    BitrixEvent.available_at <= now - timedelta(seconds=BITRIX_COALESCE_WINDOW))
+    abandoned = db.and_(BitrixEvent.status == "processing",
+                        BitrixEvent.available_at <= now - timedelta(seconds=BITRIX_EVENT_LEASE))
+    events = (BitrixEvent.query
+              .filter(db.or_(ready, abandoned))
+              .order_by(BitrixEvent.id)
+              .limit(BITRIX_EVENT_BATCH)
+              .with_for_update(skip_locked=True)
+              .all())
+    for ev in events:
+        ev.status = "processing"
+        ev.available_at = now
+    db.session.commit()
+    return events
+
+def _coalesce(events: List[BitrixEvent]) -> Dict[Tuple[str, str, str], BitrixEvent]:
+    """Keep the latest event per (domain, entity_type, entity_id); earlier ones are redundant."""
+    latest: Dict[Tuple[str, str, str], BitrixEvent] = {}
+    for ev in events:
+        if ev.entity_type in MIRRORED_ENTITIES and ev.entity_id:
+            latest[((ev.domain or "").lower(), ev.entity_type, ev.entity_id)] = ev
+    return latest
+
+def _fetch(app, client_id: int, entity_type: str, entity_id: str) -> Optional[Dict[str, Any]]:
+    with app.app_context():
+        return bx_call(client_id, f"crm.{entity_type}.get", {"id": entity_id}).get("result")
+
+def _apply(client_id: int, entity_type: str, entity_id: str, data: Optional[Dict[str, Any]]) -> None:
+    row = BitrixEntityMirror.query.filter_by(client_id=client_id, entity_type=entity_type, entity_id=entity_id).first()
+    if data is None:
+        if row:
+            db.session.delete(row)
+        return
+    if not row:
+        row = BitrixEntityMirror(client_id=client_id, entity_type=entity_type, entity_id=entity_id)
+        db.session.add(row)
+    row.data = data
+    row.synced_at = datetime.utcnow()
+
+def process_pending() -> bool:
+    """
+    Drain one batch: coalesce duplicate events per entity, refetch each changed
+    entity once (in parallel) and apply the result to the local mirror.
+    """
+    events = _claim_batch()
+    if not events:
+        return False
+
+    clients = _client_ids_by_domain()
+    latest = _coalesce(events)
+    failed: Dict[Tuple[str, str, str], str] = {}
+
+    app = current_app._get_current_object()
+    with ThreadPoolExecutor(max_workers=BITRIX_EVENT_WORKERS) as pool:
+        futures = {}
+        for key, ev in latest.items():
+            domain, entity_type, entity_id = key
+            client_id = clients.get(domain)
+            if client_id is None:
+                failed[key] = f"no Bitrix24 client configured for domain '{domain}'"
+            elif ev.event.endswith("DELETE"):
+                _apply(client_id, entity_type, entity_id, None)
+            else:
+                futures[key] = (client_id, pool.submit(_fetch, app, client_id, entity_type, entity_id))
+        for key, (client_id, fut) in futures.items():
+            try:
+                _apply(client_id, key[1], key[2], fut.result())
+            except Exception as e:
+                log.warning("Bitrix24 refetch %s failed: %s", key, e)
+                failed[key] = str(e)
+
+    now = datetime.utcnow()
+    for ev in events:
+        error = failed.get(((ev.domain or "").lower(), ev.entity_type, ev.entity_id))
+        ev.attempts = (ev.attempts or 0) + 1
+        if error is None:
+            ev.status, ev.error, ev.processed_at = "done", None, now
+        else:
+            ev.status = "failed" if ev.attempts >= BITRIX_EVENT_MAX_ATTEMPTS else "pending"
+            ev.available_at = now + timedelta(seconds=BITRIX_COALESCE_WINDOW * 2 ** ev.attempts)
+            ev.error = error
+    db.session.commit()
+    log.info("Processed %d Bitrix24 events (%d entities, %d failed)", len(events), len(latest), len(failed))
+    return True
+
+def queue_stats() -> Dict[str, int]:
+    rows = db.session.query(BitrixEvent.status, db.func.count(BitrixEvent.id)).group_by(BitrixEvent.status).all()
+    return {status: count for status, count in rows}
+
+register_worker("bitrix24-events", process_pending, interval=BITRIX_COALESCE_WINDOW)
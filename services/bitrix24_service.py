@@ -5,6 +5,8 @@ import requests
 from typing import Any, Dict, List, Optional, Tuple
 from urllib.parse import urljoin
 from models import db, ClientCRMAuth  # you already have this
+from services import circuit_breaker
+from services.single_flight import flight_key, flights
 
 log = logging.getLogger(__name__)
 
@@ -17,6 +19,9 @@ BITRIX_OUTBOUND_TOKEN = os.getenv("BITRIX_OUTBOUND_TOKEN", "")  # used to verify
 
 CRM_NAME = "bitrix24"
 
+# Read-only REST methods; identical concurrent calls share one upstream request
+READ_METHOD_SUFFIXES = (".get", ".list", ".fields")
+
 # -------- helpers --------
 
 def _flatten_for_form(payload: Dict[str, Any]) -> Dict[str, Any]:
@@ -64,10 +69,16 @@ def bx_call(client_id: int, method: str, payload: Optional[Dict[str, Any]] = Non
     """
     Generic Bitrix24 call via inbound webhook URL.
     """
+    if method.endswith(READ_METHOD_SUFFIXES):
+        key = flight_key("bitrix24", client_id, "POST", method, _flatten_for_form(payload or {}))
+        return flights.do(key, lambda: _bx_call(client_id, method, payload, timeout))
+    return _bx_call(client_id, method, payload, timeout)
+
+def _bx_call(client_id: int, method: str, payload: Optional[Dict[str, Any]], timeout: Tuple[int, int]) -> Dict[str, Any]:
     base = _get_client_webhook_base(client_id)
     url = _method_url(base, method)
     data = _flatten_for_form(payload or {})
-    resp = requests.post(url, data=data, timeout=timeout)  # form-encoded is safest across methods
+    resp = circuit_breaker.send("bitrix24", "POST", url, data=data, timeout=timeout)  # form-encoded is safest across methods
     try:
         resp.raise_for_status()
     except requests.HTTPError:
@@ -1,5 +1,9 @@
 import requests
 import json
+from werkzeug.exceptions import HTTPException
+from services import circuit_breaker
+from services.circuit_breaker import CircuitOpen
+from services.bulkhead import BulkheadFull
 from models import db, Clients, ClientCRMAuth, CRMs, BuilderPrimeClientData
 from datetime import datetime
 
@@ -158,7 +162,9 @@ class BuilderPrimeService:
                     }
                 }
 
-            response = requests.post(
+            response = circuit_breaker.send(
+                "builderprime",
+                "POST",
                 api_url,
                 json=payload,
                 headers=headers,
@@ -258,6 +264,8 @@ class BuilderPrimeService:
                     }
                 }
 
+        except (HTTPException, CircuitOpen, BulkheadFull):
+            raise  # 503 + Retry-After (open circuit, full bulkhead) goes straight to the caller; the outbox pauses on it
         except requests.exceptions.RequestException as e:
             return {
                 'success': False,
@@ -522,7 +530,9 @@ class BuilderPrimeService:
                 }
 
             # Make the GET request
-            response = requests.get(
+            response = circuit_breaker.send(
+                "builderprime",
+                "GET",
                 api_url,
                 headers=headers,
                 params=params,
@@ -577,6 +587,8 @@ class BuilderPrimeService:
                     }
                 }
 
+        except (HTTPException, CircuitOpen, BulkheadFull):
+            raise  # 503 + Retry-After (open circuit, full bulkhead) goes straight to the caller; the outbox pauses on it
         except requests.exceptions.RequestException as e:
             return {
                 'success': False,
@@ -742,7 +754,9 @@ class BuilderPrimeService:
                     }
                 }
 
-            response = requests.post(
+            response = circuit_breaker.send(
+                "builderprime",
+                "POST",
                 api_url,
                 json=payload,
                 headers=headers,
@@ -847,6 +861,8 @@ class BuilderPrimeService:
                     }
                 }
 
+        except (HTTPException, CircuitOpen, BulkheadFull):
+            raise  # 503 + Retry-After (open circuit, full bulkhead) goes straight to the caller; the outbox pauses on it
         except requests.exceptions.RequestException as e:
             return {
                 'success': False,
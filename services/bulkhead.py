@@ -0,0 +1,143 @@
+# services/bulkhead.py
+import os
+import json
+import math
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+from flask import Response, abort, has_request_context
+from services.background import in_background
+
+log = logging.getLogger(__name__)
+
+# Concurrent upstream calls per vendor: BULKHEAD_<VENDOR>=n (e.g. BULKHEAD_CAPSULE=4), else BULKHEAD_DEFAULT
+BULKHEAD_DEFAULT = int(os.getenv("BULKHEAD_DEFAULT", "10"))
+# Per-tenant cap inside a vendor: BULKHEAD_TENANT_<VENDOR>=n, else BULKHEAD_TENANT_DEFAULT (0 = no tenant cap)
+BULKHEAD_TENANT_DEFAULT = int(os.getenv("BULKHEAD_TENANT_DEFAULT", "0"))
+BULKHEAD_MAX_WAIT = float(os.getenv("BULKHEAD_MAX_WAIT", "2"))                        # interactive, seconds
+BULKHEAD_MAX_WAIT_BACKGROUND = float(os.getenv("BULKHEAD_MAX_WAIT_BACKGROUND", "120"))  # background, seconds
+
+
+def _setting(prefix: str, vendor: str, default: int) -> int:
+    return int(os.getenv(f"{prefix}_{vendor.upper()}", str(default)))
+
+
+class BulkheadFull(RuntimeError):
+    def __init__(self, vendor: str, waited: float):
+        super().__init__(f"Too many concurrent {vendor} requests (waited {waited:.1f}s); retry shortly")
+        self.vendor = vendor
+        self.retry_after = max(BULKHEAD_MAX_WAIT, 1.0)
+
+
+class _Compartment:
+    __slots__ = ("limit", "sem", "in_use", "waiting", "rejected", "peak_wait")
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.sem = threading.BoundedSemaphore(limit)
+        self.in_use = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.peak_wait = 0.0
+
+
+class Bulkhead:
+    """
+    Caps concurrent upstream calls per vendor (and optionally per tenant of the
+    vendor), so one slow vendor or tenant can hold at most its share of the
+    server's threads. A call that can't get a slot within the queue-time limit
+    is turned away instead of piling up.
+    """
+
+    def __init__(self):
+        self._compartments: Dict[Tuple[str, Optional[str]], _Compartment] = {}
+        self._lock = threading.Lock()
+
+    def _compartment(self, vendor: str, tenant: Optional[str]) -> Optional[_Compartment]:
+        key = (vendor, tenant)
+        with self._lock:
+            if key not in self._compartments:
+                limit = (_setting("BULKHEAD_TENANT", vendor, BULKHEAD_TENANT_DEFAULT) if tenant is not None
+                         else _setting("BULKHEAD", vendor, BULKHEAD_DEFAULT))
+                self._compartments[key] = _Compartment(limit) if limit > 0 else None
+            return self._compartments[key]
+
+    def _acquire(self, c: _Compartment, deadline: float, started: float, vendor: str) -> None:
+        with self._lock:
+            c.waiting += 1
+        ok = c.sem.acquire(timeout=max(deadline - time.monotonic(), 0.0))
+        waited = time.monotonic() - started
+        with self._lock:
+            c.waiting -= 1
+            c.peak_wait = max(c.peak_wait, waited)
+            if ok:
+                c.in_use += 1
+            else:
+                c.rejected += 1
+        if not ok:
+            raise BulkheadFull(vendor, waited)
+
+    def _release(self, c: _Compartment) -> None:
+        with self._lock:
+            c.in_use -= 1
+        c.sem.release()
+
+    @contextmanager
+    def slot(self, vendor: str, tenant: Optional[str] = None):
+        """Hold a tenant slot (when capped) and a vendor slot for the duration of one upstream call."""
+        started = time.monotonic()
+        deadline = started + (BULKHEAD_MAX_WAIT_BACKGROUND if in_background() else BULKHEAD_MAX_WAIT)
+        held = []
+        try:
+            for c in filter(None, [self._compartment(vendor, tenant) if tenant is not None else None,
+                                   self._compartment(vendor, None)]):
+                self._acquire(c, deadline, started, vendor)
+                held.append(c)
+            yield
+        finally:
+            for c in reversed(held):
+                self._release(c)
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        with self._lock:
+            out: Dict[str, Dict[str, object]] = {}
+            for (vendor, tenant), c in self._compartments.items():
+                if c is None:
+                    continue
+                entry = {"limit": c.limit, "in_use": c.in_use, "waiting": c.waiting,
+                         "rejected": c.rejected, "peak_wait": round(c.peak_wait, 2)}
+                if tenant is None:
+                    out.setdefault(vendor, {}).update(entry)
+                else:
+                    out.setdefault(vendor, {}).setdefault("tenants", {})[tenant] = entry
+            return out
+
+
+bulkhead = Bulkhead()
+
+
+@contextmanager
+def slot(vendor: str, tenant: Optional[str] = None):
+    """
+    bulkhead.slot() for request code: when saturated, user requests get a 503
+    with Retry-After; background callers see BulkheadFull.
+    """
+    try:
+        with bulkhead.slot(vendor, tenant):
+            yield
+    except BulkheadFull as e:
+        log.warning("%s", e)
+        if has_request_context():
+            abort(Response(json.dumps({"error": str(e)}), status=503, mimetype="application/json",
+                           headers={"Retry-After": str(math.ceil(e.retry_after))}))
+        raise
+
+
+def limited(vendor: str, request_fn: Callable, tenant: Optional[str] = None) -> Callable:
+    """Wrap a `requests`-style callable so every call runs inside a vendor (and tenant) slot."""
+    def call(*args, **kwargs):
+        with slot(vendor, tenant):
+            return request_fn(*args, **kwargs)
+    return call
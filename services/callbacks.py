@@ -0,0 +1,58 @@
+# services/callbacks.py
+import os
+import socket
+import ipaddress
+import logging
+from typing import Any, Dict
+from urllib.parse import urlsplit
+import requests
+
+log = logging.getLogger(__name__)
+
+# Hosts (and their subdomains) callbacks may go to, http or https, e.g. "hooks.example.com,internal.example.net".
+# Unset: any https host whose addresses are all public.
+CALLBACK_ALLOWED_HOSTS = [h.strip().lower().lstrip(".") for h in os.getenv("CALLBACK_ALLOWED_HOSTS", "").split(",")
+                          if h.strip()]
+CALLBACK_TIMEOUT = (5, 10)
+
+
+class CallbackUrlError(ValueError):
+    pass
+
+
+def check_url(url: str) -> None:
+    """Raise CallbackUrlError unless `url` is a callback target we are willing to POST to."""
+    parts = urlsplit(url or "")
+    host = (parts.hostname or "").lower()
+    if parts.scheme not in ("http", "https") or not host:
+        raise CallbackUrlError("callback_url must be an absolute http(s) URL")
+    if CALLBACK_ALLOWED_HOSTS:
+        if any(host == h or host.endswith("." + h) for h in CALLBACK_ALLOWED_HOSTS):
+            return
+        raise CallbackUrlError(f"callback host {host} is not in CALLBACK_ALLOWED_HOSTS")
+    if parts.scheme != "https":
+        raise CallbackUrlError("callback_url must use https")
+    try:
+        infos = socket.getaddrinfo(host, parts.port or 443, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError):
+        raise CallbackUrlError(f"callback host {host} does not resolve")
+    for info in infos:
+        ip = ipaddress.ip_address(info[4][0].split("%")[0])
+        if not ip.is_global or ip.is_multicast:
+            raise CallbackUrlError(f"callback host {host} resolves to a non-public address")
+
+
+def post(url: str, payload: Dict[str, Any]) -> int:
+    """
+    POST `payload` to a callback URL, re-checked at send time (DNS may have
+    changed since it was accepted); redirects are not followed. Returns the
+    HTTP status, or 0 when the URL was refused or unreachable.
+    """
+    try:
+        check_url(url)
+        return requests.post(url, json=payload, timeout=CALLBACK_TIMEOUT, allow_redirects=False).status_code
+    except CallbackUrlError as e:
+        log.warning("Callback to %s refused: %s", url, e)
+    except requests.RequestException as e:
+        log.warning("Callback to %s failed: %s", url, e)
+    return 0
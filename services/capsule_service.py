@@ -1,8 +1,12 @@
 import os
 import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlencode
-from models import db, CapsuleToken
+from models import db, CapsuleToken, CapsuleClientToken
+from services.token_store import TokenStore, current_client_id, state_for_client, client_from_state
+from services import circuit_breaker
+from services.single_flight import flight_key, flights
 
 # OAuth2 settings
 CLIENT_ID = os.getenv("CAPSULE_CLIENT_ID")
@@ -12,8 +16,16 @@ AUTH_URL = "https://api.capsulecrm.com/oauth/authorise"
 TOKEN_URL = "https://api.capsulecrm.com/oauth/token"
 API_BASE_URL = "https://api.capsulecrm.com/api/v2"
 
+# Bulk fetch settings (Capsule caps perPage at 100)
+PER_PAGE = 100
+PAGE_WORKERS = int(os.getenv("CAPSULE_PAGE_WORKERS", "4"))
+PAGE_TIMEOUT = (5, 30)  # (connect, read)
 
-def get_authorization_url(state="secure_random_state"):
+
+def get_authorization_url(state=None, client_id=None):
+    """With client_id the token is stored for that client (signed into `state`)."""
+    if not state:
+        state = state_for_client(client_id, CLIENT_SECRET) if client_id else "secure_random_state"
     params = {
         "client_id": CLIENT_ID,
         "redirect_uri": REDIRECT_URI,
@@ -24,7 +36,7 @@ def get_authorization_url(state="secure_random_state"):
     return f"{AUTH_URL}?{urlencode(params)}"
 
 
-def exchange_code_for_token(code):
+def exchange_code_for_token(code, state=None):
     data = {
         "grant_type": "authorization_code",
         "code": code,
@@ -33,10 +45,15 @@ def exchange_code_for_token(code):
         "client_secret": CLIENT_SECRET
     }
 
-    response = requests.post(TOKEN_URL, data=data)
+    response = requests.post(TOKEN_URL, data=data, timeout=30)
     response.raise_for_status()
     token_data = response.json()
 
+    client_id = client_from_state(state, CLIENT_SECRET)
+    if client_id:
+        tokens.save(client_id, token_data)
+        return token_data
+
     # Store token in DB using SQLAlchemy
     token = CapsuleToken.query.first()
     if not token:
@@ -52,6 +69,9 @@ def exchange_code_for_token(code):
 
 
 def get_token_from_db():
+    client_id = current_client_id()
+    if client_id:
+        return tokens.get(client_id)
     token = CapsuleToken.query.first()
     if token:
         return {
@@ -62,7 +82,7 @@ def get_token_from_db():
     return None
 
 
-def refresh_access_token(refresh_token):
+def _request_token_refresh(refresh_token):
     data = {
         "grant_type": "refresh_token",
         "refresh_token": refresh_token,
@@ -70,9 +90,17 @@ def refresh_access_token(refresh_token):
         "client_secret": CLIENT_SECRET
     }
 
-    response = requests.post(TOKEN_URL, data=data)
+    response = requests.post(TOKEN_URL, data=data, timeout=30)
     response.raise_for_status()
-    token_data = response.json()
+    return response.json()
+
+
+# Per-client tokens (capsule_client_tokens) behind a sharded cache, renewed in the background
+tokens = TokenStore("capsule", CapsuleClientToken, _request_token_refresh)
+
+
+def refresh_access_token(refresh_token):
+    token_data = _request_token_refresh(refresh_token)
 
     # Update token in DB using SQLAlchemy
     token = CapsuleToken.query.first()
@@ -85,7 +113,14 @@ def refresh_access_token(refresh_token):
     return token_data
 
 
-def get_valid_token():
+def get_valid_token(client_id=None):
+    client_id = client_id or current_client_id()
+    if client_id:
+        token = tokens.access_token(client_id)
+        if not token:
+            raise Exception(f"No Capsule token found for client {client_id}")
+        return token
+
     token_row = get_token_from_db()
     if not token_row:
         raise Exception("No Capsule token found")
@@ -96,8 +131,17 @@ def get_valid_token():
     return token_row["access_token"]
 
 
-def make_capsule_request(method, endpoint, data=None, params=None):
-    token = get_valid_token()
+def make_capsule_request(method, endpoint, data=None, params=None, client_id=None):
+    """`client_id` names the tenant outside a request (e.g. the outbox worker); else X-Client-Id is used."""
+    if method.upper() == "GET":
+        # identical concurrent reads for the same client share one upstream call
+        key = flight_key("capsule", client_id or current_client_id(), "GET", endpoint, params)
+        return flights.do(key, lambda: _capsule_request(method, endpoint, data, params, client_id))
+    return _capsule_request(method, endpoint, data, params, client_id)
+
+
+def _capsule_request(method, endpoint, data=None, params=None, client_id=None):
+    token = get_valid_token(client_id)
     headers = {
         "Authorization": f"Bearer {token}",
         "Accept": "application/json",
@@ -105,20 +149,74 @@ def make_capsule_request(method, endpoint, data=None, params=None):
     }
 
     url = f"{API_BASE_URL}/{endpoint}"
-    response = requests.request(method, url, headers=headers, json=data, params=params)
+    response = circuit_breaker.send("capsule", method, url, headers=headers, json=data, params=params,
+                                    timeout=PAGE_TIMEOUT)
     response.raise_for_status()
     return response.json()
 
 
+def _get_page(token, url, params=None):
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/json"
+    }
+    response = circuit_breaker.send("capsule", "GET", url, headers=headers, params=params, timeout=PAGE_TIMEOUT)
+    response.raise_for_status()
+    return response
+
+
+def _page_items(response, key):
+    """Pull the list of records out of a Capsule page (e.g. {"parties": [...]})"""
+    payload = response.json() if response.content else {}
+    if key in payload:
+        return payload[key] or []
+    # Capsule names the collection after the resource; fall back to the first list in the body
+    return next((v for v in payload.values() if isinstance(v, list)), [])
+
+
+def _total_pages(response):
+    value = response.headers.get("X-Pagination-Total-Pages")
+    return int(value) if value and value.isdigit() else None
+
+
+def iter_capsule_pages(endpoint, key, params=None, total_pages=None, workers=PAGE_WORKERS):
+    """
+    Yield every page (list of records) of a Capsule collection.
+
+    Follows the `Link: rel=next` header at perPage=100. When the total page count
+    is known (reported by Capsule or passed in as `total_pages`), pages 2..N are
+    fetched concurrently and yielded in order; any further `next` links are then
+    followed sequentially, so an undersized hint never truncates the result.
+    """
+    token = get_valid_token()
+    url = f"{API_BASE_URL}/{endpoint}"
+    params = {k: v for k, v in (params or {}).items() if k not in ("page", "perPage")}
+    params["perPage"] = PER_PAGE
+
+    response = _get_page(token, url, {**params, "page": 1})
+    yield _page_items(response, key)
+
+    total_pages = total_pages or _total_pages(response)
+    if response.links.get("next") and total_pages and total_pages > 1 and workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pages = range(2, total_pages + 1)
+            for response in pool.map(lambda page: _get_page(token, url, {**params, "page": page}), pages):
+                yield _page_items(response, key)
+
+    while response.links.get("next"):
+        response = _get_page(token, response.links["next"]["url"])
+        yield _page_items(response, key)
+
+
 def get_capsule_organizations():
     """
-    Fetch all organizations from Capsule CRM
+    Fetch all organizations from Capsule CRM (every page)
     """
-    return make_capsule_request("GET", "organizations")
+    return {"organizations": [o for page in iter_capsule_pages("organizations", "organizations") for o in page]}
 
 
 def get_capsule_opportunities():
     """
-    Fetch all opportunities from Capsule CRM
+    Fetch all opportunities from Capsule CRM (every page)
     """
-    return make_capsule_request("GET", "opportunities")
+    return {"opportunities": [o for page in iter_capsule_pages("opportunities", "opportunities") for o in page]}
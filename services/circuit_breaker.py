@@ -0,0 +1,187 @@
+# services/circuit_breaker.py
+import os
+import json
+import math
+import time
+import logging
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+import requests
+from flask import Response, abort, has_request_context
+from services import bulkhead
+
+log = logging.getLogger(__name__)
+
+BREAKER_WINDOW = float(os.getenv("BREAKER_WINDOW", "60"))                  # seconds of calls the rates look at
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))              # calls in the window before it can trip
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))         # share of failed calls that opens it
+BREAKER_SLOW_CALL = float(os.getenv("BREAKER_SLOW_CALL", "10"))            # seconds; slower calls count as slow
+BREAKER_SLOW_RATE = float(os.getenv("BREAKER_SLOW_RATE", "0.8"))           # share of slow calls that opens it
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))      # fast-fail period before probing
+PROBE_RETRY_AFTER = 1.0  # told to callers turned away while the half-open probe is in flight
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpen(RuntimeError):
+    def __init__(self, vendor: str, host: str, retry_after: float):
+        super().__init__(f"{vendor} ({host}) is failing; circuit open, retry after {retry_after:.0f}s")
+        self.vendor = vendor
+        self.host = host
+        self.retry_after = retry_after
+
+
+class Breaker:
+    """
+    Closed -> open when, over the last BREAKER_WINDOW seconds (and at least
+    BREAKER_MIN_CALLS calls), the failure or slow-call share crosses its threshold.
+    While open every call fails fast; after BREAKER_OPEN_SECONDS one call is let
+    through as a probe (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, vendor: str, host: str):
+        self.vendor = vendor
+        self.host = host
+        self.state = CLOSED
+        self._calls: Deque[Tuple[float, bool, bool]] = deque()  # (time.monotonic(), failed, slow)
+        self._opened_at = 0.0
+        self._probing = False
+        self._rejected = 0
+        self._last_error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float) -> None:
+        while self._calls and self._calls[0][0] < now - BREAKER_WINDOW:
+            self._calls.popleft()
+
+    def _rates(self) -> Tuple[float, float]:
+        n = len(self._calls)
+        if not n:
+            return 0.0, 0.0
+        return sum(1 for c in self._calls if c[1]) / n, sum(1 for c in self._calls if c[2]) / n
+
+    def before(self) -> bool:
+        """Admit a call or raise CircuitOpen; returns True when the call is the half-open probe."""
+        with self._lock:
+            if self.state == CLOSED:
+                return False
+            now = time.monotonic()
+            if self.state == OPEN and now - self._opened_at >= BREAKER_OPEN_SECONDS:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self._rejected += 1
+            wait = BREAKER_OPEN_SECONDS - (now - self._opened_at) if self.state == OPEN else PROBE_RETRY_AFTER
+        raise CircuitOpen(self.vendor, self.host, max(wait, PROBE_RETRY_AFTER))
+
+    def after(self, probe: bool, failed: bool, elapsed: float, error: Optional[str] = None) -> None:
+        slow = elapsed >= BREAKER_SLOW_CALL
+        now = time.monotonic()
+        with self._lock:
+            if failed:
+                self._last_error = error
+            if probe:
+                self._probing = False
+                if failed or slow:
+                    self._trip(now)
+                else:
+                    self.state = CLOSED
+                    self._calls.clear()
+                    log.info("Circuit for %s (%s) closed", self.vendor, self.host)
+                return
+            self._calls.append((now, failed, slow))
+            self._prune(now)
+            if self.state == CLOSED and len(self._calls) >= BREAKER_MIN_CALLS:
+                error_rate, slow_rate = self._rates()
+                if error_rate >= BREAKER_ERROR_RATE or slow_rate >= BREAKER_SLOW_RATE:
+                    self._trip(now)
+
+    def release(self, probe: bool) -> None:
+        """The call ended without an outcome worth recording (e.g. a local error); free the probe slot."""
+        if probe:
+            with self._lock:
+                self._probing = False
+
+    def _trip(self, now: float) -> None:
+        self.state = OPEN
+        self._opened_at = now
+        log.warning("Circuit for %s (%s) opened for %.0fs (last error: %s)",
+                    self.vendor, self.host, BREAKER_OPEN_SECONDS, self._last_error)
+
+    def stats(self) -> Dict[str, object]:
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            error_rate, slow_rate = self._rates()
+            return {
+                "vendor": self.vendor,
+                "host": self.host,
+                "state": self.state,
+                "calls": len(self._calls),
+                "error_rate": round(error_rate, 3),
+                "slow_rate": round(slow_rate, 3),
+                "open_for": round(max(BREAKER_OPEN_SECONDS - (now - self._opened_at), 0.0), 1) if self.state == OPEN else 0.0,
+                "rejected": self._rejected,
+                "last_error": self._last_error,
+            }
+
+
+_breakers: Dict[Tuple[str, str], Breaker] = {}
+_lock = threading.Lock()
+
+
+def breaker(vendor: str, host: str) -> Breaker:
+    key = (vendor, host)
+    with _lock:
+        if key not in _breakers:
+            _breakers[key] = Breaker(vendor, host)
+        return _breakers[key]
+
+
+def host_of(url: str) -> str:
+    """Tenant host a breaker is keyed on (netloc only, so webhook secrets in the path never show up in stats)."""
+    return urlsplit(url).netloc.lower()
+
+
+def send(vendor: str, method: str, url: str, **kwargs) -> requests.Response:
+    """
+    One vendor HTTP request through the (vendor, host) breaker, inside a
+    bulkhead slot. Connection errors, timeouts and 5xx answers count as
+    failures, calls slower than BREAKER_SLOW_CALL as slow. While the circuit is
+    open, user requests get a 503 with Retry-After; background callers see
+    CircuitOpen.
+    """
+    b = breaker(vendor, host_of(url))
+    try:
+        probe = b.before()
+    except CircuitOpen as e:
+        if has_request_context():
+            abort(Response(json.dumps({"error": str(e)}), status=503, mimetype="application/json",
+                           headers={"Retry-After": str(math.ceil(e.retry_after))}))
+        raise
+    outcome = None  # (failed, elapsed, error) once the vendor answered or the connection failed
+    try:
+        with bulkhead.slot(vendor, b.host):
+            started = time.monotonic()
+            try:
+                resp = requests.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                outcome = (True, time.monotonic() - started, f"{type(e).__name__}: {e}"[:300])
+                raise
+            failed = resp.status_code >= 500
+            outcome = (failed, time.monotonic() - started, f"HTTP {resp.status_code}" if failed else None)
+        return resp
+    finally:
+        if outcome:
+            b.after(probe, *outcome)
+        else:
+            b.release(probe)  # turned away by the bulkhead or a local error: no verdict on the host
+
+
+def stats() -> list:
+    with _lock:
+        breakers = list(_breakers.values())
+    return [b.stats() for b in breakers]
@@ -0,0 +1,168 @@
+# services/idempotency.py
+import os
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from functools import wraps
+from typing import Dict, Optional, Tuple
+from flask import Response, make_response, request
+from sqlalchemy.exc import IntegrityError
+from models import db, IdempotencyKey
+from services.background import register_worker
+from services.route_cache import TENANT_HEADERS
+
+log = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))                  # seconds a stored response is replayed
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", "120"))  # seconds before an in-flight key is abandoned
+IDEMPOTENCY_PURGE_BATCH = 500
+HEADER = "Idempotency-Key"
+# Response headers kept with a stored response
+KEPT_HEADERS = ("Content-Type", "Location", "Retry-After")
+
+_counts = {"stored": 0, "replayed": 0, "in_flight_conflicts": 0, "mismatches": 0}
+_counts_lock = threading.Lock()
+
+
+def _count(field: str) -> None:
+    with _counts_lock:
+        _counts[field] += 1
+
+
+def _error(message: str, status: int, retry_after: Optional[int] = None) -> Response:
+    headers = {"Retry-After": str(retry_after)} if retry_after else {}
+    return Response(json.dumps({"error": message}), status=status, mimetype="application/json", headers=headers)
+
+
+def _scope() -> str:
+    """Keys are per tenant (same headers as the route cache) and per method + path."""
+    raw = "|".join(f"{h}={request.headers.get(h, '')}" for h in TENANT_HEADERS) + f"|{request.method} {request.path}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _fingerprint() -> str:
+    h = hashlib.sha256(request.query_string)
+    h.update(b"\0")
+    h.update(request.get_data())  # cached, so the view can still read the body
+    return h.hexdigest()
+
+
+def _replay(row: IdempotencyKey) -> Response:
+    resp = Response(row.response_body or b"", status=row.response_status, headers=row.response_headers or {})
+    resp.headers["Idempotent-Replayed"] = "true"
+    return resp
+
+
+def _claim(scope: str, key: str, fingerprint: str) -> Tuple[Optional[int], Optional[Response]]:
+    """
+    Take the key for this request -> (row id, None), or answer without running
+    the view -> (None, response): the stored response, 409 while another
+    request holds the key, 422 when the key was used for a different request.
+    """
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=IDEMPOTENCY_TTL)
+    row = IdempotencyKey(scope=scope, key=key, fingerprint=fingerprint, status="in_flight",
+                         locked_at=now, expires_at=expires_at)
+    db.session.add(row)
+    try:
+        db.session.commit()
+        return row.id, None
+    except IntegrityError:
+        db.session.rollback()
+
+    row = IdempotencyKey.query.filter_by(scope=scope, key=key).with_for_update().first()
+    if row is None:  # purged or released in between
+        db.session.rollback()
+        return None, _error("Idempotency-Key was just released; retry the request", 409, retry_after=1)
+    abandoned = row.status == "in_flight" and row.locked_at <= now - timedelta(seconds=IDEMPOTENCY_LOCK_TIMEOUT)
+    if row.expires_at <= now or abandoned:
+        row.fingerprint, row.status, row.locked_at, row.expires_at = fingerprint, "in_flight", now, expires_at
+        row.response_status = row.response_headers = row.response_body = None
+        db.session.commit()
+        return row.id, None
+    if row.fingerprint != fingerprint:
+        db.session.rollback()
+        _count("mismatches")
+        return None, _error("Idempotency-Key was already used for a different request", 422)
+    if row.status == "in_flight":
+        db.session.rollback()
+        _count("in_flight_conflicts")
+        return None, _error("A request with this Idempotency-Key is still in progress", 409, retry_after=1)
+    resp = _replay(row)
+    db.session.rollback()
+    _count("replayed")
+    return None, resp
+
+
+def _release(row_id: int) -> None:
+    IdempotencyKey.query.filter_by(id=row_id).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def _store(row_id: int, resp: Response) -> None:
+    # only successes are kept: several controllers answer vendor outages with 400, which must stay retryable
+    if not 200 <= resp.status_code < 300 or resp.direct_passthrough:
+        _release(row_id)
+        return
+    row = IdempotencyKey.query.get(row_id)
+    if row is None:
+        return
+    row.status = "done"
+    row.response_status = resp.status_code
+    row.response_headers = {h: resp.headers[h] for h in KEPT_HEADERS if h in resp.headers}
+    row.response_body = resp.get_data()  # buffers a streamed proxy body; create responses are small
+    db.session.commit()
+    _count("stored")
+
+
+def idempotent(view):
+    """
+    Decorator for a create view. With an Idempotency-Key header the first
+    request runs the view and its response is stored for IDEMPOTENCY_TTL
+    seconds; retries with the same key and body get that response back
+    (Idempotent-Replayed: true) without the vendor being called again.
+    Errors are not stored, so a failed request can be retried with its key.
+    """
+    @wraps(view)
+    def wrapper(**view_args):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(**view_args)
+        if len(key) > 255:
+            return _error("Idempotency-Key must be at most 255 characters", 400)
+        row_id, early = _claim(_scope(), key, _fingerprint())
+        if early is not None:
+            return early
+        try:
+            resp = make_response(view(**view_args))
+        except Exception:
+            db.session.rollback()
+            _release(row_id)
+            raise
+        _store(row_id, resp)
+        return resp
+    return wrapper
+
+
+def stats() -> Dict[str, object]:
+    rows = db.session.query(IdempotencyKey.status, db.func.count(IdempotencyKey.id)).group_by(IdempotencyKey.status).all()
+    with _counts_lock:
+        counts = dict(_counts)
+    return {"keys": {status: count for status, count in rows}, **counts}
+
+
+def purge_expired() -> bool:
+    """Worker: delete expired keys in batches."""
+    ids = [i for (i,) in db.session.query(IdempotencyKey.id)
+           .filter(IdempotencyKey.expires_at <= datetime.utcnow())
+           .limit(IDEMPOTENCY_PURGE_BATCH).all()]
+    if not ids:
+        return False
+    IdempotencyKey.query.filter(IdempotencyKey.id.in_(ids)).delete(synchronize_session=False)
+    db.session.commit()
+    log.info("Purged %d expired idempotency keys", len(ids))
+    return len(ids) == IDEMPOTENCY_PURGE_BATCH
+
+register_worker("idempotency-keys", purge_expired, interval=300)
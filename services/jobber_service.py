@@ -1,11 +1,20 @@
 import os
+import hmac
+import json
 import time
+import base64
+import hashlib
 import secrets
 import requests
 import logging
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlencode
 from dotenv import load_dotenv
-from models import db, JobberToken
+from models import db, JobberToken, JobberClientToken
+from services.token_store import TokenStore, current_client_id, state_for_client, client_from_state
+from services import bulkhead
 
 load_dotenv()
 
@@ -31,6 +40,55 @@ TOKEN_URL  = "https://api.getjobber.com/api/oauth/token"
 
 # GraphQL stays the same
 GRAPHQL_URL = "https://api.getjobber.com/api/graphql"
+GRAPHQL_TIMEOUT = (5, 60)  # (connect, read)
+
+# Jobber rejects queries whose requested cost exceeds the bucket; aliased batches stay well below it
+JOBBER_MAX_QUERY_COST = int(os.getenv("JOBBER_MAX_QUERY_COST", "1000"))
+CLIENT_MUTATION_COST = 25  # clientCreate/clientUpdate incl. returned client and userErrors
+JOBBER_BULK_WORKERS = int(os.getenv("JOBBER_BULK_WORKERS", "4"))
+THROTTLE_RETRIES = 3
+
+# Client fields callers may select (fields=id,name,...) -> GraphQL selection
+CLIENT_FIELD_MAP = {
+    "id": "id",
+    "name": "name",
+    "firstName": "firstName",
+    "lastName": "lastName",
+    "companyName": "companyName",
+    "isCompany": "isCompany",
+    "emails": "emails {\n          primary\n          address\n        }",
+    "phones": "phones {\n          primary\n          number\n        }",
+    "billingAddress": "billingAddress {\n          street\n          city\n          province\n          postalCode\n          country\n        }",
+    "tags": "tags {\n          nodes {\n            label\n          }\n        }",
+    "createdAt": "createdAt",
+    "updatedAt": "updatedAt",
+}
+CLIENT_DEFAULT_FIELDS = ("id", "firstName", "lastName", "emails", "companyName")
+# Estimated extra cost of nested selections on one client (scalars cost ~nothing)
+CLIENT_NESTED_COST = {"emails": 3, "phones": 3, "billingAddress": 2, "tags": 6}
+
+
+def _canonical_client_fields(fields):
+    """Validate a field list and return it as a canonical tuple (id always included, map order)"""
+    fields = set(fields or CLIENT_DEFAULT_FIELDS)
+    unknown = fields - set(CLIENT_FIELD_MAP)
+    if unknown:
+        raise ValueError(f"Unknown client field(s): {', '.join(sorted(unknown))}")
+    fields.add("id")
+    return tuple(f for f in CLIENT_FIELD_MAP if f in fields)
+
+
+@lru_cache(maxsize=64)
+def _client_selection(fields):
+    return "\n" + "".join(f"        {CLIENT_FIELD_MAP[f]}\n" for f in fields)
+
+
+def _client_cost(fields):
+    """Conservative cost estimate for one client(id) selection"""
+    return 2 + sum(CLIENT_NESTED_COST.get(f, 0) for f in fields)
+
+
+CLIENT_FIELDS = _client_selection(CLIENT_DEFAULT_FIELDS)
 
 # Store state tokens for CSRF protection (in production, use Redis or database)
 oauth_states = {}
@@ -41,6 +99,7 @@ def generate_secure_state():
 
 def store_oauth_state(state):
     """Store OAuth state for validation"""
+    global oauth_states
     oauth_states[state] = time.time()
     # Clean up old states (older than 10 minutes)
     current_time = time.time()
@@ -54,10 +113,13 @@ def validate_oauth_state(state):
     del oauth_states[state]
     return True
 
-def get_authorization_url(state=None):
-    """Generate OAuth authorization URL for Jobber with proper scopes"""
+def get_authorization_url(state=None, client_id=None):
+    """
+    Generate OAuth authorization URL for Jobber with proper scopes.
+    With client_id the token is stored for that client (signed into `state`).
+    """
     if not state:
-        state = generate_secure_state()
+        state = state_for_client(client_id, CLIENT_SECRET) if client_id else generate_secure_state()
     
     # Store state for validation
     store_oauth_state(state)
@@ -76,7 +138,10 @@ def get_authorization_url(state=None):
     return auth_url
 
 def exchange_code_for_token(code, state=None):
-    """Exchange authorization code for access token with proper error handling"""
+    """
+    Exchange authorization code for access token with proper error handling.
+    Stored per client when `state` carries a client id, else in the single-tenant row.
+    """
     logger.info("Exchanging authorization code for access token")
     
     # Validate state if provided
@@ -103,6 +168,13 @@ def exchange_code_for_token(code, state=None):
         if "access_token" not in token_data:
             raise ValueError("No access_token in response")
         
+        client_id = client_from_state(state, CLIENT_SECRET)
+        if client_id:
+            tokens.save(client_id, token_data)
+            logger.info(f"Stored Jobber tokens for client {client_id}")
+            remember_account_id(client_id)
+            return token_data
+
         # Store token in DB using SQLAlchemy
         token = JobberToken.query.first()
         if not token:
@@ -136,8 +208,42 @@ def exchange_code_for_token(code, state=None):
         raise
 
 
+def fetch_account_id(access_token):
+    """Id of the Jobber account a token belongs to (the accountId on that account's webhooks)"""
+    body = _post_graphql({"query": "query AccountId { account { id } }"},
+                         headers={"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"})
+    return ((body.get("data") or {}).get("account") or {}).get("id")
+
+
+def remember_account_id(client_id):
+    """Store the client's Jobber account id so webhooks can be routed to it; returns it, or None on failure"""
+    row = JobberClientToken.query.filter_by(client_id=client_id).first()
+    access_token = tokens.access_token(client_id) if row else None
+    if not access_token:
+        return None
+    try:
+        row.jobber_account_id = fetch_account_id(access_token)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Could not read the Jobber account id for client {client_id}: {e}")
+        return None
+    return row.jobber_account_id
+
+
+def headers_for_client(client_id=None):
+    """API headers for a given client's connection (None: the single-tenant one), for callers outside a request"""
+    access_token = tokens.access_token(client_id) if client_id else get_valid_token()
+    if not access_token:
+        raise ValueError(f"No valid Jobber access token for client {client_id or '(single-tenant)'}")
+    return {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
+
+
 def get_jobber_token():
-    """Get Jobber token data from database"""
+    """Get Jobber token data for the current client (X-Client-Id), else the single-tenant row"""
+    client_id = current_client_id()
+    if client_id:
+        return tokens.get(client_id)
     token = JobberToken.query.first()
     if token:
         return {
@@ -148,8 +254,12 @@ def get_jobber_token():
     return None
 
 
-def store_jobber_token(access_token, refresh_token, expires_in):
-    """Store Jobber tokens in database"""
+def store_jobber_token(access_token, refresh_token, expires_in, client_id=None):
+    """Store Jobber tokens in database (per client when client_id is given)"""
+    if client_id:
+        tokens.save(client_id, {"access_token": access_token, "refresh_token": refresh_token,
+                                "expires_in": expires_in})
+        return
     expires_at = int(time.time()) + expires_in
     
     token = JobberToken.query.first()
@@ -164,21 +274,33 @@ def store_jobber_token(access_token, refresh_token, expires_in):
     db.session.commit()
 
 
-def refresh_jobber_token(refresh_token):
-    """Refresh Jobber access token using refresh token"""
-    logger.info("Refreshing Jobber access token")
-    
+def _request_token_refresh(refresh_token):
+    """refresh_token grant against Jobber; returns the token response (raises on failure)"""
     data = {
         "grant_type": "refresh_token",
         "refresh_token": refresh_token,
         "client_id": CLIENT_ID,
         "client_secret": CLIENT_SECRET
     }
+    response = requests.post(TOKEN_URL, data=data, timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+
+# Per-client tokens (jobber_client_tokens) behind a sharded cache, renewed in the background
+tokens = TokenStore("jobber", JobberClientToken, _request_token_refresh)
+
+
+def refresh_jobber_token(refresh_token):
+    """Refresh Jobber access token using refresh token"""
+    logger.info("Refreshing Jobber access token")
     
+    client_id = current_client_id()
+    if client_id:
+        return tokens.renew(client_id)
+
     try:
-        response = requests.post(TOKEN_URL, data=data, timeout=30)
-        response.raise_for_status()
-        token_data = response.json()
+        token_data = _request_token_refresh(refresh_token)
         
         logger.info("Successfully refreshed Jobber access token")
         
@@ -213,6 +335,10 @@ def refresh_jobber_token(refresh_token):
 
 def get_valid_token():
     """Get a valid Jobber access token, refreshing if necessary"""
+    client_id = current_client_id()
+    if client_id:
+        # cached; renewed ahead of expiry by the jobber-token-refresh worker
+        return tokens.access_token(client_id)
     token = get_jobber_token()
     if not token:
         logger.warning("No Jobber token found in database")
@@ -251,16 +377,63 @@ def get_headers():
     }
 
 
-def _execute(query, variables=None, operation_name=None):
-    """Execute GraphQL query with automatic token refresh"""
-    logger.info(f"Executing GraphQL query: {operation_name or 'unnamed'}")
-    payload = {"query": query}
-    if variables:
-        payload["variables"] = variables
-    if operation_name:
-        payload["operationName"] = operation_name
+class JobberThrottled(Exception):
+    """Jobber refused the query because the cost bucket is empty (nothing was executed)"""
+
+
+class _ThrottleBudget:
+    """
+    Local view of Jobber's leaky cost bucket (extensions.cost.throttleStatus),
+    so concurrent batches wait for points instead of getting THROTTLED.
+    """
 
-    response = requests.post(GRAPHQL_URL, json=payload, headers=get_headers())
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.maximum = None
+        self.available = None
+        self.restore_rate = None
+        self.observed_at = 0.0
+
+    def _current(self, now):
+        if self.available is None:
+            return None
+        return min(self.maximum, self.available + self.restore_rate * (now - self.observed_at))
+
+    def reserve(self, cost):
+        """Block until `cost` points are (estimated to be) available, then take them"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                current = self._current(now)
+                if current is None or current >= min(cost, self.maximum):
+                    if current is not None:
+                        self.available, self.observed_at = current - cost, now
+                    return
+                wait = (min(cost, self.maximum) - current) / (self.restore_rate or 1)
+            time.sleep(min(wait, 10))
+
+    def observe(self, extensions):
+        status = ((extensions or {}).get("cost") or {}).get("throttleStatus")
+        if not status:
+            return
+        with self._lock:
+            self.maximum = status.get("maximumAvailable") or self.maximum
+            self.available = status.get("currentlyAvailable")
+            self.restore_rate = status.get("restoreRate") or self.restore_rate or 1
+            self.observed_at = time.monotonic()
+
+
+throttle = _ThrottleBudget()
+
+
+def _post_graphql(payload, headers=None):
+    """
+    POST a GraphQL payload and return the full response body (data, errors, extensions).
+    Pass `headers` from the request thread when calling from worker threads.
+    """
+    headers = headers or get_headers()
+    with bulkhead.slot("jobber"):
+        response = requests.post(GRAPHQL_URL, json=payload, headers=headers, timeout=GRAPHQL_TIMEOUT)
 
     try:
         response.raise_for_status()
@@ -269,7 +442,21 @@ def _execute(query, variables=None, operation_name=None):
         logger.error(f"GraphQL Request Payload: {payload}")
         raise e
 
-    data = response.json()
+    body = response.json()
+    throttle.observe(body.get("extensions"))
+    return body
+
+
+def _execute(query, variables=None, operation_name=None):
+    """Execute GraphQL query with automatic token refresh"""
+    logger.info(f"Executing GraphQL query: {operation_name or 'unnamed'}")
+    payload = {"query": query}
+    if variables:
+        payload["variables"] = variables
+    if operation_name:
+        payload["operationName"] = operation_name
+
+    data = _post_graphql(payload)
     if "errors" in data:
         error_msg = data["errors"][0].get("message")
         logger.error(f"GraphQL errors: {error_msg}")
@@ -279,22 +466,52 @@ def _execute(query, variables=None, operation_name=None):
     return data.get("data")
 
 
-def fetch_clients(first: int = 50, after: str = None):
-    """Fetch clients from Jobber with pagination"""
-    query = """
+def _execute_aliased(document, operation_name=None, variables=None, headers=None, cost=None):
+    """
+    Execute a document of aliased fields (a0: ..., a1: ...). Errors whose path
+    starts at an alias belong to that alias only and are returned per alias;
+    any other error fails the whole request. With `cost`, waits for that many
+    throttle points first and retries when Jobber answers THROTTLED.
+    """
+    logger.info(f"Executing aliased GraphQL document: {operation_name or 'unnamed'}")
+    payload = {"query": document}
+    if variables:
+        payload["variables"] = variables
+    for attempt in range(THROTTLE_RETRIES):
+        if cost:
+            throttle.reserve(cost)
+        body = _post_graphql(payload, headers)
+        errors = body.get("errors") or []
+        if not any((e.get("extensions") or {}).get("code") == "THROTTLED" for e in errors):
+            break
+        logger.warning(f"Jobber throttled {operation_name or 'query'} (attempt {attempt + 1})")
+    else:
+        raise JobberThrottled("Jobber query cost budget exhausted, try again later")
+    alias_errors = {}
+    for error in errors:
+        path = error.get("path") or []
+        if not path:
+            logger.error(f"GraphQL errors: {error.get('message')}")
+            raise Exception(error.get("message"))
+        alias_errors.setdefault(path[0], error.get("message"))
+    return body.get("data") or {}, alias_errors
+
+
+def _chunks(items, alias_cost):
+    """Split items so each aliased request stays under JOBBER_MAX_QUERY_COST"""
+    size = max(1, JOBBER_MAX_QUERY_COST // alias_cost)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+@lru_cache(maxsize=64)
+def _clients_query(fields):
+    """Compile the clients list query for a canonical field tuple (cached per combination)"""
+    return """
     query GetClients($first: Int!, $after: String) {
       clients(first: $first, after: $after) {
         edges {
-          node {
-            id
-            firstName
-            lastName
-            emails {
-              primary
-              address
-            }
-            companyName
-          }
+          node {%s          }
         }
         pageInfo {
           hasNextPage
@@ -302,7 +519,12 @@ def fetch_clients(first: int = 50, after: str = None):
         }
       }
     }
-    """
+    """ % _client_selection(fields)
+
+
+def fetch_clients(first: int = 50, after: str = None, fields=None):
+    """Fetch clients from Jobber with pagination; `fields` selects from CLIENT_FIELD_MAP"""
+    query = _clients_query(_canonical_client_fields(fields))
     
     variables = {"first": first}
     if after:
@@ -312,6 +534,110 @@ def fetch_clients(first: int = 50, after: str = None):
     return result.get("clients", {})
 
 
+# JOBS - named selection sets; a request may combine several (fields=dispatch,full)
+JOB_FIELD_SETS = {
+    "basic": """
+            id
+            jobNumber
+            title
+            status: jobStatus""",
+    "dispatch": """
+            startAt
+            endAt
+            client {
+              id
+              name
+              companyName
+            }
+            property {
+              id
+              address {
+                street
+                city
+                province
+                postalCode
+              }
+            }
+            visits {
+              totalCount
+            }""",
+    "full": """
+            total
+            instructions
+            createdAt
+            updatedAt""",
+}
+JOB_DEFAULT_FIELD_SETS = ("basic", "dispatch")
+
+
+@lru_cache(maxsize=32)
+def _jobs_query(field_sets):
+    """Compile the jobs query for a sorted tuple of field set names (cached per combination)"""
+    selection = "".join(JOB_FIELD_SETS[name] for name in ("basic", "dispatch", "full") if name in field_sets)
+    return """
+    query GetJobs($first: Int!, $after: String, $filter: JobFilterAttributes) {
+      jobs(first: $first, after: $after, filter: $filter) {
+        nodes {%s
+        }
+        pageInfo {
+          hasNextPage
+          endCursor
+        }
+        totalCount
+      }
+    }
+    """ % selection
+
+
+def fetch_jobs(first: int = 50, after: str = None, start_after: str = None, start_before: str = None,
+               field_sets=JOB_DEFAULT_FIELD_SETS):
+    """
+    Fetch one page of jobs with their client, property and visit count in a
+    single nested query. `start_after`/`start_before` (ISO 8601) filter on startAt.
+    Returns {"jobs": {"nodes": [...], "pageInfo": {...}, "totalCount": n}}.
+    """
+    unknown = set(field_sets) - set(JOB_FIELD_SETS)
+    if unknown:
+        raise ValueError(f"Unknown job field set(s): {', '.join(sorted(unknown))}")
+    variables = {"first": first}
+    if after:
+        variables["after"] = after
+    if start_after or start_before:
+        date_range = {}
+        if start_after:
+            date_range["after"] = start_after
+        if start_before:
+            date_range["before"] = start_before
+        variables["filter"] = {"startAt": date_range}
+
+    result = _execute(_jobs_query(tuple(sorted(set(field_sets) | {"basic"}))), variables, operation_name="GetJobs")
+    return {"jobs": (result or {}).get("jobs", {"nodes": [], "pageInfo": {"hasNextPage": False}})}
+
+
+def _client_create_input(first_name, last_name, email, company_name=None):
+    input_obj = {
+        "firstName": first_name,
+        "lastName": last_name,
+        "emails": [{"primary": True, "address": email}]
+    }
+    if company_name:
+        input_obj["companyName"] = company_name
+    return input_obj
+
+
+def _client_update_input(client_id, first_name=None, last_name=None, email=None, company_name=None):
+    input_obj = {"id": client_id}
+    if first_name:
+        input_obj["firstName"] = first_name
+    if last_name:
+        input_obj["lastName"] = last_name
+    if email:
+        input_obj["emails"] = [{"primary": True, "address": email}]
+    if company_name:
+        input_obj["companyName"] = company_name
+    return input_obj
+
+
 # CREATE
 def create_client(first_name: str, last_name: str, email: str, company_name: str = None):
     """Create a new client in Jobber with improved mutation"""
@@ -332,14 +658,7 @@ def create_client(first_name: str, last_name: str, email: str, company_name: str
     }
     """
     
-    input_obj = {
-        "firstName": first_name,
-        "lastName": last_name,
-        "emails": [{"primary": True, "address": email}]
-    }
-    if company_name:
-        input_obj["companyName"] = company_name
-
+    input_obj = _client_create_input(first_name, last_name, email, company_name)
     result = _execute(mutation, variables={"input": input_obj}, operation_name="CreateClient")
     errors = result["clientCreate"].get("userErrors")
     if errors:
@@ -353,33 +672,56 @@ def create_client(first_name: str, last_name: str, email: str, company_name: str
 
 
 # READ (List)
-def get_clients(first: int = 50, after: str = None):
+def get_clients(first: int = 50, after: str = None, fields=None):
     """Get clients from Jobber (alias for fetch_clients)"""
-    return fetch_clients(first, after)
+    return fetch_clients(first, after, fields)
 
 
-# READ (Single)
-def get_client_by_id(client_id: str):
-    """Get a specific client by ID from Jobber"""
-    query = """
+@lru_cache(maxsize=64)
+def _client_query(fields):
+    return """
     query ($id: ID!) {
-      client(id: $id) {
-        id
-        firstName
-        lastName
-        emails {
-          primary
-          address
-        }
-        companyName
-      }
-    }"""
-    result = _execute(query, {"id": client_id})
+      client(id: $id) {%s      }
+    }""" % _client_selection(fields)
+
+
+# READ (Single)
+def get_client_by_id(client_id: str, fields=None):
+    """Get a specific client by ID from Jobber; `fields` selects from CLIENT_FIELD_MAP"""
+    result = _execute(_client_query(_canonical_client_fields(fields)), {"id": client_id})
     if not result or not result.get("client"):
         raise Exception("Client not found")
     return result["client"]
 
 
+# READ (Batch)
+def get_clients_by_ids(client_ids, fields=None, headers=None):
+    """
+    Get many clients by ID with one aliased query per chunk
+    (c0: client(id: ...) { ... } c1: ...) instead of one request per ID.
+    Returns (clients in request order, {id: error} for IDs that could not be read).
+    """
+    ids = list(dict.fromkeys(i for i in client_ids if i))
+    fields = _canonical_client_fields(fields)
+    selection, cost = _client_selection(fields), _client_cost(fields)
+    found, missing = {}, {}
+    for chunk in _chunks(ids, cost):
+        aliases = "".join(
+            f"  c{n}: client(id: {json.dumps(client_id)}) {{{selection}  }}\n"
+            for n, client_id in enumerate(chunk)
+        )
+        data, errors = _execute_aliased("query GetClientsByIds {\n%s}" % aliases, "GetClientsByIds",
+                                        headers=headers, cost=cost * len(chunk))
+        for n, client_id in enumerate(chunk):
+            client = data.get(f"c{n}")
+            if client:
+                found[client_id] = client
+            else:
+                missing[client_id] = errors.get(f"c{n}") or "Client not found"
+    logger.info(f"Batch-fetched {len(found)} of {len(ids)} Jobber clients")
+    return [found[i] for i in ids if i in found], missing
+
+
 # UPDATE
 def update_client(client_id: str, first_name: str = None, last_name: str = None, email: str = None, company_name: str = None):
     """Update a client in Jobber"""
@@ -404,16 +746,7 @@ def update_client(client_id: str, first_name: str = None, last_name: str = None,
     }
     """
     
-    input_obj = {"id": client_id}
-    if first_name:
-        input_obj["firstName"] = first_name
-    if last_name:
-        input_obj["lastName"] = last_name
-    if email:
-        input_obj["emails"] = [{"primary": True, "address": email}]
-    if company_name:
-        input_obj["companyName"] = company_name
-
+    input_obj = _client_update_input(client_id, first_name, last_name, email, company_name)
     result = _execute(mutation, variables={"input": input_obj}, operation_name="UpdateClient")
     errors = result["clientUpdate"].get("userErrors")
     if errors:
@@ -421,6 +754,98 @@ def update_client(client_id: str, first_name: str = None, last_name: str = None,
     return result["clientUpdate"]["client"]
 
 
+JOB_QUERY_COST = 3  # job(id) { id client { id } }
+
+
+def get_job_client_ids(job_ids, headers=None):
+    """{job id: client id} for many jobs, one aliased query per chunk (missing jobs are left out)"""
+    ids = list(dict.fromkeys(i for i in job_ids if i))
+    out = {}
+    for chunk in _chunks(ids, JOB_QUERY_COST):
+        aliases = "".join(
+            f"  j{n}: job(id: {json.dumps(job_id)}) {{ id client {{ id }} }}\n" for n, job_id in enumerate(chunk)
+        )
+        data, _ = _execute_aliased("query GetJobClients {\n%s}" % aliases, "GetJobClients",
+                                   headers=headers, cost=JOB_QUERY_COST * len(chunk))
+        for n, job_id in enumerate(chunk):
+            job = data.get(f"j{n}") or {}
+            if (job.get("client") or {}).get("id"):
+                out[job_id] = job["client"]["id"]
+    return out
+
+
+# WEBHOOKS
+def verify_webhook_signature(raw_body: bytes, signature_header: str) -> bool:
+    """
+    Jobber signs the exact raw body with the app's client secret:
+    X-Jobber-Hmac-SHA256 = base64(HMAC-SHA256(client_secret, body)).
+    """
+    if not CLIENT_SECRET or not signature_header:
+        return False
+    digest = hmac.new(CLIENT_SECRET.encode("utf-8"), raw_body, hashlib.sha256).digest()
+    computed = base64.b64encode(digest).decode("utf-8")
+    return hmac.compare_digest(computed, signature_header.strip())
+
+
+# BULK CREATE / UPDATE
+def _bulk_mutate(field, input_type, inputs, operation_name):
+    """
+    Run one aliased mutation per input (m0: clientCreate(input: $i0) ...), packed into
+    requests sized by JOBBER_MAX_QUERY_COST and sent concurrently (JOBBER_BULK_WORKERS)
+    while the shared throttle budget allows. Returns one result per input, in order:
+    {"index", "success", "client", "errors": [userErrors]}.
+    """
+    headers = get_headers()  # resolved here: worker threads have no app context
+    indexed = list(enumerate(inputs))
+    chunks = list(_chunks(indexed, CLIENT_MUTATION_COST))
+
+    def run(chunk):
+        declarations = ", ".join(f"$i{n}: {input_type}!" for n in range(len(chunk)))
+        fields = "".join(
+            f"  m{n}: {field}(input: $i{n}) {{\n    client {{{CLIENT_FIELDS}    }}\n"
+            f"    userErrors {{ message path }}\n  }}\n"
+            for n in range(len(chunk))
+        )
+        document = f"mutation {operation_name}({declarations}) {{\n{fields}}}"
+        variables = {f"i{n}": input_obj for n, (_, input_obj) in enumerate(chunk)}
+        try:
+            data, alias_errors = _execute_aliased(document, operation_name, variables, headers,
+                                                  cost=CLIENT_MUTATION_COST * len(chunk))
+        except Exception as e:
+            return [{"index": i, "success": False, "client": None, "errors": [{"message": str(e)}]}
+                    for i, _ in chunk]
+        results = []
+        for n, (i, _) in enumerate(chunk):
+            payload = data.get(f"m{n}") or {}
+            errors = payload.get("userErrors") or []
+            if f"m{n}" in alias_errors:
+                errors = [{"message": alias_errors[f"m{n}"]}]
+            client = payload.get("client")
+            results.append({"index": i, "success": bool(client) and not errors, "client": client, "errors": errors})
+        return results
+
+    with ThreadPoolExecutor(max_workers=max(1, min(JOBBER_BULK_WORKERS, len(chunks)))) as pool:
+        results = [r for chunk_results in pool.map(run, chunks) for r in chunk_results]
+    failed = sum(1 for r in results if not r["success"])
+    logger.info(f"{operation_name}: {len(results) - failed} succeeded, {failed} failed in {len(chunks)} request(s)")
+    return results
+
+
+def bulk_create_clients(items):
+    """items: [{"first_name", "last_name", "email", "company_name"}, ...]"""
+    inputs = [_client_create_input(i.get("first_name"), i.get("last_name"), i.get("email"), i.get("company_name"))
+              for i in items]
+    return _bulk_mutate("clientCreate", "ClientCreateInput", inputs, "BulkCreateClients")
+
+
+def bulk_update_clients(items):
+    """items: [{"id", "first_name", "last_name", "email", "company_name"}, ...]"""
+    inputs = [_client_update_input(i.get("id"), i.get("first_name"), i.get("last_name"), i.get("email"),
+                                   i.get("company_name"))
+              for i in items]
+    return _bulk_mutate("clientUpdate", "ClientUpdateInput", inputs, "BulkUpdateClients")
+
+
 # DELETE
 def delete_client(client_id: str):
     """Delete a client from Jobber"""
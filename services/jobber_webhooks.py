@@ -0,0 +1,214 @@
+# services/jobber_webhooks.py
+import os
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from models import db, CRMs, JobberClientData, JobberClientToken, JobberWebhookEvent
+from services.background import register_worker
+from services import jobber_service
+
+log = logging.getLogger(__name__)
+
+JOBBER_WEBHOOK_BATCH = int(os.getenv("JOBBER_WEBHOOK_BATCH", "200"))
+JOBBER_WEBHOOK_MAX_ATTEMPTS = int(os.getenv("JOBBER_WEBHOOK_MAX_ATTEMPTS", "5"))
+JOBBER_WEBHOOK_LEASE = 300  # seconds before a 'processing' event from a dead worker is picked up again
+
+# Selection stored in the mirror (crm_metadata["client"])
+MIRROR_FIELDS = ["id", "name", "firstName", "lastName", "companyName", "isCompany",
+                 "emails", "phones", "billingAddress", "updatedAt"]
+
+def parse(raw_body: bytes) -> Optional[Dict[str, Any]]:
+    """{"data": {"webHookEvent": {"topic", "itemId", "accountId", "occurredAt", ...}}} -> event fields"""
+    try:
+        payload = json.loads(raw_body)
+    except ValueError:
+        return None
+    event = ((payload or {}).get("data") or {}).get("webHookEvent") if isinstance(payload, dict) else None
+    if not event or not event.get("topic") or not event.get("itemId"):
+        return None
+    return {
+        "topic": str(event["topic"]).upper(),
+        "item_id": str(event["itemId"]),
+        "account_id": event.get("accountId"),
+        "occurred_at": event.get("occurredAt"),
+    }
+
+def enqueue(event: Dict[str, Any]) -> None:
+    db.session.add(JobberWebhookEvent(**event))
+    db.session.commit()
+
+def _claim_batch() -> List[JobberWebhookEvent]:
+    now = datetime.utcnow()
+    ready = db.and_(JobberWebhookEvent.status == "pending", JobberWebhookEvent.available_at <= now)
+    abandoned = db.and_(JobberWebhookEvent.status == "processing",
+                        JobberWebhookEvent.available_at <= now - timedelta(seconds=JOBBER_WEBHOOK_LEASE))
+    events = (JobberWebhookEvent.query
+              .filter(db.or_(ready, abandoned))
+              .order_by(JobberWebhookEvent.id)
+              .limit(JOBBER_WEBHOOK_BATCH)
+              .with_for_update(skip_locked=True)
+              .all())
+    for ev in events:
+        ev.status = "processing"
+        ev.available_at = now
+    db.session.commit()
+    return events
+
+def _display_name(client: Dict[str, Any]) -> str:
+    full = " ".join(p for p in (client.get("firstName"), client.get("lastName")) if p)
+    return (client.get("name") or client.get("companyName") or full or client["id"])[:100]
+
+def _primary(items: List[Dict[str, Any]], key: str) -> Optional[str]:
+    items = items or []
+    chosen = next((i for i in items if i.get("primary")), items[0] if items else None)
+    return chosen.get(key) if chosen else None
+
+def _jobber_crm_id() -> int:
+    crm = CRMs.query.filter_by(name="Jobber").first()
+    if not crm:
+        raise RuntimeError("Jobber CRM row missing; run initialize_database")
+    return crm.id
+
+def owner_client_id(account_id: Optional[str]) -> Optional[int]:
+    """
+    Our client whose Jobber connection is `account_id`; None when no client
+    connected it (the single-tenant JobberToken). Connections made before
+    account ids were recorded are looked up once, on first need.
+    """
+    if not account_id:
+        return None
+    row = JobberClientToken.query.filter_by(jobber_account_id=str(account_id)).first()
+    if row:
+        return row.client_id
+    unknown = [c for (c,) in db.session.query(JobberClientToken.client_id)
+               .filter(JobberClientToken.jobber_account_id.is_(None)).all()]
+    for client_id in unknown:
+        if jobber_service.remember_account_id(client_id) == str(account_id):
+            return client_id
+    return None
+
+def _source_client_id(client_id: Optional[int]) -> str:
+    """JobberClientData.source_client_id for a tenant: our client id, "" for the single-tenant connection."""
+    return str(client_id) if client_id else ""
+
+def _upsert(clients: List[Dict[str, Any]], account_id: Optional[str], owner: str, topics: Dict[str, str]) -> None:
+    crm_id = _jobber_crm_id()
+    existing = {row.crm_client_id: row for row in JobberClientData.query.filter(
+        JobberClientData.crm_id == crm_id,
+        JobberClientData.source_client_id == owner,
+        JobberClientData.crm_client_id.in_([c["id"] for c in clients])).all()} if clients else {}
+    now = datetime.utcnow()
+    for client in clients:
+        row = existing.get(client["id"])
+        if not row:
+            row = JobberClientData(crm_id=crm_id, crm_client_id=client["id"], source_client_id=owner)
+            db.session.add(row)
+        if account_id:
+            row.jobber_account_id = str(account_id)
+        row.name = _display_name(client)
+        row.email = (_primary(client.get("emails"), "address") or "")[:100] or None
+        row.phone_number = (_primary(client.get("phones"), "number") or "")[:20] or None
+        row.crm_metadata = {
+            "client": client,
+            "synced_at": now.isoformat(),
+            "topic": topics.get(client["id"]),
+        }
+
+def _apply(account_id: Optional[str], client_id: Optional[int], headers: Dict[str, str],
+           events: List[JobberWebhookEvent]) -> Dict[str, int]:
+    """
+    Apply one Jobber account's events: collapse them to the latest topic per
+    item, then fetch only the changed clients (and the clients of changed jobs)
+    with aliased queries, using the owning client's token, and upsert them.
+    """
+    owner = _source_client_id(client_id)
+    latest: Dict[str, JobberWebhookEvent] = {}
+    for ev in events:
+        latest[ev.item_id] = ev  # claimed in id order, so the last one wins
+    destroyed = [i for i, ev in latest.items() if ev.topic == "CLIENT_DESTROY"]
+    client_ids = [i for i, ev in latest.items() if ev.topic.startswith("CLIENT_") and ev.topic != "CLIENT_DESTROY"]
+    job_ids = [i for i, ev in latest.items() if ev.topic.startswith("JOB_") and ev.topic != "JOB_DESTROY"]
+
+    topics = {i: latest[i].topic for i in client_ids}
+    if job_ids:
+        # a job change can move client-level data (balances, counts); refresh the owning client
+        for job_id, jobber_client_id in jobber_service.get_job_client_ids(job_ids, headers=headers).items():
+            if jobber_client_id not in topics:
+                client_ids.append(jobber_client_id)
+                topics[jobber_client_id] = latest[job_id].topic
+
+    clients, missing = (jobber_service.get_clients_by_ids(client_ids, fields=MIRROR_FIELDS, headers=headers)
+                        if client_ids else ([], {}))
+    _upsert(clients, account_id, owner, topics)
+    gone = destroyed + [i for i in missing if topics.get(i, "").startswith("CLIENT_")]
+    if gone:
+        JobberClientData.query.filter(JobberClientData.source_client_id == owner,
+                                      JobberClientData.crm_client_id.in_(gone)).delete(synchronize_session=False)
+    return {"upserted": len(clients), "deleted": len(gone)}
+
+def process_pending() -> bool:
+    """Worker: apply a batch of events account by account; one account failing doesn't hold back the others."""
+    events = _claim_batch()
+    if not events:
+        return False
+    by_account: Dict[Optional[str], List[JobberWebhookEvent]] = {}
+    for ev in events:
+        by_account.setdefault(ev.account_id, []).append(ev)
+    counts = {"upserted": 0, "deleted": 0, "failed": 0}
+    for account_id, account_events in by_account.items():
+        now = datetime.utcnow()
+        try:
+            client_id = owner_client_id(account_id)
+            headers = jobber_service.headers_for_client(client_id)
+            with db.session.begin_nested():
+                for key, n in _apply(account_id, client_id, headers, account_events).items():
+                    counts[key] += n
+            for ev in account_events:
+                ev.status, ev.error, ev.processed_at = "done", None, now
+                ev.attempts = (ev.attempts or 0) + 1
+        except Exception as e:
+            log.exception("Jobber webhooks for account %s failed", account_id)
+            counts["failed"] += len(account_events)
+            for ev in account_events:
+                ev.attempts = (ev.attempts or 0) + 1
+                ev.status = "failed" if ev.attempts >= JOBBER_WEBHOOK_MAX_ATTEMPTS else "pending"
+                ev.available_at = now + timedelta(seconds=2 ** ev.attempts)
+                ev.error = str(e)
+        db.session.commit()
+    log.info("Processed %d Jobber webhooks (%s)", len(events), counts)
+    return True
+
+def queue_stats() -> Dict[str, int]:
+    rows = db.session.query(JobberWebhookEvent.status, db.func.count(JobberWebhookEvent.id)).group_by(JobberWebhookEvent.status).all()
+    return {status: count for status, count in rows}
+
+# -------- local reads --------
+
+def _freshness(row: JobberClientData) -> Dict[str, Any]:
+    meta = row.crm_metadata or {}
+    return {"source": "mirror", "synced_at": meta.get("synced_at"), "topic": meta.get("topic")}
+
+def local_client(jobber_client_id: str, client_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """The tenant's mirrored client plus freshness metadata, or None if the mirror has never seen it."""
+    row = JobberClientData.query.filter_by(crm_client_id=jobber_client_id,
+                                           source_client_id=_source_client_id(client_id)).first()
+    if not row or not (row.crm_metadata or {}).get("client"):
+        return None
+    return {"client": row.crm_metadata["client"], **_freshness(row)}
+
+def local_clients(limit: int = 50, after: Optional[int] = None, client_id: Optional[int] = None) -> Dict[str, Any]:
+    """The tenant's mirrored clients in row order; `after` is the last row id of the previous page."""
+    q = JobberClientData.query.filter_by(source_client_id=_source_client_id(client_id))
+    if after:
+        q = q.filter(JobberClientData.id > after)
+    rows = q.order_by(JobberClientData.id).limit(limit + 1).all()
+    page = rows[:limit]
+    return {
+        "nodes": [{**(r.crm_metadata or {}).get("client", {}), "_mirror": _freshness(r)} for r in page],
+        "pageInfo": {"hasNextPage": len(rows) > limit, "endCursor": str(page[-1].id) if page else None},
+        "source": "mirror",
+        "pending_events": JobberWebhookEvent.query.filter_by(status="pending").count(),
+    }
+
+register_worker("jobber-webhooks", process_pending, interval=2.0)
@@ -4,8 +4,8 @@ import json
 import logging
 from typing import Any, Dict, Optional, List, Tuple
 
-import requests
 from dotenv import load_dotenv
+from services import circuit_breaker
 
 # Load environment from .env if present
 load_dotenv()
@@ -121,7 +121,8 @@ def _request(
     backoff = 0.8
 
     for attempt in range(retries + 1):
-        resp = requests.request(
+        resp = circuit_breaker.send(
+            "jobnimbus",
             method,
             url,
             headers=_headers(),
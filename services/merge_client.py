@@ -1,32 +1,177 @@
 # services/merge_client.py
 import os
+import json
+import math
+import time
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from flask import Response, abort, g, has_request_context, jsonify, make_response, request, stream_with_context
+from models import MergeLinkedAccount
+from services import merge_ratelimit, bulkhead
+from services.single_flight import SharedBody, flight_key, flights
+
+PAGE_SIZE = 100  # Merge's maximum page size
 
 MERGE_PROD_KEY = os.environ.get("MERGE_PROD_KEY", "placeholder_key")  # your Production Access Key
-MERGE_ACCOUNT_TOKEN = os.environ.get("MERGE_ACCOUNT_TOKEN")  # per-linked-account token
+MERGE_ACCOUNT_TOKEN = os.environ.get("MERGE_ACCOUNT_TOKEN")  # fallback when a request names no linked account
+MERGE_POOL_SIZE = int(os.getenv("MERGE_POOL_SIZE", "32"))  # keep-alive connections per domain
+MERGE_TOKEN_CACHE_TTL = int(os.getenv("MERGE_TOKEN_CACHE_TTL", "300"))  # seconds
+STREAM_CHUNK = 64 * 1024
 
 BASES = {
     "crm":  os.getenv("MERGE_CRM_BASE",  "https://api.merge.dev/api/crm/v1"),
     "hris": os.getenv("MERGE_HRIS_BASE", "https://api.merge.dev/api/hris/v1"),
 }
 
-def _headers(extra=None):
+def _session() -> requests.Session:
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MERGE_POOL_SIZE)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+# One keep-alive pool per Merge domain, shared by every tenant
+_sessions = {domain: _session() for domain in BASES}
+
+# client_id -> (expires_at, account_token)
+_token_cache = {}
+_token_lock = threading.Lock()
+
+def account_token_for_client(client_id: int):
+    """Active linked account token for a client, cached for MERGE_TOKEN_CACHE_TTL seconds."""
+    now = time.monotonic()
+    with _token_lock:
+        hit = _token_cache.get(client_id)
+    if hit and hit[0] > now:
+        return hit[1]
+    rec = MergeLinkedAccount.query.filter_by(client_id=client_id, status="active").first()
+    if not rec:
+        return None
+    with _token_lock:
+        _token_cache[client_id] = (now + MERGE_TOKEN_CACHE_TTL, rec.account_token)
+    return rec.account_token
+
+def forget_client(client_id: int) -> None:
+    """Drop a cached token, e.g. after a linked account was disabled or relinked."""
+    with _token_lock:
+        _token_cache.pop(client_id, None)
+
+def current_account_token():
+    """
+    Account token the unified routes act on for this request:
+      X-Account-Token header, else the linked account of the X-Client-Id header,
+      else MERGE_ACCOUNT_TOKEN (single-tenant deployments).
+    """
+    if not has_request_context():
+        return MERGE_ACCOUNT_TOKEN
+    if "merge_account_token" not in g:
+        token = request.headers.get("X-Account-Token")
+        client_id = request.headers.get("X-Client-Id")
+        if not token and client_id:
+            if not client_id.isdigit():
+                abort(make_response(jsonify({"error": "X-Client-Id must be an integer"}), 400))
+            token = account_token_for_client(int(client_id))
+            if not token:
+                abort(make_response(jsonify({"error": f"No active Merge linked account for client {client_id}"}), 404))
+        g.merge_account_token = token or MERGE_ACCOUNT_TOKEN
+    return g.merge_account_token
+
+def _headers(extra=None, account_token=None):
     h = {
         "Accept": "application/json",
         "Authorization": f"Bearer {MERGE_PROD_KEY}",
     }
-    if MERGE_ACCOUNT_TOKEN:
-        h["X-Account-Token"] = MERGE_ACCOUNT_TOKEN
+    account_token = account_token or current_account_token()
+    if account_token:
+        h["X-Account-Token"] = account_token
     if extra:
         h.update(extra)
     return h
 
-def call(domain: str, method: str, path: str, **kwargs):
-    url = f"{BASES[domain]}{path}"
-    resp = requests.request(method, url, headers=_headers(kwargs.pop("headers", None)),
-                            timeout=45, **kwargs)
+def _send(domain: str, method: str, path: str, account_token=None, **kwargs):
+    """
+    One Merge request on the domain's pool, paced by the rate-limit governor.
+    When the budget can't be had in time, user requests get a 429 with Retry-After;
+    background callers see MergeRateLimited.
+    """
+    headers = _headers(kwargs.pop("headers", None), account_token)
+    account_token = headers.get("X-Account-Token")
+    session_request = bulkhead.limited("merge", _sessions[domain].request,
+                                       tenant=merge_ratelimit.account_label(account_token) if account_token else None)
+    try:
+        return merge_ratelimit.send(session_request, method, f"{BASES[domain]}{path}",
+                                    account_token=account_token,
+                                    headers=headers, timeout=45, **kwargs)
+    except merge_ratelimit.MergeRateLimited as e:
+        if has_request_context():
+            abort(Response(json.dumps({"error": str(e)}), status=429, mimetype="application/json",
+                           headers={"Retry-After": str(math.ceil(e.retry_after))}))
+        raise
+
+def _call(domain: str, method: str, path: str, account_token=None, **kwargs):
+    resp = _send(domain, method, path, account_token, **kwargs)
     # Bubble up Merge errors to the client
     resp.raise_for_status()
     if resp.content and resp.headers.get("Content-Type","").startswith("application/json"):
         return resp.json()
-    return {"ok": True} 
\ No newline at end of file
+    return {"ok": True}
+
+def _coalescible(method: str, kwargs) -> bool:
+    """Plain GETs (no extra headers or body) may share one upstream request."""
+    return method.upper() == "GET" and set(kwargs) <= {"params"}
+
+def call(domain: str, method: str, path: str, account_token=None, **kwargs):
+    if not _coalescible(method, kwargs):
+        return _call(domain, method, path, account_token, **kwargs)
+    account_token = account_token or current_account_token()
+    key = flight_key("merge", account_token, "GET", f"{domain}{path}", kwargs.get("params"))
+    return flights.do(key, lambda: _call(domain, method, path, account_token, **kwargs))
+
+def _open_shared(domain: str, path: str, account_token, params):
+    resp = _send(domain, "GET", path, account_token, stream=True, params=params)
+    return resp.status_code, resp.headers, SharedBody(resp, STREAM_CHUNK)
+
+def proxy(domain: str, method: str, path: str, account_token=None, **kwargs) -> Response:
+    """
+    Relay a Merge response to our caller without parsing it: the body is streamed
+    through in chunks with Merge's status code and content type, so memory stays
+    flat however large the page is. Identical concurrent GETs (same linked
+    account, path and params) share one upstream request and its streamed body.
+    """
+    if _coalescible(method, kwargs):
+        account_token = account_token or current_account_token()
+        key = flight_key("merge", account_token, "GET", f"{domain}{path}", kwargs.get("params"))
+        status, headers, body = flights.do(key, lambda: _open_shared(domain, path, account_token, kwargs.get("params")),
+                                           copy_result=False, participants=lambda head, n: head[2].expect(n))
+        reader = body.reader()
+        chunks, close = iter(reader), reader.close
+    else:
+        resp = _send(domain, method, path, account_token, stream=True, **kwargs)
+        status, headers = resp.status_code, resp.headers
+        chunks, close = resp.iter_content(chunk_size=STREAM_CHUNK), resp.close
+    out = Response(stream_with_context(chunks),
+                   status=status,
+                   content_type=headers.get("Content-Type", "application/json"))
+    if "Retry-After" in headers:
+        out.headers["Retry-After"] = headers["Retry-After"]
+    out.call_on_close(close)
+    return out
+
+def iter_pages(domain: str, path: str, params=None, account_token=None, fetch=None):
+    """
+    Yield every page (list of `results`) of a Merge list endpoint, following the
+    `next` cursor at page_size=100. `fetch(params) -> page` overrides the GET, so
+    callers on another client (e.g. merge_service) share the same cursor walk.
+    """
+    params = {k: v for k, v in (params or {}).items() if k not in ("cursor", "page_size")}
+    params["page_size"] = PAGE_SIZE
+    if fetch is None:
+        account_token = account_token or current_account_token()
+        fetch = lambda p: call(domain, "GET", path, account_token=account_token, params=p)
+    while True:
+        page = fetch(params)
+        yield page.get("results") or []
+        if not page.get("next"):
+            return
+        params = {**params, "cursor": page["next"]}
@@ -0,0 +1,96 @@
+# services/merge_fanout.py
+import os
+import math
+import time
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+from models import MergeLinkedAccount
+
+log = logging.getLogger(__name__)
+
+MERGE_FANOUT_WORKERS = int(os.getenv("MERGE_FANOUT_WORKERS", "8"))
+MERGE_FANOUT_DEADLINE = float(os.getenv("MERGE_FANOUT_DEADLINE", "20"))  # seconds per account
+
+def active_accounts(client_id: int) -> List[MergeLinkedAccount]:
+    return (MergeLinkedAccount.query
+            .filter_by(client_id=client_id, status="active")
+            .order_by(MergeLinkedAccount.id)
+            .all())
+
+def fan_out(client_id: int, list_fn: Callable[[str, Dict[str, Any]], Dict[str, Any]],
+            params: Dict[str, Any], deadline: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Call list_fn(account_token, params) for every active linked account of the
+    client in parallel and merge the pages:
+      {"results": [... each tagged with "_source" ...],
+       "accounts": [{"linked_account_id", "integration_slug", "count", "next"}],
+       "errors":   [{"linked_account_id", "integration_slug", "error"}]}
+    Each account gets `deadline` seconds from when its call starts (accounts
+    queued behind MERGE_FANOUT_WORKERS busy threads start later). Accounts that
+    fail or run out of time are reported in errors; the rest are still returned,
+    so latency is that of the slowest account, not the sum.
+    A cursor only means something to one account, so each account's `next` is
+    reported separately (follow it with account_token=...).
+    """
+    deadline = deadline or MERGE_FANOUT_DEADLINE
+    params = {k: v for k, v in params.items() if k != "cursor"}
+    accounts = active_accounts(client_id)
+    out: Dict[str, Any] = {"results": [], "accounts": [], "errors": []}
+    if not accounts:
+        return out
+
+    workers = min(MERGE_FANOUT_WORKERS, len(accounts))
+    started: Dict[int, float] = {}  # linked account id -> time.monotonic() its call started
+
+    def call(la: MergeLinkedAccount) -> Dict[str, Any]:
+        started[la.id] = time.monotonic()
+        return list_fn(la.account_token, dict(params))
+
+    # Worst case every wave of `workers` accounts uses its whole deadline
+    give_up_at = time.monotonic() + deadline * math.ceil(len(accounts) / workers)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {pool.submit(call, la): la for la in accounts}
+        pending, stragglers, finished = set(futures), set(), set()
+        while pending:
+            now = time.monotonic()
+            for fut in [f for f in pending if futures[f].id in started and now >= started[futures[f].id] + deadline]:
+                pending.discard(fut)
+                stragglers.add(fut)
+            if not pending or now >= give_up_at:
+                break
+            expiries = [started[futures[f].id] + deadline for f in pending if futures[f].id in started]
+            # a straggler finishing frees a thread, so a queued account starts and needs its own expiry
+            done, _ = wait(pending | stragglers, timeout=min(expiries + [give_up_at]) - now,
+                           return_when=FIRST_COMPLETED)
+            finished |= done & pending
+            pending -= done
+            stragglers -= done
+    finally:
+        # Don't hold the request for stragglers; their HTTP timeouts end them
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    for fut, la in futures.items():
+        source = {"linked_account_id": la.id, "integration_slug": la.integration_slug}
+        if fut not in finished:
+            error = f"timed out after {deadline:g}s" if la.id in started else "not started: all fan-out workers busy"
+            out["errors"].append({**source, "error": error})
+            continue
+        try:
+            page = fut.result()
+        except Exception as e:
+            log.warning("Merge fan-out for linked account %s failed: %s", la.id, e)
+            out["errors"].append({**source, "error": str(e)})
+            continue
+        results = page.get("results") or []
+        out["results"].extend({**r, "_source": source} if isinstance(r, dict) else r for r in results)
+        out["accounts"].append({**source, "count": len(results), "next": page.get("next")})
+    return out
+
+def status_for(data: Dict[str, Any]) -> int:
+    """200 when at least one account answered (or there are none), 502 when all of them failed."""
+    return 502 if data["errors"] and not data["accounts"] else 200
+
+def wants_all_accounts(args) -> bool:
+    return (args.get("accounts") or "").lower() == "all"
@@ -0,0 +1,164 @@
+# services/merge_hris_reports.py
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from models import db, MergeTimesheetEntry, MergeTimeOff, MergeEmployeeDimension
+
+GROUP_BY = ("employee", "group", "location")
+PERIODS = ("day", "week", "month", "all")
+
+def _ts(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return dt.replace(tzinfo=None) - (dt.utcoffset() or timedelta(0))
+
+def _ref(value) -> Optional[str]:
+    """Merge relation fields are ids, or objects when expanded."""
+    if isinstance(value, dict):
+        return value.get("id")
+    return value
+
+def _num(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+# -------- projection (mirror sync -> typed tables) --------
+
+def _upsert(model, linked_account_id: int, records: List[Dict[str, Any]], columns) -> None:
+    ids = [r["id"] for r in records if r.get("id")]
+    existing = {row.object_id: row for row in model.query.filter(
+        model.linked_account_id == linked_account_id, model.object_id.in_(ids)).all()} if ids else {}
+    for rec in records:
+        if not rec.get("id"):
+            continue
+        row = existing.get(rec["id"])
+        if rec.get("remote_was_deleted"):
+            if row:
+                db.session.delete(row)
+            continue
+        if not row:
+            row = model(linked_account_id=linked_account_id, object_id=rec["id"])
+            db.session.add(row)
+        for name, value in columns(rec).items():
+            setattr(row, name, value)
+
+def _employees(linked_account_id: int, records: List[Dict[str, Any]]) -> None:
+    ids = [r["id"] for r in records if r.get("id")]
+    if not ids:
+        return
+    MergeEmployeeDimension.query.filter(
+        MergeEmployeeDimension.linked_account_id == linked_account_id,
+        MergeEmployeeDimension.employee_id.in_(ids),
+    ).delete(synchronize_session=False)
+    rows = []
+    for rec in records:
+        if not rec.get("id") or rec.get("remote_was_deleted"):
+            continue
+        for group in rec.get("groups") or []:
+            if _ref(group):
+                rows.append({"linked_account_id": linked_account_id, "employee_id": rec["id"],
+                             "dimension": "group", "value": _ref(group)})
+        if _ref(rec.get("work_location")):
+            rows.append({"linked_account_id": linked_account_id, "employee_id": rec["id"],
+                         "dimension": "location", "value": _ref(rec["work_location"])})
+    if rows:
+        db.session.bulk_insert_mappings(MergeEmployeeDimension, rows)
+
+def project(linked_account_id: int, model: str, records: List[Dict[str, Any]]) -> None:
+    """Called by the mirror sync for each synced HRIS page."""
+    if model == "timesheet-entries":
+        _upsert(MergeTimesheetEntry, linked_account_id, records, lambda r: {
+            "employee_id": _ref(r.get("employee")),
+            "hours_worked": _num(r.get("hours_worked")),
+            "start_time": _ts(r.get("start_time")),
+            "end_time": _ts(r.get("end_time")),
+            "remote_modified_at": _ts(r.get("modified_at")),
+        })
+    elif model == "time-off":
+        _upsert(MergeTimeOff, linked_account_id, records, lambda r: {
+            "employee_id": _ref(r.get("employee")),
+            "status": r.get("status"),
+            "request_type": r.get("request_type"),
+            "units": r.get("units"),
+            "amount": _num(r.get("amount")),
+            "start_time": _ts(r.get("start_time")),
+            "end_time": _ts(r.get("end_time")),
+            "remote_modified_at": _ts(r.get("modified_at")),
+        })
+    elif model == "employees":
+        _employees(linked_account_id, records)
+
+# -------- aggregation --------
+
+def _period(column, period: str):
+    """Bucket a timestamp column by day/week (Monday)/month in SQL."""
+    if db.engine.dialect.name == "postgresql":
+        return db.func.date_trunc(period, column)
+    if period == "day":
+        return db.func.date(column)
+    if period == "week":
+        return db.func.date(column, "-6 days", "weekday 1")
+    return db.func.strftime("%Y-%m-01", column)
+
+def _aggregate(model, value_column, linked_account_ids: List[int], group_by: str, period: str,
+               start: Optional[datetime], end: Optional[datetime], filters=(), split=None) -> List[Dict[str, Any]]:
+    if group_by == "employee":
+        key = model.employee_id
+        q = db.session.query(key.label("key"))
+    else:
+        key = MergeEmployeeDimension.value
+        q = db.session.query(key.label("key")).join(
+            MergeEmployeeDimension,
+            db.and_(MergeEmployeeDimension.linked_account_id == model.linked_account_id,
+                    MergeEmployeeDimension.employee_id == model.employee_id,
+                    MergeEmployeeDimension.dimension == group_by))
+    columns = [key]
+    if split is not None:
+        q = q.add_columns(split.label("split"))
+        columns.append(split)
+    if period != "all":
+        bucket = _period(model.start_time, period)
+        q = q.add_columns(bucket.label("period"))
+        columns.append(bucket)
+    q = q.add_columns(db.func.sum(value_column).label("total"), db.func.count(model.id).label("entries"))
+    q = q.filter(model.linked_account_id.in_(linked_account_ids), *filters)
+    if start:
+        q = q.filter(model.start_time >= start)
+    if end:
+        q = q.filter(model.start_time < end)
+    rows = q.group_by(*columns).order_by(*columns).all()
+    out = []
+    for row in rows:
+        item = {f"{group_by}_id": row.key, "total": round(row.total or 0, 4), "entries": row.entries}
+        if split is not None:
+            item[split.key] = row.split
+        if period != "all":
+            item["period"] = row.period.isoformat()[:10] if hasattr(row.period, "isoformat") else str(row.period)[:10]
+        out.append(item)
+    return out
+
+def hours_worked(linked_account_ids: List[int], group_by: str = "employee", period: str = "week",
+                 start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Sum of timesheet hours per employee/group/location and period."""
+    return _aggregate(MergeTimesheetEntry, MergeTimesheetEntry.hours_worked, linked_account_ids,
+                      group_by, period, start, end)
+
+def time_off(linked_account_ids: List[int], group_by: str = "employee", period: str = "month",
+             start: Optional[datetime] = None, end: Optional[datetime] = None,
+             status: Optional[str] = "APPROVED", request_type: Optional[str] = None,
+             units: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Sum of time off amounts per employee/group/location, period and units (HOURS and DAYS never mix)."""
+    filters = []
+    if status:
+        filters.append(MergeTimeOff.status == status.upper())
+    if request_type:
+        filters.append(MergeTimeOff.request_type == request_type.upper())
+    if units:
+        filters.append(MergeTimeOff.units == units.upper())
+    return _aggregate(MergeTimeOff, MergeTimeOff.amount, linked_account_ids, group_by, period, start, end,
+                      filters, split=MergeTimeOff.units)
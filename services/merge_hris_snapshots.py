@@ -0,0 +1,122 @@
+# services/merge_hris_snapshots.py
+import json
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+from models import db, MergeLinkedAccount, MergeHrisSnapshot, MergeHrisRecordHash
+from services.merge_client import iter_pages
+from services.merge_service import hris_list_employees, hris_list_employments
+
+log = logging.getLogger(__name__)
+
+# Directory models covered by a snapshot -> list function
+SNAPSHOT_MODELS = {
+    "employees": hris_list_employees,
+    "employments": hris_list_employments,
+}
+
+# Bookkeeping that changes without the record itself changing
+VOLATILE_FIELDS = {"created_at", "modified_at", "remote_data", "field_mappings", "remote_was_deleted"}
+
+def _normalise(value: Any, nested: bool = True) -> Any:
+    """
+    Strip whitespace, collapse expanded relations to their id and sort id lists so order never counts as a change.
+    Only nested objects are collapsed; the record itself (nested=False) keeps all its fields.
+    """
+    if isinstance(value, dict):
+        if nested and "id" in value and "remote_id" in value:
+            return value["id"]
+        return {k: _normalise(v) for k, v in value.items() if k not in VOLATILE_FIELDS and v is not None}
+    if isinstance(value, list):
+        items = [_normalise(v) for v in value]
+        return sorted(items, key=lambda v: json.dumps(v, sort_keys=True, default=str))
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+def content_hash(record: Dict[str, Any]) -> str:
+    canonical = json.dumps(_normalise(record, nested=False), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def take_snapshot(la: MergeLinkedAccount) -> MergeHrisSnapshot:
+    """
+    Pull the full directory for one linked account, hash each record and record
+    what was added, changed or removed relative to the stored hashes.
+    Unchanged records are not written.
+    """
+    snap = MergeHrisSnapshot(linked_account_id=la.id, counts={})
+    db.session.add(snap)
+    db.session.flush()
+    counts = {}
+    try:
+        for model, list_fn in SNAPSHOT_MODELS.items():
+            counts[model] = _apply(la, snap.id, model, list_fn)
+        snap.counts = counts
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    log.info("HRIS snapshot %s for linked account %s: %s", snap.id, la.id, counts)
+    return snap
+
+def _apply(la: MergeLinkedAccount, snapshot_id: int, model: str, list_fn) -> Dict[str, int]:
+    stored = {row.object_id: row for row in MergeHrisRecordHash.query.filter_by(
+        linked_account_id=la.id, model=model).all()}
+    seen = set()
+    added = changed = 0
+    pages = iter_pages("hris", f"/{model}", fetch=lambda p: list_fn(la.account_token, p))
+    for page in pages:
+        for rec in page:
+            if not rec.get("id") or rec.get("remote_was_deleted"):
+                continue
+            seen.add(rec["id"])
+            digest = content_hash(rec)
+            row = stored.get(rec["id"])
+            if row is None:
+                db.session.add(MergeHrisRecordHash(
+                    linked_account_id=la.id, model=model, object_id=rec["id"], content_hash=digest, data=rec,
+                    created_snapshot_id=snapshot_id, changed_snapshot_id=snapshot_id))
+                added += 1
+            elif row.removed_snapshot_id is not None:
+                # came back after being removed: a new record as far as consumers are concerned
+                row.content_hash, row.data, row.removed_snapshot_id = digest, rec, None
+                row.created_snapshot_id = row.changed_snapshot_id = snapshot_id
+                added += 1
+            elif row.content_hash != digest:
+                row.content_hash, row.data, row.changed_snapshot_id = digest, rec, snapshot_id
+                changed += 1
+    removed = 0
+    for object_id, row in stored.items():
+        if object_id not in seen and row.removed_snapshot_id is None:
+            row.removed_snapshot_id = row.changed_snapshot_id = snapshot_id
+            removed += 1
+    return {"total": len(seen), "added": added, "changed": changed, "removed": removed}
+
+def latest_snapshot(linked_account_id: int) -> Optional[MergeHrisSnapshot]:
+    return (MergeHrisSnapshot.query.filter_by(linked_account_id=linked_account_id)
+            .order_by(MergeHrisSnapshot.id.desc()).first())
+
+def diff(linked_account_id: int, since: int, models: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Records added, changed or removed after snapshot `since` (0 = everything
+    currently present), up to the latest snapshot, whose id is returned for the next call.
+    """
+    latest = latest_snapshot(linked_account_id)
+    out: Dict[str, Any] = {"since": since, "snapshot_id": latest.id if latest else since}
+    for model in models or list(SNAPSHOT_MODELS):
+        out[model] = {"added": [], "changed": [], "removed": []}
+    rows = MergeHrisRecordHash.query.filter(
+        MergeHrisRecordHash.linked_account_id == linked_account_id,
+        MergeHrisRecordHash.model.in_(models or list(SNAPSHOT_MODELS)),
+        MergeHrisRecordHash.changed_snapshot_id > since,
+    ).order_by(MergeHrisRecordHash.id).all()
+    for row in rows:
+        bucket = out[row.model]
+        if row.removed_snapshot_id is not None:
+            if row.created_snapshot_id <= since:
+                bucket["removed"].append(row.object_id)
+        elif row.created_snapshot_id > since:
+            bucket["added"].append(row.data)
+        else:
+            bucket["changed"].append(row.data)
+    return out
@@ -0,0 +1,261 @@
+# services/merge_mirror.py
+import os
+import base64
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+from models import db, MergeLinkedAccount, MergeCommonModel, MergeSyncCursor
+from services.merge_client import iter_pages, PAGE_SIZE
+from services.background import register_worker
+from services import merge_hris_reports
+
+log = logging.getLogger(__name__)
+
+MIRRORED_MODELS = {
+    "crm": ["accounts", "contacts", "leads", "opportunities", "tasks", "notes", "engagements", "users"],
+    "hris": ["employees", "timesheet-entries", "time-off"],
+}
+MERGE_MIRROR_INTERVAL = int(os.getenv("MERGE_MIRROR_INTERVAL", "900"))  # seconds between modified_after polls
+MERGE_MIRROR_BATCH = int(os.getenv("MERGE_MIRROR_BATCH", "5"))          # cursors synced per worker pass
+
+# Query params the mirror can answer; anything else (expand, filters, ...) goes live
+LOCAL_PARAMS = {"page_size", "cursor", "modified_after", "modified_before", "live"}
+
+def _parse_ts(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return dt.replace(tzinfo=None) - (dt.utcoffset() or timedelta(0))
+
+# -------- sync (Merge -> mirror) --------
+
+def _categories(la: MergeLinkedAccount) -> List[str]:
+    """
+    Mirrored categories the linked account belongs to, as Link (raw.category or
+    raw.integration.categories) or a webhook told us; none while that is unknown,
+    so no account is polled for models of a category it doesn't have.
+    """
+    raw = la.raw or {}
+    found = [raw.get("category"),
+             ((raw.get("last_webhook") or {}).get("linked_account") or {}).get("category"),
+             *((raw.get("integration") or {}).get("categories") or [])]
+    return list(dict.fromkeys(c.lower() for c in found if isinstance(c, str) and c.lower() in MIRRORED_MODELS))
+
+def _ensure_cursors() -> None:
+    """Create a cursor for every (active linked account, mirrored model) pair."""
+    existing = {(c.linked_account_id, c.category, c.model) for c in MergeSyncCursor.query.all()}
+    for la in MergeLinkedAccount.query.filter_by(status="active").all():
+        for category in _categories(la):
+            for model in MIRRORED_MODELS[category]:
+                if (la.id, category, model) not in existing:
+                    db.session.add(MergeSyncCursor(linked_account_id=la.id, category=category, model=model))
+    db.session.commit()
+
+def _upsert(linked_account_id: int, category: str, model: str, records: List[Dict[str, Any]]) -> None:
+    ids = [r["id"] for r in records if r.get("id")]
+    if not ids:
+        return
+    existing = {row.object_id: row for row in MergeCommonModel.query.filter(
+        MergeCommonModel.linked_account_id == linked_account_id,
+        MergeCommonModel.category == category,
+        MergeCommonModel.model == model,
+        MergeCommonModel.object_id.in_(ids),
+    ).all()}
+    for rec in records:
+        if not rec.get("id"):
+            continue
+        row = existing.get(rec["id"])
+        if rec.get("remote_was_deleted"):
+            if row:
+                db.session.delete(row)
+            continue
+        if not row:
+            row = MergeCommonModel(linked_account_id=linked_account_id, category=category,
+                                   model=model, object_id=rec["id"])
+            db.session.add(row)
+        row.data = rec
+        row.remote_modified_at = _parse_ts(rec.get("modified_at"))
+        row.synced_at = datetime.utcnow()
+    if category == "hris":
+        merge_hris_reports.project(linked_account_id, model, records)
+
+def sync_cursor(cursor: MergeSyncCursor, account_token: str) -> int:
+    """
+    Pull everything modified since the cursor, page by page, and advance it.
+    Incremental pulls include deleted records so they can be dropped from the mirror.
+    """
+    params = {"modified_after": cursor.modified_after, "include_deleted_data": "true"} if cursor.modified_after else {}
+    newest = cursor.modified_after
+    count = 0
+    for results in iter_pages(cursor.category, f"/{cursor.model}", params, account_token=account_token):
+        _upsert(cursor.linked_account_id, cursor.category, cursor.model, results)
+        for rec in results:
+            modified = rec.get("modified_at")
+            if modified and (not newest or _parse_ts(modified) > _parse_ts(newest)):
+                newest = modified
+        db.session.commit()
+        count += len(results)
+    cursor.modified_after = newest
+    return count
+
+def sync_due() -> bool:
+    """Worker: sync the cursors whose next_sync_at has passed."""
+    _ensure_cursors()
+    now = datetime.utcnow()
+    due = (MergeSyncCursor.query
+           .filter(MergeSyncCursor.next_sync_at <= now)
+           .order_by(MergeSyncCursor.next_sync_at)
+           .limit(MERGE_MIRROR_BATCH)
+           .with_for_update(skip_locked=True)
+           .all())
+    if not due:
+        return False
+    for cursor in due:
+        # Claim it for this pass so other processes skip it
+        cursor.next_sync_at = now + timedelta(seconds=MERGE_MIRROR_INTERVAL)
+    db.session.commit()
+
+    for cursor in due:
+        la = MergeLinkedAccount.query.get(cursor.linked_account_id)
+        if not la or la.status != "active" or cursor.category not in _categories(la):
+            continue  # includes cursors created back when unknown accounts got every category
+        try:
+            count = sync_cursor(cursor, la.account_token)
+            cursor.last_synced_at, cursor.error = now, None
+            log.info("Merge mirror synced %d %s/%s for linked account %s", count, cursor.category, cursor.model, la.id)
+        except Exception as e:
+            db.session.rollback()
+            cursor = MergeSyncCursor.query.get(cursor.id)
+            cursor.error = str(e)[:2000]
+            log.warning("Merge mirror sync %s/%s for linked account %s failed: %s", cursor.category, cursor.model, la.id, e)
+        db.session.commit()
+    return True
+
+def request_refresh(linked_account_id: int, models: Optional[Iterable[str]] = None) -> None:
+    """Pull the given models (all by default) on the next worker pass, e.g. after a *.synced webhook."""
+    q = MergeSyncCursor.query.filter_by(linked_account_id=linked_account_id)
+    if models:
+        q = q.filter(MergeSyncCursor.model.in_(list(models)))
+    q.update({MergeSyncCursor.next_sync_at: datetime.utcnow()}, synchronize_session=False)
+
+def record_write(category: str, model: str, account_token: Optional[str], record: Any) -> None:
+    """
+    Put a record Merge returned from a create/update into the mirror, so a read
+    right after the write sees it; without one, refresh the model on the next pass.
+    """
+    la = _linked_account_for(account_token)
+    if not la:
+        return
+    if isinstance(record, dict) and record.get("id"):
+        _upsert(la.id, category, model, [record])
+    else:
+        request_refresh(la.id, [model])
+    db.session.commit()
+
+# Webhook model names that don't pluralise into our path names
+_EVENT_MODELS = {"timesheetentry": "timesheet-entries", "timeoff": "time-off"}
+
+def models_for_event(event_type: str) -> Optional[List[str]]:
+    """
+    Map a Merge webhook event to mirrored models:
+      "contact.synced" / "crm.contact.synced" -> ["contacts"]
+      "hris.TimesheetEntry.synced"            -> ["timesheet-entries"]
+      "linkedaccount.synced" / anything else   -> None (refresh everything)
+    """
+    name = event_type.lower().rsplit(".synced", 1)[0].split(".")[-1].replace("_", "")
+    plural = _EVENT_MODELS.get(name) or (name[:-1] + "ies" if name.endswith("y") else name + "s")
+    mirrored = {m for models in MIRRORED_MODELS.values() for m in models}
+    return [plural] if plural in mirrored else None
+
+# -------- reads (mirror -> API) --------
+
+def _linked_account_for(account_token: Optional[str]) -> Optional[MergeLinkedAccount]:
+    if not account_token:
+        return None
+    return MergeLinkedAccount.query.filter_by(account_token=account_token, status="active").first()
+
+def _synced_at(linked_account_id: int, category: str, model: str) -> Optional[datetime]:
+    cursor = MergeSyncCursor.query.filter_by(linked_account_id=linked_account_id, category=category, model=model).first()
+    return cursor.last_synced_at if cursor else None
+
+_CURSOR_PREFIX = "mirror:"
+
+def _encode_cursor(row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{_CURSOR_PREFIX}{row_id}".encode()).decode()
+
+def _decode_cursor(cursor: str) -> Optional[int]:
+    """Row id from one of our cursors; None for anything else (e.g. a cursor Merge handed out)."""
+    try:
+        value = base64.urlsafe_b64decode(cursor.encode()).decode()
+    except (ValueError, UnicodeError):
+        return None
+    if not value.startswith(_CURSOR_PREFIX) or not value[len(_CURSOR_PREFIX):].isdigit():
+        return None
+    return int(value[len(_CURSOR_PREFIX):])
+
+def serve_list(category: str, model: str, account_token: Optional[str], args) -> Optional[Dict[str, Any]]:
+    """
+    Answer a list request from the mirror in Merge's paged shape, or None when the
+    mirror can't (unknown account, model never synced, unsupported query params,
+    a page_size or cursor it didn't issue) and Merge should answer instead.
+    """
+    if set(args.keys()) - LOCAL_PARAMS:
+        return None
+    page_size = str(args.get("page_size") or PAGE_SIZE)
+    after_id = _decode_cursor(args["cursor"]) if args.get("cursor") else 0
+    if not page_size.isdigit() or int(page_size) < 1 or after_id is None:
+        return None
+    la = _linked_account_for(account_token)
+    synced_at = _synced_at(la.id, category, model) if la else None
+    if not synced_at:
+        return None
+
+    page_size = min(int(page_size), PAGE_SIZE)
+    q = MergeCommonModel.query.filter_by(linked_account_id=la.id, category=category, model=model)
+    if args.get("modified_after"):
+        q = q.filter(MergeCommonModel.remote_modified_at > _parse_ts(args["modified_after"]))
+    if args.get("modified_before"):
+        q = q.filter(MergeCommonModel.remote_modified_at < _parse_ts(args["modified_before"]))
+    if after_id:
+        q = q.filter(MergeCommonModel.id > after_id)
+    rows = q.order_by(MergeCommonModel.id).limit(page_size + 1).all()
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    return {
+        "next": _encode_cursor(rows[-1].id) if has_more else None,
+        "previous": None,
+        "results": [r.data for r in rows],
+        "source": "mirror",
+        "synced_at": synced_at.isoformat(),
+    }
+
+def serve_detail(category: str, model: str, account_token: Optional[str], object_id: str, args) -> Optional[Dict[str, Any]]:
+    """Single record from the mirror, or None to fall back to Merge."""
+    if set(args.keys()) - {"live"}:
+        return None
+    la = _linked_account_for(account_token)
+    if not la:
+        return None
+    row = MergeCommonModel.query.filter_by(linked_account_id=la.id, category=category,
+                                           model=model, object_id=object_id).first()
+    return row.data if row else None
+
+def get_many(category: str, model: str, account_token: Optional[str], object_ids: Iterable[str]) -> Dict[str, Any]:
+    """object_id -> record for whichever of the ids the mirror holds (one query)."""
+    ids = list(object_ids)
+    la = _linked_account_for(account_token)
+    if not la or not ids:
+        return {}
+    rows = MergeCommonModel.query.filter(
+        MergeCommonModel.linked_account_id == la.id,
+        MergeCommonModel.category == category,
+        MergeCommonModel.model == model,
+        MergeCommonModel.object_id.in_(ids),
+    ).all()
+    return {r.object_id: r.data for r in rows}
+
+register_worker("merge-mirror", sync_due, interval=5.0)
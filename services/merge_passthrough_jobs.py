@@ -0,0 +1,122 @@
+# services/merge_passthrough_jobs.py
+import os
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import requests
+from models import db, MergePassthroughJob
+from services.merge_service import MergeServiceError, hris_async_passthrough_result
+from services.background import register_worker
+from services import callbacks
+
+log = logging.getLogger(__name__)
+
+MERGE_PASSTHROUGH_POLL_BASE = float(os.getenv("MERGE_PASSTHROUGH_POLL_BASE", "2"))    # first poll delay, seconds
+MERGE_PASSTHROUGH_POLL_MAX = float(os.getenv("MERGE_PASSTHROUGH_POLL_MAX", "60"))     # backoff ceiling, seconds
+MERGE_PASSTHROUGH_TIMEOUT = int(os.getenv("MERGE_PASSTHROUGH_TIMEOUT", "3600"))       # give up after, seconds
+MERGE_PASSTHROUGH_NOT_FOUND_GRACE = int(os.getenv("MERGE_PASSTHROUGH_NOT_FOUND_GRACE", "60"))  # seconds a new receipt may 404
+MERGE_PASSTHROUGH_BATCH = int(os.getenv("MERGE_PASSTHROUGH_BATCH", "50"))
+MERGE_PASSTHROUGH_LEASE = 120  # seconds a claimed job is hidden from other pollers
+
+def _delay(polls: int) -> timedelta:
+    return timedelta(seconds=min(MERGE_PASSTHROUGH_POLL_BASE * 2 ** polls, MERGE_PASSTHROUGH_POLL_MAX))
+
+def create_job(client_id: int, account_token: str, receipt: Dict[str, Any], request_body: Dict[str, Any],
+               callback_url: Optional[str] = None) -> MergePassthroughJob:
+    """Store an async-passthrough receipt; the worker polls Merge until the result is ready."""
+    receipt_id = receipt.get("async_passthrough_receipt_id") or receipt.get("id")
+    if not receipt_id:
+        raise MergeServiceError(f"Merge async-passthrough returned no receipt id: {receipt}")
+    job = MergePassthroughJob(
+        client_id=client_id,
+        account_token=account_token,
+        category="hris",
+        receipt_id=str(receipt_id),
+        request=request_body,
+        callback_url=callback_url,
+        next_poll_at=datetime.utcnow() + _delay(0),
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+def to_dict(job: MergePassthroughJob) -> Dict[str, Any]:
+    return {
+        "id": job.id,
+        "status": job.status,
+        "receipt_id": job.receipt_id,
+        "request": job.request,
+        "result": job.result,
+        "error": job.error,
+        "polls": job.polls,
+        "callback_url": job.callback_url,
+        "callback_status": job.callback_status,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "completed_at": job.completed_at.isoformat() if job.completed_at else None,
+    }
+
+def _claim_batch() -> List[MergePassthroughJob]:
+    now = datetime.utcnow()
+    jobs = (MergePassthroughJob.query
+            .filter(MergePassthroughJob.status == "pending", MergePassthroughJob.next_poll_at <= now)
+            .order_by(MergePassthroughJob.next_poll_at)
+            .limit(MERGE_PASSTHROUGH_BATCH)
+            .with_for_update(skip_locked=True)
+            .all())
+    for job in jobs:
+        job.next_poll_at = now + timedelta(seconds=MERGE_PASSTHROUGH_LEASE)
+    db.session.commit()
+    return jobs
+
+def _notify(job: MergePassthroughJob) -> None:
+    if job.callback_url:
+        job.callback_status = callbacks.post(job.callback_url, to_dict(job))
+
+def _receipt_pending(job: MergePassthroughJob, now: datetime) -> bool:
+    """
+    Whether a 404 may still mean "not registered yet": only within the grace
+    period of a fresh receipt that Merge has never answered for. A job's error
+    is cleared by every answered poll, so polls > 1 with no error means it was.
+    """
+    answered_before = job.polls > 1 and job.error is None
+    young = job.created_at and now - job.created_at <= timedelta(seconds=MERGE_PASSTHROUGH_NOT_FOUND_GRACE)
+    return bool(young) and not answered_before
+
+def _poll(job: MergePassthroughJob, now: datetime) -> None:
+    job.polls = (job.polls or 0) + 1
+    result, error = None, None
+    try:
+        result = hris_async_passthrough_result(job.account_token, job.receipt_id)
+    except MergeServiceError as e:
+        rejected = e.status and 400 <= e.status < 500 and e.status != 429
+        if rejected and not (e.status == 404 and _receipt_pending(job, now)):
+            job.status, job.error, job.completed_at = "failed", str(e), now
+            _notify(job)
+            return
+        error = str(e)  # 5xx, 429, rate-limit governor or a receipt not registered yet: keep polling
+    except requests.RequestException as e:
+        error = f"Merge unreachable: {e}"
+    if result is not None:
+        job.status, job.result, job.error, job.completed_at = "done", result, None, now
+        _notify(job)
+    elif job.created_at and now - job.created_at > timedelta(seconds=MERGE_PASSTHROUGH_TIMEOUT):
+        job.status, job.error, job.completed_at = "failed", error or "timed out waiting for Merge", now
+        _notify(job)
+    else:
+        job.error = error
+        job.next_poll_at = now + _delay(job.polls)
+
+def poll_pending() -> bool:
+    """Worker: poll Merge for every job whose next_poll_at has passed."""
+    jobs = _claim_batch()
+    if not jobs:
+        return False
+    now = datetime.utcnow()
+    for job in jobs:
+        _poll(job, now)
+    db.session.commit()
+    done = sum(1 for j in jobs if j.status != "pending")
+    log.info("Polled %d Merge async-passthrough jobs (%d finished)", len(jobs), done)
+    return True
+
+register_worker("merge-passthrough-jobs", poll_pending, interval=MERGE_PASSTHROUGH_POLL_BASE)
@@ -0,0 +1,156 @@
+# services/merge_ratelimit.py
+import os
+import math
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+from services.background import in_background
+
+log = logging.getLogger(__name__)
+
+# Share of each budget kept for interactive requests; background sync stops short of it
+MERGE_RATE_INTERACTIVE_RESERVE = float(os.getenv("MERGE_RATE_INTERACTIVE_RESERVE", "0.2"))
+MERGE_RATE_MAX_WAIT = float(os.getenv("MERGE_RATE_MAX_WAIT", "30"))                        # interactive, seconds
+MERGE_RATE_MAX_WAIT_BACKGROUND = float(os.getenv("MERGE_RATE_MAX_WAIT_BACKGROUND", "900"))  # background, seconds
+DEFAULT_RETRY_AFTER = 60.0  # when a 429 carries no reset hint
+
+KEY = ("key", None)  # the organisation-wide API key budget
+
+
+def account_label(account_token: str) -> str:
+    """Stable, non-reversible name for a linked account in metrics and tenant keys."""
+    return "account:" + hashlib.sha256(account_token.encode("utf-8")).hexdigest()[:12]
+
+
+class MergeRateLimited(RuntimeError):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Merge rate limit reached, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class _Budget:
+    __slots__ = ("limit", "remaining", "reset_at")
+
+    def __init__(self):
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0  # time.monotonic()
+
+    def wait(self, now: float, background: bool) -> float:
+        """Seconds until one more request fits in this budget (0 = go)."""
+        if self.remaining is None or now >= self.reset_at:
+            return 0.0
+        floor = math.ceil((self.limit or 0) * MERGE_RATE_INTERACTIVE_RESERVE) if background else 0
+        return 0.0 if self.remaining > floor else self.reset_at - now
+
+
+def _reset_in(value: str) -> Optional[float]:
+    """X-RateLimit-Reset / Retry-After as seconds from now (accepts delta seconds or an epoch timestamp)."""
+    try:
+        v = float(value)
+    except (TypeError, ValueError):
+        return None
+    return max(v - time.time(), 0.0) if v > 1e9 else v
+
+
+class Governor:
+    """
+    Tracks Merge's rate-limit headers per API key and per linked account and
+    holds requests back before a budget runs out. Background traffic stops at
+    the interactive reserve and yields to any interactive request that is waiting.
+    """
+
+    def __init__(self):
+        self._budgets: Dict[Tuple[str, Optional[str]], _Budget] = {}
+        self._cond = threading.Condition()
+        self._interactive_waiting = 0
+
+    def _scopes(self, account_token: Optional[str]):
+        return [KEY, ("account", account_token)] if account_token else [KEY]
+
+    def acquire(self, account_token: Optional[str] = None, background: Optional[bool] = None) -> None:
+        background = in_background() if background is None else background
+        max_wait = MERGE_RATE_MAX_WAIT_BACKGROUND if background else MERGE_RATE_MAX_WAIT
+        deadline = time.monotonic() + max_wait
+        with self._cond:
+            if not background:
+                self._interactive_waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    budgets = [self._budgets.setdefault(s, _Budget()) for s in self._scopes(account_token)]
+                    wait = max(b.wait(now, background) for b in budgets)
+                    if background and self._interactive_waiting and not wait:
+                        wait = 0.05  # let waiting user requests go first
+                    if not wait:
+                        for b in budgets:
+                            if b.remaining is not None and now < b.reset_at:
+                                b.remaining -= 1  # reserve; corrected by the next response headers
+                        return
+                    if now + wait > deadline:
+                        raise MergeRateLimited(wait)
+                    self._cond.wait(min(wait, deadline - now))
+            finally:
+                if not background:
+                    self._interactive_waiting -= 1
+                    self._cond.notify_all()
+
+    def observe(self, account_token: Optional[str], status_code: int, headers) -> None:
+        """
+        Update a budget from a Merge response (X-RateLimit-* headers, 429 +
+        Retry-After): the linked account's for account requests, the API key's
+        for key-level calls, so one account's 429 never holds back the others.
+        """
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset_in = _reset_in(headers.get("Retry-After") or headers.get("X-RateLimit-Reset"))
+        if remaining is None and status_code != 429:
+            return
+        try:
+            limit = int(headers.get("X-RateLimit-Limit") or 0) or None
+            remaining = 0 if status_code == 429 else int(remaining)
+        except ValueError:
+            return
+        now = time.monotonic()
+        reset_at = now + reset_in if reset_in is not None else now + DEFAULT_RETRY_AFTER if status_code == 429 else None
+        with self._cond:
+            b = self._budgets.setdefault(("account", account_token) if account_token else KEY, _Budget())
+            b.limit = limit or b.limit
+            b.remaining = remaining
+            if reset_at is not None:
+                b.reset_at = reset_at
+            self._cond.notify_all()
+        if status_code == 429:
+            log.warning("Merge 429 for %s; holding requests for %.0fs",
+                        account_label(account_token) if account_token else "key", (reset_at or now) - now)
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        now = time.monotonic()
+        with self._cond:
+            return {
+                ("key" if scope == KEY else account_label(scope[1] or "")): {
+                    "limit": b.limit,
+                    "remaining": b.remaining,
+                    "reset_in": round(max(b.reset_at - now, 0.0), 1),
+                }
+                for scope, b in self._budgets.items() if b.remaining is not None
+            }
+
+
+governor = Governor()
+
+
+def send(session_request, method: str, url: str, account_token: Optional[str] = None, **kwargs):
+    """
+    Issue one Merge HTTP request through the governor: wait for budget, send,
+    record the rate-limit headers, and retry once after a 429 once the budget resets.
+    """
+    for attempt in range(2):
+        governor.acquire(account_token)
+        resp = session_request(method, url, **kwargs)
+        governor.observe(account_token, resp.status_code, resp.headers)
+        if resp.status_code != 429 or attempt:
+            return resp
+        resp.close()
+    return resp
@@ -0,0 +1,62 @@
+# services/merge_resolver.py
+from typing import Any, Dict, Iterable, List, Set
+from flask import g
+from services.merge_client import call, current_account_token, PAGE_SIZE
+from services import merge_mirror
+
+# Relation field on a CRM record -> common model it points at
+RELATIONS = {
+    "account": "accounts",
+    "owner": "users",
+    "contact": "contacts",
+    "opportunity": "opportunities",
+    "converted_account": "accounts",
+    "converted_contact": "contacts",
+}
+
+def parse_resolve(value: str) -> List[str]:
+    """'account,owner' -> ['account', 'owner'] (unknown relations are ignored)."""
+    return [f.strip() for f in (value or "").split(",") if f.strip() in RELATIONS]
+
+def _cache(model: str) -> Dict[str, Any]:
+    """Per-request cache, so repeated ids across pages/relations are fetched once."""
+    if "merge_resolved" not in g:
+        g.merge_resolved = {}
+    return g.merge_resolved.setdefault((current_account_token(), model), {})
+
+def load_many(category: str, model: str, ids: Iterable[str]) -> Dict[str, Any]:
+    """
+    Batch-load records by id: per-request cache first, then the local mirror,
+    then one Merge list call per 100 missing ids (`ids=` filter).
+    """
+    cache = _cache(model)
+    missing = [i for i in dict.fromkeys(ids) if i not in cache]
+    if missing:
+        cache.update(merge_mirror.get_many(category, model, current_account_token(), missing))
+        missing = [i for i in missing if i not in cache]
+    for start in range(0, len(missing), PAGE_SIZE):
+        chunk = missing[start:start + PAGE_SIZE]
+        page = call(category, "GET", f"/{model}", params={"ids": ",".join(chunk), "page_size": PAGE_SIZE})
+        for rec in page.get("results") or []:
+            cache[rec.get("id")] = rec
+    return cache
+
+def resolve(category: str, records: List[Dict[str, Any]], fields: List[str]) -> List[Dict[str, Any]]:
+    """
+    Replace relation ids on `records` with the related objects in place, the way
+    Merge's `expand` would, with one batched load per related model.
+    """
+    wanted: Dict[str, Set[str]] = {}
+    for field in fields:
+        model = RELATIONS[field]
+        wanted.setdefault(model, set()).update(
+            r[field] for r in records if isinstance(r.get(field), str)
+        )
+    loaded = {model: load_many(category, model, ids) for model, ids in wanted.items() if ids}
+    for field in fields:
+        objects = loaded.get(RELATIONS[field], {})
+        for r in records:
+            value = r.get(field)
+            if isinstance(value, str) and value in objects:
+                r[field] = objects[value]
+    return records
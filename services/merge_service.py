@@ -6,6 +6,7 @@ import hashlib
 import base64
 from typing import Optional, Dict, Any
 import requests
+from services import merge_ratelimit, bulkhead
 
 MERGE_API_KEY = os.getenv("MERGE_API_KEY")
 MERGE_BASE_URL = os.getenv("MERGE_BASE_URL", "https://api.merge.dev")
@@ -13,6 +14,7 @@ MERGE_WEBHOOK_SECRET = os.getenv("MERGE_WEBHOOK_SECRET")
 
 # CRM base (US)
 MERGE_CRM_BASE = f"{MERGE_BASE_URL}/api/crm/v1"
+MERGE_HRIS_BASE = f"{MERGE_BASE_URL}/api/hris/v1"
 # Link token endpoint is category-specific (CRM) per docs
 MERGE_LINK_TOKEN_URL = f"{MERGE_BASE_URL}/api/crm/v1/link-token"
 
@@ -20,7 +22,19 @@ DEFAULT_TIMEOUT = (5, 30)  # (connect, read)
 log = logging.getLogger(__name__)
 
 class MergeServiceError(RuntimeError):
-    pass
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status  # Merge's HTTP status, when the error is an HTTP answer
+
+def _send(method: str, url: str, **kwargs) -> requests.Response:
+    """All Merge HTTP goes through the rate-limit governor (budget tracked per key and linked account)."""
+    account_token = (kwargs.get("headers") or {}).get("X-Account-Token")
+    try:
+        session_request = bulkhead.limited("merge", requests.request,
+                                           tenant=merge_ratelimit.account_label(account_token) if account_token else None)
+        return merge_ratelimit.send(session_request, method, url, account_token=account_token, **kwargs)
+    except merge_ratelimit.MergeRateLimited as e:
+        raise MergeServiceError(str(e)) from e
 
 def verify_webhook_signature(raw_body: bytes, signature_header: str) -> bool:
     """
@@ -71,7 +85,7 @@ def create_link_token(end_user_email: str,
         payload["integration"] = integration_slug
 
     try:
-        resp = requests.post(MERGE_LINK_TOKEN_URL, json=payload, headers=_headers(), timeout=DEFAULT_TIMEOUT)
+        resp = _send("POST", MERGE_LINK_TOKEN_URL, json=payload, headers=_headers(), timeout=DEFAULT_TIMEOUT)
         if resp.status_code >= 400:
             raise MergeServiceError(f"Merge create_link_token failed: {resp.status_code} {resp.text}")
         return resp.json()
@@ -84,7 +98,7 @@ def list_contacts(account_token: str, params: Optional[Dict[str, Any]] = None) -
     """
     url = f"{MERGE_CRM_BASE}/contacts"
     try:
-        resp = requests.get(url, headers=_headers(account_token), params=params or {}, timeout=DEFAULT_TIMEOUT)
+        resp = _send("GET", url, headers=_headers(account_token), params=params or {}, timeout=DEFAULT_TIMEOUT)
         if resp.status_code >= 400:
             raise MergeServiceError(f"Merge list_contacts failed: {resp.status_code} {resp.text}")
         return resp.json()
@@ -98,7 +112,7 @@ def create_contact(account_token: str, contact_body: Dict[str, Any]) -> Dict[str
     """
     url = f"{MERGE_CRM_BASE}/contacts"
     try:
-        resp = requests.post(url, headers=_headers(account_token), json=contact_body, timeout=DEFAULT_TIMEOUT)
+        resp = _send("POST", url, headers=_headers(account_token), json=contact_body, timeout=DEFAULT_TIMEOUT)
         if resp.status_code >= 400:
             raise MergeServiceError(f"Merge create_contact failed: {resp.status_code} {resp.text}")
         return resp.json()
@@ -111,7 +125,7 @@ def list_linked_accounts(category: str = "crm") -> Dict[str, Any]:
     """
     url = f"{MERGE_BASE_URL}/api/{category}/v1/linked-accounts"
     try:
-        resp = requests.get(url, headers=_headers(), timeout=DEFAULT_TIMEOUT)
+        resp = _send("GET", url, headers=_headers(), timeout=DEFAULT_TIMEOUT)
         if resp.status_code >= 400:
             raise MergeServiceError(f"Merge list_linked_accounts failed: {resp.status_code} {resp.text}")
         return resp.json()
@@ -121,35 +135,35 @@ def list_linked_accounts(category: str = "crm") -> Dict[str, Any]:
 # ---------- HRIS READS ----------
 def hris_list_employees(account_token: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     url = f"{MERGE_HRIS_BASE}/employees"
-    resp = requests.get(url, headers=_headers(account_token), params=params or {}, timeout=DEFAULT_TIMEOUT)
+    resp = _send("GET", url, headers=_headers(account_token), params=params or {}, timeout=DEFAULT_TIMEOUT)
     if resp.status_code >= 400:
         raise MergeServiceError(f"Merge hris_list_employees failed: {resp.status_code} {resp.text}")
     return resp.json()
 
 def hris_get_employee(account_token: str, employee_id: str) -> Dict[str, Any]:
     url = f"{MERGE_HRIS_BASE}/employees/{employee_id}"
-    resp = requests.get(url, headers=_headers(account_token), timeout=DEFAULT_TIMEOUT)
+    resp = _send("GET", url, headers=_headers(account_token), timeout=DEFAULT_TIMEOUT)
     if resp.status_code >= 400:
         raise MergeServiceError(f"Merge hris_get_employee failed: {resp.status_code} {resp.text}")
     return resp.json()
 
 def hris_list_employments(account_token: str, params: Optional[Dict[str, Any]]=None) -> Dict[str, Any]:
     url = f"{MERGE_HRIS_BASE}/employments"
-    resp = requests.get(url, headers=_headers(account_token), params=params or {}, timeout=DEFAULT_TIMEOUT)
+    resp = _send("GET", url, headers=_headers(account_token), params=params or {}, timeout=DEFAULT_TIMEOUT)
     if resp.status_code >= 400:
         raise MergeServiceError(f"Merge hris_list_employments failed: {resp.status_code} {resp.text}")
     return resp.json()
 
 def hris_list_locations(account_token: str, params: Optional[Dict[str, Any]]=None) -> Dict[str, Any]:
     url = f"{MERGE_HRIS_BASE}/locations"
-    resp = requests.get(url, headers=_headers(account_token), params=params or {}, timeout=DEFAULT_TIMEOUT)
+    resp = _send("GET", url, headers=_headers(account_token), params=params or {}, timeout=DEFAULT_TIMEOUT)
     if resp.status_code >= 400:
         raise MergeServiceError(f"Merge hris_list_locations failed: {resp.status_code} {resp.text}")
     return resp.json()
 
 def hris_list_groups(account_token: str, params: Optional[Dict[str, Any]]=None) -> Dict[str, Any]:
     url = f"{MERGE_HRIS_BASE}/groups"
-    resp = requests.get(url, headers=_headers(account_token), params=params or {}, timeout=DEFAULT_TIMEOUT)
+    resp = _send("GET", url, headers=_headers(account_token), params=params or {}, timeout=DEFAULT_TIMEOUT)
     if resp.status_code >= 400:
         raise MergeServiceError(f"Merge hris_list_groups failed: {resp.status_code} {resp.text}")
     return resp.json()
@@ -159,21 +173,21 @@ def hris_create_time_off(account_token: str, model: Dict[str, Any], qs: Optional
     # POST /time-off
     url = f"{MERGE_HRIS_BASE}/time-off"
     params = qs or {}
-    resp = requests.post(url, headers=_headers(account_token), json={"model": model}, params=params, timeout=DEFAULT_TIMEOUT)
+    resp = _send("POST", url, headers=_headers(account_token), json={"model": model}, params=params, timeout=DEFAULT_TIMEOUT)
     if resp.status_code >= 400:
         raise MergeServiceError(f"Merge hris_create_time_off failed: {resp.status_code} {resp.text}")
     return resp.json()
 
 def hris_list_time_off(account_token: str, params: Optional[Dict[str, Any]]=None) -> Dict[str, Any]:
     url = f"{MERGE_HRIS_BASE}/time-off"
-    resp = requests.get(url, headers=_headers(account_token), params=params or {}, timeout=DEFAULT_TIMEOUT)
+    resp = _send("GET", url, headers=_headers(account_token), params=params or {}, timeout=DEFAULT_TIMEOUT)
     if resp.status_code >= 400:
         raise MergeServiceError(f"Merge hris_list_time_off failed: {resp.status_code} {resp.text}")
     return resp.json()
 
 def hris_get_time_off(account_token: str, id_: str) -> Dict[str, Any]:
     url = f"{MERGE_HRIS_BASE}/time-off/{id_}"
-    resp = requests.get(url, headers=_headers(account_token), timeout=DEFAULT_TIMEOUT)
+    resp = _send("GET", url, headers=_headers(account_token), timeout=DEFAULT_TIMEOUT)
     if resp.status_code >= 400:
         raise MergeServiceError(f"Merge hris_get_time_off failed: {resp.status_code} {resp.text}")
     return resp.json()
@@ -182,21 +196,21 @@ def hris_create_timesheet_entry(account_token: str, model: Dict[str, Any], qs: O
     # POST /timesheet-entries
     url = f"{MERGE_HRIS_BASE}/timesheet-entries"
     params = qs or {}
-    resp = requests.post(url, headers=_headers(account_token), json={"model": model}, params=params, timeout=DEFAULT_TIMEOUT)
+    resp = _send("POST", url, headers=_headers(account_token), json={"model": model}, params=params, timeout=DEFAULT_TIMEOUT)
     if resp.status_code >= 400:
         raise MergeServiceError(f"Merge hris_create_timesheet_entry failed: {resp.status_code} {resp.text}")
     return resp.json()
 
 def hris_list_timesheet_entries(account_token: str, params: Optional[Dict[str, Any]]=None) -> Dict[str, Any]:
     url = f"{MERGE_HRIS_BASE}/timesheet-entries"
-    resp = requests.get(url, headers=_headers(account_token), params=params or {}, timeout=DEFAULT_TIMEOUT)
+    resp = _send("GET", url, headers=_headers(account_token), params=params or {}, timeout=DEFAULT_TIMEOUT)
     if resp.status_code >= 400:
         raise MergeServiceError(f"Merge hris_list_timesheet_entries failed: {resp.status_code} {resp.text}")
     return resp.json()
 
 def hris_get_timesheet_entry(account_token: str, id_: str) -> Dict[str, Any]:
     url = f"{MERGE_HRIS_BASE}/timesheet-entries/{id_}"
-    resp = requests.get(url, headers=_headers(account_token), timeout=DEFAULT_TIMEOUT)
+    resp = _send("GET", url, headers=_headers(account_token), timeout=DEFAULT_TIMEOUT)
     if resp.status_code >= 400:
         raise MergeServiceError(f"Merge hris_get_timesheet_entry failed: {resp.status_code} {resp.text}")
     return resp.json()
@@ -223,16 +237,35 @@ def hris_passthrough(account_token: str, method: str, path: str, data: Optional[
     if base_url_override:
         body["base_url_override"] = base_url_override
 
-    resp = requests.post(url, headers=_headers(account_token), json=body, timeout=DEFAULT_TIMEOUT)
+    resp = _send("POST", url, headers=_headers(account_token), json=body, timeout=DEFAULT_TIMEOUT)
     if resp.status_code >= 400:
         raise MergeServiceError(f"Merge hris_passthrough failed: {resp.status_code} {resp.text}")
     return resp.json()
 
+def hris_async_passthrough_result(account_token: str, receipt_id: str) -> Optional[Dict[str, Any]]:
+    """
+    GET /async-passthrough/{receipt_id}. Returns the vendor RemoteResponse once
+    Merge has it, or None while the request is still running; an unknown
+    receipt raises MergeServiceError with status 404.
+    """
+    url = f"{MERGE_HRIS_BASE}/async-passthrough/{receipt_id}"
+    resp = _send("GET", url, headers=_headers(account_token), timeout=DEFAULT_TIMEOUT)
+    if resp.status_code == 202:
+        return None
+    if resp.status_code >= 400:
+        raise MergeServiceError(f"Merge hris_async_passthrough_result failed: {resp.status_code} {resp.text}",
+                                status=resp.status_code)
+    data = resp.json()
+    status = str(data.get("status") or "").upper() if isinstance(data, dict) else ""
+    if status in ("PENDING", "IN_PROGRESS", "QUEUED", "ASYNC_PASSTHROUGH_PENDING"):
+        return None
+    return data
+
 # --- CRM Meta & Validation helpers ---
 def crm_meta_post(model: str, account_token: str) -> Dict[str, Any]:
     """GET /{model}/meta/post"""
     url = f"{MERGE_CRM_BASE}/{model}/meta/post"
-    r = requests.get(url, headers=_headers(account_token), timeout=DEFAULT_TIMEOUT)
+    r = _send("GET", url, headers=_headers(account_token), timeout=DEFAULT_TIMEOUT)
     if r.status_code >= 400:
         raise MergeServiceError(f"meta/post failed: {r.status_code} {r.text}")
     return r.json()
@@ -240,7 +273,7 @@ def crm_meta_post(model: str, account_token: str) -> Dict[str, Any]:
 def crm_meta_patch(model: str, object_id: str, account_token: str) -> Dict[str, Any]:
     """GET /{model}/meta/patch/{id}"""
     url = f"{MERGE_CRM_BASE}/{model}/meta/patch/{object_id}"
-    r = requests.get(url, headers=_headers(account_token), timeout=DEFAULT_TIMEOUT)
+    r = _send("GET", url, headers=_headers(account_token), timeout=DEFAULT_TIMEOUT)
     if r.status_code >= 400:
         raise MergeServiceError(f"meta/patch failed: {r.status_code} {r.text}")
     return r.json()
@@ -302,7 +335,7 @@ def trim_and_validate_payload(model: str, payload: Dict[str, Any], account_token
 def crm_linked_accounts() -> Dict[str, Any]:
     """GET /linked-accounts (CRM) — shows per-account capabilities."""
     url = f"{MERGE_BASE_URL}/api/crm/v1/linked-accounts"
-    r = requests.get(url, headers=_headers(), timeout=DEFAULT_TIMEOUT)
+    r = _send("GET", url, headers=_headers(), timeout=DEFAULT_TIMEOUT)
     if r.status_code >= 400:
         raise MergeServiceError(f"linked-accounts failed: {r.status_code} {r.text}")
     return r.json()
@@ -310,7 +343,7 @@ def crm_linked_accounts() -> Dict[str, Any]:
 def integration_metadata() -> Dict[str, Any]:
     """GET Integration Metadata — list all Merge integrations with slugs, names, logos."""
     url = f"{MERGE_BASE_URL}/api/integrations"
-    r = requests.get(url, headers=_headers(), timeout=DEFAULT_TIMEOUT)
+    r = _send("GET", url, headers=_headers(), timeout=DEFAULT_TIMEOUT)
     if r.status_code >= 400:
         raise MergeServiceError(f"integrations metadata failed: {r.status_code} {r.text}")
     return r.json() 
\ No newline at end of file
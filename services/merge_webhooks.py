@@ -0,0 +1,175 @@
+# services/merge_webhooks.py
+import os
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from models import db, MergeLinkedAccount, MergeWebhookEvent
+from services.background import register_worker
+from services import merge_client, merge_mirror
+
+log = logging.getLogger(__name__)
+
+MERGE_WEBHOOK_BATCH = int(os.getenv("MERGE_WEBHOOK_BATCH", "500"))
+MERGE_WEBHOOK_MAX_ATTEMPTS = int(os.getenv("MERGE_WEBHOOK_MAX_ATTEMPTS", "5"))
+MERGE_WEBHOOK_LEASE = 300  # seconds before a 'processing' event from a dead worker is picked up again
+
+def enqueue(raw_body: bytes) -> None:
+    """Store the verified raw body; parsing and DB upserts happen in the consumer."""
+    db.session.add(MergeWebhookEvent(body=raw_body.decode("utf-8", errors="replace")))
+    db.session.commit()
+
+def _claim_batch() -> List[MergeWebhookEvent]:
+    now = datetime.utcnow()
+    ready = db.and_(MergeWebhookEvent.status == "pending", MergeWebhookEvent.available_at <= now)
+    abandoned = db.and_(MergeWebhookEvent.status == "processing",
+                        MergeWebhookEvent.available_at <= now - timedelta(seconds=MERGE_WEBHOOK_LEASE))
+    events = (MergeWebhookEvent.query
+              .filter(db.or_(ready, abandoned))
+              .order_by(MergeWebhookEvent.id)
+              .limit(MERGE_WEBHOOK_BATCH)
+              .with_for_update(skip_locked=True)
+              .all())
+    for ev in events:
+        ev.status = "processing"
+        ev.available_at = now
+    db.session.commit()
+    return events
+
+def _parse(body: str) -> Optional[Dict[str, Any]]:
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return None
+    if not isinstance(payload, dict):
+        return None
+    hook = payload.get("hook") or {}
+    la = payload.get("linked_account") or {}
+    return {
+        "hook": hook,
+        "linked_account": la,
+        "hook_id": hook.get("id"),
+        "event_type": (hook.get("event") or hook.get("event_type") or "").lower(),
+        "account_token": la.get("account_token") or payload.get("account_token"),
+        "linked_account_id": la.get("id"),
+        "end_user_origin_id": la.get("end_user_origin_id") or la.get("end_user_id"),
+        "integration_slug": la.get("integration_slug") or la.get("integration") or None,
+    }
+
+def _dedupe(parsed: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Keep only the latest delivery per (hook id, linked account), in arrival order."""
+    latest: Dict[Tuple[Any, Any], Dict[str, Any]] = {}
+    for ev in parsed:
+        account = ev["linked_account_id"] or ev["account_token"] or ev["end_user_origin_id"]
+        key = (ev["hook_id"], account)
+        latest.pop(key, None)  # re-insert at the end, so a later delivery is applied after the ones it follows
+        latest[key] = ev
+    return list(latest.values())
+
+def _status_for(event_type: str, default: Optional[str]) -> Optional[str]:
+    # Reflect lifecycle events
+    if "deleted" in event_type:
+        return "disabled"
+    if "linked" in event_type or "synced" in event_type or "changed" in event_type:
+        return "active"
+    return default
+
+def _apply_one(ev: Dict[str, Any], by_token: Dict[str, MergeLinkedAccount],
+               by_origin: Dict[str, MergeLinkedAccount]) -> int:
+    rec = by_token.get(ev["account_token"])
+    if rec:
+        rec.status = _status_for(ev["event_type"], rec.status)
+        if ev["integration_slug"] and not rec.integration_slug:
+            rec.integration_slug = ev["integration_slug"]
+    else:
+        rec = by_origin.get(ev["end_user_origin_id"])
+        if not rec:
+            return 0
+        if ev["account_token"] and rec.account_token != ev["account_token"]:
+            rec.account_token = ev["account_token"]
+        rec.status = "disabled" if "deleted" in ev["event_type"] else "active"
+    if "synced" in ev["event_type"]:
+        # Merge finished a sync for this account: pull the changes into the local mirror
+        merge_mirror.request_refresh(rec.id, models=merge_mirror.models_for_event(ev["event_type"]))
+    merge_client.forget_client(rec.client_id)
+    rec.raw = {**(rec.raw or {}), "last_webhook": {
+        "hook": ev["hook"],
+        "linked_account": {k: v for k, v in ev["linked_account"].items() if k != "account_token"},
+        "processed_at": datetime.utcnow().isoformat(),
+    }}
+    return 1
+
+def _apply(events: List[Dict[str, Any]]) -> Tuple[int, Dict[int, str]]:
+    """
+    Batched upsert of MergeLinkedAccount: one query per lookup key for the whole
+    batch, one commit. Only a small summary of the last webhook is kept in raw.
+    Each event runs in its own savepoint; returns (updated, {queue id: error}).
+    """
+    tokens = {ev["account_token"] for ev in events if ev["account_token"]}
+    origins = {ev["end_user_origin_id"] for ev in events if ev["end_user_origin_id"]}
+    by_token = {r.account_token: r for r in
+                MergeLinkedAccount.query.filter(MergeLinkedAccount.account_token.in_(tokens)).all()} if tokens else {}
+    by_origin = {r.end_user_origin_id: r for r in
+                 MergeLinkedAccount.query.filter(MergeLinkedAccount.end_user_origin_id.in_(origins)).all()} if origins else {}
+
+    updated, errors = 0, {}
+    for ev in events:
+        try:
+            with db.session.begin_nested():
+                updated += _apply_one(ev, by_token, by_origin)
+        except Exception as e:
+            log.exception("Merge webhook event %s failed", ev["queue_id"])
+            errors[ev["queue_id"]] = str(e)
+    return updated, errors
+
+def _retry_later(ev: MergeWebhookEvent, error: str, now: datetime) -> None:
+    ev.attempts = (ev.attempts or 0) + 1
+    ev.status = "failed" if ev.attempts >= MERGE_WEBHOOK_MAX_ATTEMPTS else "pending"
+    ev.available_at = now + timedelta(seconds=2 ** ev.attempts)
+    ev.error = error
+
+def process_pending() -> bool:
+    events = _claim_batch()
+    if not events:
+        return False
+
+    parsed = []
+    for ev in events:
+        p = _parse(ev.body)
+        if p:
+            parsed.append({**p, "queue_id": ev.id})
+    now = datetime.utcnow()
+    try:
+        updated, errors = _apply(_dedupe(parsed))
+        for ev in events:
+            if ev.id in errors:
+                _retry_later(ev, errors[ev.id], now)
+            else:
+                ev.status, ev.error, ev.processed_at = "done", None, now
+                ev.attempts = (ev.attempts or 0) + 1
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        log.exception("Merge webhook batch failed")
+        for ev in events:
+            _retry_later(ev, str(e), now)
+        db.session.commit()
+        return True
+    log.info("Processed %d Merge webhooks (%d parsed, %d linked accounts updated, %d failed)",
+             len(events), len(parsed), updated, len(errors))
+    return True
+
+def queue_stats() -> Dict[str, int]:
+    rows = db.session.query(MergeWebhookEvent.status, db.func.count(MergeWebhookEvent.id)).group_by(MergeWebhookEvent.status).all()
+    return {status: count for status, count in rows}
+
+def latest_payload() -> Optional[Dict[str, Any]]:
+    ev = MergeWebhookEvent.query.order_by(MergeWebhookEvent.id.desc()).first()
+    if not ev:
+        return None
+    try:
+        return json.loads(ev.body)
+    except ValueError:
+        return {"raw": ev.body}
+
+register_worker("merge-webhooks", process_pending, interval=1.0)
@@ -0,0 +1,332 @@
+# services/outbox.py
+import os
+import re
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import requests
+from flask import jsonify, request
+from sqlalchemy.orm import aliased
+from models import db, OutboxWrite
+from services.background import register_worker
+from services.builderprime_service import BuilderPrimeService
+from services.bitrix24_service import contact_add
+from services.circuit_breaker import CircuitOpen
+from services.bulkhead import BulkheadFull
+from services.merge_ratelimit import MergeRateLimited
+from services.route_cache import route_cache, TENANT_HEADERS
+from services.token_store import current_client_id
+from services import callbacks, capsule_service, jobnimbus_service, merge_service
+
+log = logging.getLogger(__name__)
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "4"))               # delivery threads per process
+OUTBOX_BATCH = int(os.getenv("OUTBOX_BATCH", "10"))                  # writes claimed per worker pass
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "300"))   # retry delay ceiling, seconds
+OUTBOX_LEASE = 300  # seconds before a 'processing' write from a dead worker is picked up again
+
+# "JobNimbus API error 422: ...", "Merge create_contact failed: 400 ...", "BuilderPrime API error: 409 - ..."
+_STATUS_IN_MESSAGE = re.compile(r"(?:error|failed):? (\d{3})\b")
+
+
+class DeliveryFailed(RuntimeError):
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+# -------- operations --------
+
+def _builderprime_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """BuilderPrimeService reports errors in its result; map them the way the controller does."""
+    if result.get("success"):
+        return result
+    message = result.get("message") or "BuilderPrime write failed"
+    status = ((result.get("data") or {}).get("status_code")
+              or (404 if "not found" in message.lower() else 400 if "not configured" in message.lower() else None))
+    raise DeliveryFailed(message, status)
+
+
+def _builderprime_create_lead(w: OutboxWrite) -> Dict[str, Any]:
+    return _builderprime_result(BuilderPrimeService.create_lead(w.client_id, w.payload["lead"]))
+
+
+def _builderprime_update_lead(w: OutboxWrite) -> Dict[str, Any]:
+    return _builderprime_result(BuilderPrimeService.update_lead(w.client_id, w.payload["opportunity_id"],
+                                                                w.payload["lead"]))
+
+
+def _bitrix24_contact_add(w: OutboxWrite) -> Dict[str, Any]:
+    return contact_add(w.client_id, w.payload["fields"])
+
+
+def _jobnimbus_create_contact(w: OutboxWrite) -> Dict[str, Any]:
+    return {"success": True, "data": jobnimbus_service.create_contact(w.payload["contact"])}
+
+
+def _merge_create_contact(w: OutboxWrite) -> Dict[str, Any]:
+    token = w.payload["account_token"]
+    contact = merge_service.trim_and_validate_payload("contacts", w.payload["contact"], token)
+    return merge_service.create_contact(token, {"model": contact})
+
+
+def _capsule_create_party(w: OutboxWrite) -> Dict[str, Any]:
+    return capsule_service.make_capsule_request("POST", "parties", data=w.payload, client_id=w.client_id)
+
+
+# operation -> (vendor, deliver(write) -> result, route cache names to drop once delivered)
+OPERATIONS: Dict[str, Tuple[str, Callable[[OutboxWrite], Dict[str, Any]], Tuple[str, ...]]] = {
+    "builderprime.create_lead": ("builderprime", _builderprime_create_lead, ("builderprime_data",)),
+    "builderprime.update_lead": ("builderprime", _builderprime_update_lead, ("builderprime_data",)),
+    "bitrix24.contact_add": ("bitrix24", _bitrix24_contact_add, ()),
+    "jobnimbus.create_contact": ("jobnimbus", _jobnimbus_create_contact, ()),
+    "merge.create_contact": ("merge", _merge_create_contact, ()),
+    "capsule.create_party": ("capsule", _capsule_create_party, ()),
+}
+
+# Payload keys that never leave the server (poll responses, callbacks)
+_PRIVATE_KEYS = ("account_token",)
+
+
+# -------- accepting writes --------
+
+def wants_async() -> bool:
+    """Opt-in per request: ?async=true or `Prefer: respond-async`."""
+    return (request.args.get("async", "").lower() in ("1", "true", "yes")
+            or "respond-async" in request.headers.get("Prefer", "").lower())
+
+
+def entity(vendor: str, tenant: Any, kind: str, ident: Any) -> Optional[str]:
+    """Ordering key for writes to one vendor record; None (no ordering) when the record can't be named."""
+    if ident in (None, ""):
+        return None
+    return f"{vendor}:{tenant or '-'}:{kind}:{str(ident).strip().lower()}"[:255]
+
+
+def _tenant_hash() -> str:
+    raw = "|".join(f"{h}={request.headers.get(h, '')}" for h in TENANT_HEADERS)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def enqueue(operation: str, payload: Dict[str, Any], client_id: Optional[int] = None,
+            entity_key: Optional[str] = None, callback_url: Optional[str] = None,
+            tenant_hash: Optional[str] = None) -> OutboxWrite:
+    if operation not in OPERATIONS:
+        raise ValueError(f"Unknown outbox operation {operation}")
+    w = OutboxWrite(
+        client_id=client_id,
+        tenant_hash=tenant_hash,
+        operation=operation,
+        vendor=OPERATIONS[operation][0],
+        entity_key=entity_key,
+        payload=payload,
+        callback_url=callback_url,
+    )
+    db.session.add(w)
+    db.session.commit()
+    return w
+
+
+def accept(operation: str, payload: Dict[str, Any], client_id: Optional[int] = None,
+           entity_key: Optional[str] = None):
+    """
+    Persist the write and answer 202 with its id; the callback URL comes from
+    X-Callback-Url or ?callback_url= and is refused with 400 unless
+    services.callbacks allows it.
+    """
+    callback_url = request.headers.get("X-Callback-Url") or request.args.get("callback_url")
+    if callback_url:
+        try:
+            callbacks.check_url(callback_url)
+        except callbacks.CallbackUrlError as e:
+            return jsonify({"error": str(e)}), 400
+    w = enqueue(operation, payload, client_id, entity_key, callback_url, _tenant_hash())
+    poll_url = f"/api/upstream/outbox/{w.id}" + (f"?client_id={client_id}" if client_id is not None else "")
+    return jsonify({**to_dict(w), "poll_url": poll_url}), 202, {"Location": poll_url}
+
+
+def belongs_to_caller(w: OutboxWrite) -> bool:
+    """A write is visible to the client that made it (X-Client-Id / ?client_id=), or, without one, to the same tenant headers."""
+    if w.client_id is not None:
+        return current_client_id() == w.client_id
+    return w.tenant_hash == _tenant_hash()
+
+
+def to_dict(w: OutboxWrite) -> Dict[str, Any]:
+    return {
+        "id": w.id,
+        "operation": w.operation,
+        "client_id": w.client_id,
+        "status": w.status,
+        "attempts": w.attempts or 0,
+        "payload": {k: v for k, v in (w.payload or {}).items() if k not in _PRIVATE_KEYS},
+        "result": w.result,
+        "error": w.error,
+        "callback_url": w.callback_url,
+        "callback_status": w.callback_status,
+        "created_at": w.created_at.isoformat() if w.created_at else None,
+        "next_attempt_at": w.available_at.isoformat() if w.status == "pending" and w.available_at else None,
+        "completed_at": w.completed_at.isoformat() if w.completed_at else None,
+    }
+
+
+def retry(w: OutboxWrite) -> None:
+    """Put a failed write back in the queue with a fresh attempt budget."""
+    w.status, w.attempts, w.error, w.available_at, w.completed_at = "pending", 0, None, datetime.utcnow(), None
+    db.session.commit()
+
+
+# -------- delivery --------
+
+# vendor -> utcnow() before which no write to it is attempted (set by 429s, open circuits, full bulkheads)
+_paused: Dict[str, datetime] = {}
+_paused_lock = threading.Lock()
+
+
+def _pause(vendor: str, until: datetime) -> None:
+    with _paused_lock:
+        if vendor not in _paused or until > _paused[vendor]:
+            _paused[vendor] = until
+            log.info("Outbox deliveries to %s paused until %s", vendor, until.isoformat())
+
+
+def _paused_until(vendor: str, now: datetime) -> Optional[datetime]:
+    with _paused_lock:
+        until = _paused.get(vendor)
+        return until if until and until > now else None
+
+
+def _paused_vendors(now: datetime) -> List[str]:
+    with _paused_lock:
+        return [v for v, until in _paused.items() if until > now]
+
+
+def _claim_batch() -> List[OutboxWrite]:
+    """
+    Ready writes (and abandoned ones) in id order, skipping any write whose
+    entity still has an older write pending or in flight, and any vendor that
+    is paused.
+    """
+    now = datetime.utcnow()
+    ready = db.and_(OutboxWrite.status == "pending", OutboxWrite.available_at <= now)
+    abandoned = db.and_(OutboxWrite.status == "processing",
+                        OutboxWrite.available_at <= now - timedelta(seconds=OUTBOX_LEASE))
+    earlier = aliased(OutboxWrite)
+    blocked = (db.session.query(earlier.id)
+               .filter(earlier.entity_key == OutboxWrite.entity_key,
+                       earlier.id < OutboxWrite.id,
+                       earlier.status.in_(("pending", "processing")))
+               .exists())
+    q = OutboxWrite.query.filter(db.or_(ready, abandoned), ~blocked)
+    paused = _paused_vendors(now)
+    if paused:
+        q = q.filter(OutboxWrite.vendor.notin_(paused))
+    writes = q.order_by(OutboxWrite.id).limit(OUTBOX_BATCH).with_for_update(skip_locked=True).all()
+    for w in writes:
+        w.status = "processing"
+        w.available_at = now
+    db.session.commit()
+    return writes
+
+
+def _classify(e: Exception) -> Tuple[str, Optional[float]]:
+    """('throttled', retry_after) | ('retry', None) | ('permanent', None) for a failed delivery."""
+    for exc in (e, e.__cause__):
+        if isinstance(exc, (CircuitOpen, BulkheadFull, MergeRateLimited)):
+            return "throttled", exc.retry_after
+    status = None
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        status = e.response.status_code
+        if status == 429:
+            value = e.response.headers.get("Retry-After", "")
+            return "throttled", float(value) if value.isdigit() else None
+    elif isinstance(e, requests.RequestException):
+        return "retry", None
+    elif isinstance(e, DeliveryFailed):
+        status = e.status
+    else:
+        match = _STATUS_IN_MESSAGE.search(str(e))
+        status = int(match.group(1)) if match else None
+    if status == 429:
+        return "throttled", None
+    if status and 400 <= status < 500:
+        return "permanent", None  # the vendor rejected the write; retrying won't change that
+    return "retry", None
+
+
+def _notify(w: OutboxWrite) -> None:
+    if w.callback_url:
+        w.callback_status = callbacks.post(w.callback_url, to_dict(w))
+
+
+def _deliver(w: OutboxWrite) -> None:
+    vendor, deliver, invalidated = OPERATIONS[w.operation]
+    now = datetime.utcnow()
+    until = _paused_until(vendor, now)
+    if until:
+        # an earlier write in this batch hit the vendor's limit; not an attempt
+        w.status, w.available_at = "pending", until
+        return
+    try:
+        result = deliver(w)
+    except Exception as e:
+        kind, retry_after = _classify(e)
+        now = datetime.utcnow()
+        w.error = str(e)[:2000]
+        if kind == "throttled":
+            w.status = "pending"
+            w.available_at = now + timedelta(seconds=retry_after or min(2 ** ((w.attempts or 0) + 1), OUTBOX_BACKOFF_MAX))
+            _pause(vendor, w.available_at)
+            return
+        w.attempts = (w.attempts or 0) + 1
+        if kind == "retry" and w.attempts < OUTBOX_MAX_ATTEMPTS:
+            w.status = "pending"
+            w.available_at = now + timedelta(seconds=min(2 ** w.attempts, OUTBOX_BACKOFF_MAX))
+            log.warning("Outbox write %s (%s) failed, attempt %d: %s", w.id, w.operation, w.attempts, e)
+            return
+        w.status, w.completed_at = "failed", now
+        log.error("Outbox write %s (%s) failed for good: %s", w.id, w.operation, e)
+        _notify(w)
+        return
+    w.attempts = (w.attempts or 0) + 1
+    w.status, w.result, w.error, w.completed_at = "done", result, None, datetime.utcnow()
+    if invalidated:
+        route_cache.invalidate(invalidated)
+    _notify(w)
+
+
+def deliver_pending() -> bool:
+    """Worker: deliver a batch of claimed writes, committing each one as it finishes."""
+    writes = _claim_batch()
+    if not writes:
+        return False
+    for w in writes:
+        try:
+            _deliver(w)
+        except Exception as e:
+            # bad payload or the like; don't let one write strand the rest of the batch in 'processing'
+            log.exception("Outbox write %s could not be delivered", w.id)
+            w.status, w.error, w.completed_at = "failed", str(e)[:2000], datetime.utcnow()
+        db.session.commit()
+    log.info("Delivered %d outbox writes (%d done)", len(writes), sum(1 for w in writes if w.status == "done"))
+    return True
+
+
+def queue_stats() -> Dict[str, Any]:
+    rows = (db.session.query(OutboxWrite.vendor, OutboxWrite.status, db.func.count(OutboxWrite.id))
+            .group_by(OutboxWrite.vendor, OutboxWrite.status).all())
+    vendors: Dict[str, Dict[str, int]] = {}
+    for vendor, status, count in rows:
+        vendors.setdefault(vendor, {})[status] = count
+    now = datetime.utcnow()
+    with _paused_lock:
+        paused = {v: until.isoformat() for v, until in _paused.items() if until > now}
+    return {"vendors": vendors, "paused_until": paused, "workers": OUTBOX_WORKERS}
+
+
+# A pool of delivery threads, each claiming its own batch (skip_locked), so up to OUTBOX_WORKERS writes are in flight
+for _i in range(OUTBOX_WORKERS):
+    register_worker(f"outbox-{_i}", deliver_pending, interval=1.0)
@@ -0,0 +1,242 @@
+# services/route_cache.py
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlencode
+from flask import Response, current_app, make_response, request
+
+log = logging.getLogger(__name__)
+
+ROUTE_CACHE_ENABLED = os.getenv("ROUTE_CACHE_ENABLED", "1") == "1"
+ROUTE_CACHE_MAX_ENTRIES = int(os.getenv("ROUTE_CACHE_MAX_ENTRIES", "1000"))
+ROUTE_CACHE_MAX_BYTES = int(os.getenv("ROUTE_CACHE_MAX_BYTES", str(5 * 1024 * 1024)))  # per entry
+ROUTE_CACHE_REFRESH_WORKERS = int(os.getenv("ROUTE_CACHE_REFRESH_WORKERS", "4"))
+
+# Request headers that select the tenant (and credentials) a response belongs to
+TENANT_HEADERS = ("X-Client-Id", "X-Account-Token", "Authorization", "X-Api-Key")
+# Response headers kept with a cached body
+KEPT_HEADERS = ("Content-Type", "Retry-After")
+
+
+def _route_settings(name: str, ttl: float, swr: float) -> Tuple[float, float]:
+    """ROUTE_CACHE_<NAME>=ttl,swr overrides a route's defaults (e.g. ROUTE_CACHE_CAPSULE_ORGANIZATIONS=60,600)."""
+    value = os.getenv(f"ROUTE_CACHE_{name.upper()}")
+    if value:
+        parts = value.split(",")
+        ttl = float(parts[0])
+        swr = float(parts[1]) if len(parts) > 1 else swr
+    return ttl, swr
+
+
+def _tenant() -> Tuple[str, Dict[str, str]]:
+    """Hashed tenant id (tenant headers + the client_id path arg) and the headers needed to replay the request."""
+    headers = {h: request.headers[h] for h in TENANT_HEADERS if h in request.headers}
+    client_id = (request.view_args or {}).get("client_id")
+    raw = "|".join(f"{h}={headers.get(h, '')}" for h in TENANT_HEADERS) + f"|client={client_id}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16], headers
+
+
+def _query() -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted(request.args.items(multi=True)))
+
+
+def _bypass() -> bool:
+    return (request.args.get("live", "").lower() in ("1", "true", "yes")
+            or "no-cache" in request.headers.get("Cache-Control", ""))
+
+
+class _Entry:
+    __slots__ = ("body", "headers", "stored_at", "path", "replay_headers", "view_args", "refreshing")
+
+    def __init__(self, body: bytes, headers: Dict[str, str], path: str, replay_headers: Dict[str, str], view_args):
+        self.body = body
+        self.headers = headers
+        self.stored_at = time.monotonic()
+        self.path = path
+        self.replay_headers = replay_headers
+        self.view_args = view_args
+        self.refreshing = False
+
+
+class RouteCache:
+    """
+    Response cache for read-only proxy routes with a stale-while-revalidate
+    window. Entries are keyed by route, tenant and normalised query string.
+    Fresh entries (younger than `ttl`) are served as is; stale ones (up to
+    `ttl + swr`) are served immediately while one background refresh re-runs
+    the view; older entries are treated as misses. Only 200 responses are stored.
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[Tuple, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        # bumped by invalidate() (per route, or per route + tenant) so in-flight responses aren't stored afterwards
+        self._generations: Dict[Tuple, int] = {}
+        self._pool = ThreadPoolExecutor(max_workers=ROUTE_CACHE_REFRESH_WORKERS, thread_name_prefix="route-cache")
+
+    def _count(self, name: str, field: str) -> None:
+        with self._lock:
+            counts = self._stats.setdefault(name, {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0,
+                                                   "invalidations": 0})
+            counts[field] += 1
+
+    def _get(self, key: Tuple) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _generation_locked(self, key: Tuple) -> Tuple[int, int]:
+        return self._generations.get(key[:1], 0), self._generations.get(key[:2], 0)
+
+    def _generation(self, key: Tuple) -> Tuple[int, int]:
+        with self._lock:
+            return self._generation_locked(key)
+
+    def _put(self, key: Tuple, entry: _Entry, generation: Tuple[int, int]) -> None:
+        with self._lock:
+            if self._generation_locked(key) != generation:
+                return  # invalidated while this response was being produced
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > ROUTE_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def _store_response(self, key: Tuple, resp: Response, replay_headers: Dict[str, str], view_args,
+                        generation: Tuple[int, int]) -> Response:
+        """Store `resp` under `key` once its body is complete; streamed bodies are teed, not buffered up front."""
+        headers = {h: resp.headers[h] for h in KEPT_HEADERS if h in resp.headers}
+        path = request.path
+        if not resp.is_streamed:
+            body = resp.get_data()
+            if len(body) <= ROUTE_CACHE_MAX_BYTES:
+                self._put(key, _Entry(body, headers, path, replay_headers, view_args), generation)
+            return resp
+
+        chunks = resp.response
+
+        def tee():
+            buffered, size = [], 0
+            for chunk in chunks:
+                if buffered is not None:
+                    data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+                    size += len(data)
+                    if size > ROUTE_CACHE_MAX_BYTES:
+                        buffered = None  # too large to keep; still streamed to the caller
+                    else:
+                        buffered.append(data)
+                yield chunk
+            if buffered is not None:
+                self._put(key, _Entry(b"".join(buffered), headers, path, replay_headers, view_args), generation)
+
+        resp.response = tee()
+        return resp
+
+    def _respond(self, entry: _Entry, state: str) -> Response:
+        out = Response(entry.body, status=200, headers=entry.headers)
+        out.headers["X-Cache"] = state
+        out.headers["Age"] = str(int(time.monotonic() - entry.stored_at))
+        return out
+
+    def _refresh(self, app, key: Tuple, name: str, view, entry: _Entry) -> None:
+        generation = self._generation(key)
+        try:
+            with app.test_request_context(entry.path, query_string=urlencode(key[2]), headers=entry.replay_headers):
+                resp = make_response(view(**entry.view_args))
+                if resp.status_code == 200:
+                    body = resp.get_data()
+                    if len(body) <= ROUTE_CACHE_MAX_BYTES:
+                        headers = {h: resp.headers[h] for h in KEPT_HEADERS if h in resp.headers}
+                        self._put(key, _Entry(body, headers, entry.path, entry.replay_headers, entry.view_args),
+                                  generation)
+                        self._count(name, "refreshes")
+                else:
+                    log.warning("Background refresh of %s returned %s; keeping the stale entry", name, resp.status_code)
+        except Exception:
+            log.exception("Background refresh of %s failed", name)
+        finally:
+            entry.refreshing = False
+
+    def cached(self, name: str, ttl: float = 60, swr: float = 300):
+        """Decorator for a GET view: serve from the cache, revalidating stale entries in the background."""
+        ttl, swr = _route_settings(name, ttl, swr)
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**view_args):
+                if not ROUTE_CACHE_ENABLED:
+                    return view(**view_args)
+                tenant, replay_headers = _tenant()
+                key = (name, tenant, _query())
+                entry = None if _bypass() else self._get(key)
+                age = time.monotonic() - entry.stored_at if entry else None
+                if entry and age < ttl:
+                    self._count(name, "hits")
+                    return self._respond(entry, "HIT")
+                if entry and age < ttl + swr:
+                    self._count(name, "stale_hits")
+                    with self._lock:
+                        start = not entry.refreshing
+                        entry.refreshing = True
+                    if start:
+                        self._pool.submit(self._refresh, current_app._get_current_object(), key, name, view, entry)
+                    return self._respond(entry, "STALE")
+                self._count(name, "misses")
+                generation = self._generation(key)
+                resp = make_response(view(**view_args))
+                if resp.status_code != 200:
+                    return resp
+                resp.headers["X-Cache"] = "MISS"
+                return self._store_response(key, resp, replay_headers, view_args, generation)
+            return wrapper
+        return decorator
+
+    def invalidates(self, *names: str):
+        """Decorator for a mutating view: on success, drop the tenant's entries of the named routes."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**view_args):
+                resp = make_response(view(**view_args))
+                if 200 <= resp.status_code < 300:
+                    self.invalidate(names, _tenant()[0])
+                return resp
+            return wrapper
+        return decorator
+
+    def invalidate(self, names, tenant: Optional[str] = None) -> int:
+        with self._lock:
+            for name in names:
+                scope = (name,) if tenant is None else (name, tenant)
+                self._generations[scope] = self._generations.get(scope, 0) + 1
+            doomed = [k for k in self._entries if k[0] in names and (tenant is None or k[1] == tenant)]
+            for k in doomed:
+                del self._entries[k]
+        for k in doomed:
+            self._count(k[0], "invalidations")
+        return len(doomed)
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        with self._lock:
+            entries: Dict[str, int] = {}
+            for k in self._entries:
+                entries[k[0]] = entries.get(k[0], 0) + 1
+            out = {}
+            for name, counts in self._stats.items():
+                served = counts["hits"] + counts["stale_hits"]
+                total = served + counts["misses"]
+                out[name] = {**counts, "entries": entries.get(name, 0),
+                             "hit_rate": round(served / total, 3) if total else None}
+            return out
+
+
+route_cache = RouteCache()
+cached = route_cache.cached
+invalidates = route_cache.invalidates
@@ -0,0 +1,195 @@
+# services/single_flight.py
+import copy
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, Iterator, Optional, Tuple
+
+
+def flight_key(vendor: str, tenant: Any, method: str, path: str, params: Any = None) -> Tuple:
+    """(vendor, tenant, method, path, params) with params normalised: order-independent, values as strings."""
+    items = params.items() if isinstance(params, dict) else (params or [])
+    flat = []
+    for k, v in items:
+        for value in (v if isinstance(v, (list, tuple)) else [v]):
+            flat.append((str(k), "" if value is None else str(value)))
+    return (vendor, tenant, method.upper(), path, tuple(sorted(flat)))
+
+
+class _Call:
+    __slots__ = ("done", "value", "error", "followers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+
+class Group:
+    """
+    Coalesces identical concurrent calls: the first caller for a key (the
+    leader) runs `fn`; callers arriving while it is in flight wait and share
+    its result or exception instead of making their own upstream call.
+    Followers get a deep copy, so handlers that decorate a result (e.g.
+    ?resolve=) can't see each other's changes.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, key: Hashable, field: str) -> None:
+        vendor = key[0] if isinstance(key, tuple) else str(key)
+        counts = self._stats.setdefault(vendor, {"upstream": 0, "coalesced": 0})
+        counts[field] += 1
+
+    def do(self, key: Hashable, fn: Callable[[], Any], copy_result: bool = True,
+           participants: Optional[Callable[[Any, int], None]] = None) -> Any:
+        """
+        Run `fn` once for all concurrent callers of `key`. `participants(value, n)`
+        is told how many callers (leader included) will receive the value before
+        any of them gets it, for results that must be released by each of them.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call:
+                call.followers += 1
+                self._count(key, "coalesced")
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self._count(key, "upstream")
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.value) if copy_result else call.value
+
+        value = None
+        try:
+            value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)  # later callers start a fresh call
+                followers = call.followers
+            if call.error is None:
+                if participants:
+                    participants(value, 1 + followers)
+                # followers copy from a snapshot the leader's caller can't touch
+                call.value = copy.deepcopy(value) if copy_result and followers else value
+            call.done.set()
+        return value
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            in_flight: Dict[str, int] = {}
+            for key in self._calls:
+                vendor = key[0] if isinstance(key, tuple) else str(key)
+                in_flight[vendor] = in_flight.get(vendor, 0) + 1
+            return {vendor: {**counts, "in_flight": in_flight.get(vendor, 0)}
+                    for vendor, counts in self._stats.items()}
+
+
+class SharedBody:
+    """
+    A streamed upstream body read once and replayed to every caller sharing it.
+    Each participant (see Group.do `participants`) takes a reader(). A lone
+    reader streams straight from upstream; with several, whichever is furthest
+    ahead pulls the next chunk, and chunks are dropped as soon as every reader
+    has passed them. The upstream response is closed once every reader is closed.
+    """
+
+    def __init__(self, resp, chunk_size: int):
+        self._resp = resp
+        self._it = resp.iter_content(chunk_size=chunk_size)
+        self._chunks: Deque[bytes] = deque()
+        self._base = 0          # index (in the whole body) of _chunks[0]
+        self._done = False
+        self._pull = threading.Lock()
+        self._lock = threading.Lock()
+        self._holders = 1
+        self._unclaimed = 1     # participants that haven't taken their reader yet; nothing is dropped until they have
+        self._positions: Dict[int, int] = {}  # reader id -> index of the next chunk it reads
+        self._next_reader = 0
+
+    def expect(self, holders: int) -> None:
+        with self._lock:
+            self._holders = holders
+            self._unclaimed = holders
+
+    def reader(self) -> "_Reader":
+        with self._lock:
+            solo = self._holders == 1
+            rid = self._next_reader
+            self._next_reader += 1
+            self._unclaimed -= 1
+            self._positions[rid] = 0
+        return _Reader(self, rid, solo)
+
+    def _trim(self) -> None:
+        if self._unclaimed > 0:
+            return
+        low = min(self._positions.values(), default=self._base + len(self._chunks))
+        while self._base < low and self._chunks:
+            self._chunks.popleft()
+            self._base += 1
+
+    def _leave(self, rid: int) -> None:
+        with self._lock:
+            self._positions.pop(rid, None)
+            self._trim()
+            self._holders -= 1
+            last = self._holders <= 0
+        if last:
+            self._chunks.clear()
+            self._resp.close()
+
+    def _read(self, rid: int) -> Iterator[bytes]:
+        i = 0
+        while True:
+            with self._lock:
+                chunk = self._chunks[i - self._base] if i < self._base + len(self._chunks) else None
+            if chunk is None:
+                with self._pull:
+                    with self._lock:
+                        behind = i < self._base + len(self._chunks)
+                    if not behind:
+                        chunk = None if self._done else next(self._it, None)
+                        if chunk is None:
+                            self._done = True
+                            return
+                        with self._lock:
+                            self._chunks.append(chunk)
+                continue
+            yield chunk
+            i += 1
+            with self._lock:
+                self._positions[rid] = i
+                self._trim()
+
+
+class _Reader:
+    __slots__ = ("_body", "_rid", "_solo", "_closed")
+
+    def __init__(self, body: SharedBody, rid: int, solo: bool):
+        self._body = body
+        self._rid = rid
+        self._solo = solo
+        self._closed = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        return iter(self._body._it) if self._solo else self._body._read(self._rid)
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._body._leave(self._rid)
+
+
+flights = Group()
@@ -0,0 +1,39 @@
+# services/streaming.py
+import json
+from itertools import chain
+from typing import Any, Dict, Iterable, Optional
+from flask import Response, stream_with_context
+
+
+def iter_json_collection(key: str, pages: Iterable[list], meta: Optional[Dict[str, Any]] = None):
+    """
+    Encode an iterable of pages (lists of items) as one JSON object:
+      {"<key>": [item, item, ...], **meta}
+    Items are written as soon as each page arrives, so memory stays flat.
+    """
+    yield '{"%s": [' % key
+    first = True
+    for page in pages:
+        for item in page:
+            yield ("" if first else ",") + json.dumps(item)
+            first = False
+    yield "]"
+    for k, v in (meta or {}).items():
+        yield ", %s: %s" % (json.dumps(k), json.dumps(v))
+    yield "}"
+
+
+def stream_json_collection(key: str, pages: Iterable[list], meta: Optional[Dict[str, Any]] = None) -> Response:
+    """Flask streaming Response for iter_json_collection (keeps the request/app context alive)."""
+    return Response(stream_with_context(iter_json_collection(key, pages, meta)), mimetype="application/json")
+
+
+def stream_pages(key: str, pages: Iterable[list], meta: Optional[Dict[str, Any]] = None) -> Response:
+    """
+    Like stream_json_collection, but the first page is fetched before the response
+    starts so upstream errors still surface as a normal error status instead of a
+    truncated body.
+    """
+    pages = iter(pages)
+    first = next(pages, [])
+    return stream_json_collection(key, chain([first], pages), meta)
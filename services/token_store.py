@@ -0,0 +1,206 @@
+# services/token_store.py
+import os
+import hmac
+import time
+import hashlib
+import logging
+import secrets
+import threading
+from typing import Callable, Dict, Optional, Tuple
+from flask import abort, has_request_context, jsonify, make_response, request
+from models import db
+from services.background import register_worker
+
+log = logging.getLogger(__name__)
+
+TOKEN_CACHE_SHARDS = int(os.getenv("TOKEN_CACHE_SHARDS", "16"))
+TOKEN_REFRESH_AHEAD = int(os.getenv("TOKEN_REFRESH_AHEAD", "600"))       # renew this many seconds before expiry
+TOKEN_REFRESH_BATCH = int(os.getenv("TOKEN_REFRESH_BATCH", "20"))
+TOKEN_REFRESH_INTERVAL = float(os.getenv("TOKEN_REFRESH_INTERVAL", "30"))
+TOKEN_REFRESH_LEASE = 120       # seconds a claimed row is left alone by other refreshers
+TOKEN_REFRESH_BACKOFF = 300     # seconds before a failed refresh is retried
+NEGATIVE_TTL = 30               # seconds a "no token for this client" answer is cached
+
+# access_token, refresh_token, expires_at (None access_token = known to have no token)
+Entry = Tuple[Optional[str], Optional[str], int]
+
+
+def current_client_id() -> Optional[int]:
+    """Tenant for this request: X-Client-Id header (or ?client_id=); None for single-tenant callers."""
+    if not has_request_context():
+        return None
+    value = request.headers.get("X-Client-Id") or request.args.get("client_id")
+    if not value:
+        return None
+    if not str(value).isdigit():
+        abort(make_response(jsonify({"error": "X-Client-Id must be an integer"}), 400))
+    return int(value)
+
+
+def state_for_client(client_id: Optional[int], secret: Optional[str]) -> str:
+    """OAuth `state` that carries the connecting client id, signed so a callback can't be pointed at another client."""
+    nonce = secrets.token_urlsafe(16)
+    if client_id is None:
+        return nonce
+    body = f"{client_id}.{nonce}"
+    sig = hmac.new((secret or "").encode("utf-8"), body.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+    return f"{body}.{sig}"
+
+
+def client_from_state(state: Optional[str], secret: Optional[str]) -> Optional[int]:
+    """Client id signed into `state` by state_for_client(), or None (single-tenant / unsigned)."""
+    parts = (state or "").split(".")
+    if len(parts) != 3 or not parts[0].isdigit():
+        return None
+    body = f"{parts[0]}.{parts[1]}"
+    sig = hmac.new((secret or "").encode("utf-8"), body.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+    return int(parts[0]) if hmac.compare_digest(sig, parts[2]) else None
+
+
+class ShardedCache:
+    """client_id -> Entry, split over independently locked shards so lookups don't contend."""
+
+    def __init__(self, shards: int = TOKEN_CACHE_SHARDS):
+        self._shards = [({}, threading.Lock()) for _ in range(max(1, shards))]
+
+    def _shard(self, key: int):
+        return self._shards[hash(key) % len(self._shards)]
+
+    def get(self, key: int) -> Optional[Tuple[Entry, float]]:
+        data, lock = self._shard(key)
+        with lock:
+            return data.get(key)
+
+    def put(self, key: int, entry: Entry, valid_until: float) -> None:
+        data, lock = self._shard(key)
+        with lock:
+            data[key] = (entry, valid_until)
+
+    def pop(self, key: int) -> None:
+        data, lock = self._shard(key)
+        with lock:
+            data.pop(key, None)
+
+    def __len__(self) -> int:
+        return sum(len(data) for data, _ in self._shards)
+
+
+class TokenStore:
+    """
+    Per-client OAuth tokens for one vendor: a table with a unique client_id, a
+    sharded in-process cache in front of it, and a background worker that
+    renews tokens TOKEN_REFRESH_AHEAD seconds before they expire, so requests
+    neither hit the DB nor refresh inline in the steady state.
+
+    `refresh(refresh_token) -> token response` calls the vendor's token endpoint.
+    """
+
+    def __init__(self, vendor: str, model, refresh: Callable[[str], Dict]):
+        self.vendor = vendor
+        self.model = model
+        self._refresh = refresh
+        self._cache = ShardedCache()
+        self._inline_locks = [threading.Lock() for _ in range(TOKEN_CACHE_SHARDS)]
+        register_worker(f"{vendor}-token-refresh", self.refresh_due, interval=TOKEN_REFRESH_INTERVAL)
+
+    # ---- reads ----
+    def _load(self, client_id: int) -> Entry:
+        row = self.model.query.filter_by(client_id=client_id).first()
+        entry: Entry = (row.access_token, row.refresh_token, row.expires_at) if row else (None, None, 0)
+        now = time.time()
+        # re-read shortly before expiry: by then the refresher (maybe in another process) has rotated it
+        valid_until = now + NEGATIVE_TTL if not row else max(now + 5, entry[2] - TOKEN_REFRESH_AHEAD / 2)
+        self._cache.put(client_id, entry, valid_until)
+        return entry
+
+    def get(self, client_id: int) -> Optional[Dict]:
+        cached = self._cache.get(client_id)
+        entry = cached[0] if cached and cached[1] > time.time() else self._load(client_id)
+        if not entry[0]:
+            return None
+        return {"access_token": entry[0], "refresh_token": entry[1], "expires_at": entry[2]}
+
+    def access_token(self, client_id: int) -> Optional[str]:
+        """Valid access token for the client, or None if the client never connected."""
+        token = self.get(client_id)
+        if not token:
+            return None
+        if token["expires_at"] > time.time() + 30:
+            return token["access_token"]
+        # Already (nearly) expired: the refresher fell behind, so refresh inline once per client
+        with self._inline_locks[hash(client_id) % len(self._inline_locks)]:
+            token = self.get(client_id)
+            if token and token["expires_at"] > time.time() + 30:
+                return token["access_token"]
+            row = self.model.query.filter_by(client_id=client_id).first()
+            return self._renew(row) if row else None
+
+    # ---- writes ----
+    def save(self, client_id: int, token_data: Dict) -> None:
+        """Store a token response (authorization_code or refresh grant) for the client."""
+        row = self.model.query.filter_by(client_id=client_id).first()
+        if not row:
+            row = self.model(client_id=client_id)
+            db.session.add(row)
+        self._apply(row, token_data)
+        db.session.commit()
+
+    def forget(self, client_id: int) -> None:
+        self._cache.pop(client_id)
+
+    def renew(self, client_id: int) -> Optional[str]:
+        """Refresh the client's token now (manual refresh endpoints)."""
+        row = self.model.query.filter_by(client_id=client_id).first()
+        return self._renew(row) if row and row.refresh_token else None
+
+    def _apply(self, row, token_data: Dict) -> None:
+        row.access_token = token_data["access_token"]
+        if token_data.get("refresh_token"):
+            row.refresh_token = token_data["refresh_token"]
+        row.expires_at = int(time.time()) + int(token_data.get("expires_in") or 3600)
+        row.refresh_after, row.refresh_error = None, None
+        self._cache.put(row.client_id, (row.access_token, row.refresh_token, row.expires_at),
+                        row.expires_at - TOKEN_REFRESH_AHEAD / 2)
+
+    def _renew(self, row) -> Optional[str]:
+        try:
+            self._apply(row, self._refresh(row.refresh_token))
+            db.session.commit()
+            return row.access_token
+        except Exception as e:
+            db.session.rollback()
+            log.warning("%s token refresh for client %s failed: %s", self.vendor, row.client_id, e)
+            row.refresh_after = int(time.time()) + TOKEN_REFRESH_BACKOFF
+            row.refresh_error = str(e)[:1000]
+            db.session.commit()
+            return None
+
+    # ---- background refresher ----
+    def refresh_due(self) -> bool:
+        """Renew up to TOKEN_REFRESH_BATCH tokens expiring within TOKEN_REFRESH_AHEAD seconds."""
+        now = int(time.time())
+        rows = (self.model.query
+                .filter(self.model.expires_at <= now + TOKEN_REFRESH_AHEAD,
+                        self.model.refresh_token.isnot(None),
+                        db.or_(self.model.refresh_after.is_(None), self.model.refresh_after <= now))
+                .order_by(self.model.expires_at)
+                .limit(TOKEN_REFRESH_BATCH)
+                .with_for_update(skip_locked=True)
+                .all())
+        if not rows:
+            return False
+        for row in rows:
+            row.refresh_after = now + TOKEN_REFRESH_LEASE  # claimed; other processes skip it
+        db.session.commit()
+        renewed = sum(1 for row in rows if self._renew(row))
+        log.info("Refreshed %d/%d %s tokens", renewed, len(rows), self.vendor)
+        return len(rows) == TOKEN_REFRESH_BATCH
+
+    def stats(self) -> Dict[str, int]:
+        now = int(time.time())
+        return {
+            "cached": len(self._cache),
+            "connected": self.model.query.count(),
+            "expiring": self.model.query.filter(self.model.expires_at <= now + TOKEN_REFRESH_AHEAD).count(),
+            "failing": self.model.query.filter(self.model.refresh_error.isnot(None)).count(),
+        }
@@ -140,6 +140,28 @@ def test_bitrix24_integration():
     except Exception as e:
         print(f"   ❌ Exception: {e}")
     
+    # Test 7: Outbound webhook event is queued
+    print("\n7. Testing webhook event queueing...")
+    event_data = {
+        "event": "ONCRMDEALUPDATE",
+        "data[FIELDS][ID]": deal_id or 1,
+        "auth[domain]": BITRIX_WEBHOOK_BASE.split("/")[2],
+        "auth[application_token]": BITRIX_OUTBOUND_TOKEN
+    }
+
+    try:
+        response = requests.post(f"{BASE_URL}/api/bitrix/webhook", data=event_data)
+        print(f"   Status: {response.status_code}")
+        if response.status_code == 204:
+            print("   ✅ Event accepted")
+            response = requests.get(f"{BASE_URL}/api/bitrix/webhook/debug",
+                                    headers={"X-Application-Token": BITRIX_OUTBOUND_TOKEN})
+            print(f"   ✅ Queue: {json.dumps(response.json(), indent=2)}")
+        else:
+            print(f"   ❌ Error: {response.text}")
+    except Exception as e:
+        print(f"   ❌ Exception: {e}")
+
     print("\n" + "=" * 50)
     print("🎯 Test completed!")
     print("\n📋 Sample cURL commands you can run:")
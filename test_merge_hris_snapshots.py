@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Tests for Merge HRIS snapshot content hashing
+"""
+
+import os
+import sys
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.merge_hris_snapshots import content_hash
+
+EMPLOYEE = {
+    "id": "emp-1",
+    "remote_id": "19202938",
+    "first_name": "Greg",
+    "work_email": "greg@example.com",
+    "manager": {"id": "emp-9", "remote_id": "123", "first_name": "Ann"},
+    "modified_at": "2024-01-01T00:00:00Z",
+}
+
+
+def test_changed_fields_change_the_hash():
+    changed = {**EMPLOYEE, "first_name": "Gregory", "work_email": "gregory@example.com"}
+    assert content_hash(changed) != content_hash(EMPLOYEE)
+
+
+def test_volatile_fields_and_expanded_relations_do_not():
+    same = {**EMPLOYEE, "modified_at": "2025-06-01T00:00:00Z",
+            "manager": {"id": "emp-9", "remote_id": "123", "first_name": "Annie"}}
+    assert content_hash(same) == content_hash(EMPLOYEE)
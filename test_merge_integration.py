@@ -102,6 +102,7 @@ def test_merge_integration():
             print("✅ Webhook debug endpoint working!")
             print(f"   Webhook secret configured: {result.get('webhook_secret_configured', False)}")
             print(f"   Webhook secret length: {result.get('webhook_secret_length', 0)}")
+            print(f"   Webhook queue: {result.get('queue', {})}")
             print()
         else:
             print(f"❌ Webhook debug failed: {response.status_code}")
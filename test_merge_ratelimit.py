@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Tests for the Merge rate-limit governor
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.merge_ratelimit import Governor, MergeRateLimited
+
+
+def test_429_on_one_account_leaves_other_accounts_unblocked():
+    governor = Governor()
+    governor.observe("token-a", 429, {"Retry-After": "60"})
+
+    governor.acquire("token-b", background=False)  # must not wait or raise
+
+    with pytest.raises(MergeRateLimited):
+        governor.acquire("token-a", background=False)
+
+
+def test_key_level_429_blocks_account_calls():
+    governor = Governor()
+    governor.observe(None, 429, {"Retry-After": "60"})
+
+    with pytest.raises(MergeRateLimited):
+        governor.acquire("token-b", background=False)